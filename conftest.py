@@ -1,11 +1,16 @@
 import logging
 import os
+import pathlib
 import re
+import time
 
 import pkg_resources
 import pytest
 import selenium
 
+import nsfarm.board
+import nsfarm.cli
+import nsfarm.lxd
 import nsfarm.target
 import nsfarm.web
 
@@ -30,6 +35,42 @@ def pytest_addoption(parser):
         help="Run vncviewer when ever we start selenium container.",
         action="store_true",
     )
+    parser.addoption(
+        "--cli-trace",
+        help="Record timing and amount of transferred data for every command executed on CLI.",
+        action="store_true",
+    )
+    parser.addoption(
+        "--cli-trace-json",
+        help="Export CLI commands records in JSON to PATH at the end of the session (implies --cli-trace).",
+        metavar="PATH",
+    )
+    parser.addoption(
+        "--session-dir",
+        help="Record raw serial console and container sessions with timing to files in DIR.",
+        metavar="DIR",
+    )
+    parser.addoption(
+        "--image-store",
+        help="Import images from store in DIR instead of bootstrapping them and export bootstrapped images to it.",
+        metavar="DIR",
+    )
+    parser.addoption(
+        "--lxd-pool",
+        help="Keep SIZE booted containers ready for every used image so tests do not wait for containers to boot.",
+        type=int,
+        metavar="SIZE",
+    )
+    parser.addoption(
+        "--lxd-exec-api",
+        help="Spawn commands in containers trough LXD exec API instead of starting 'lxc exec' for every one of them.",
+        action="store_true",
+    )
+    parser.addoption(
+        "--log-queue",
+        help="Log serial console and other streams from background thread so logging does not slow down their reading.",
+        action="store_true",
+    )
 
 
 @pytest.hookimpl(tryfirst=True)
@@ -46,6 +87,52 @@ def pytest_configure(config):
     setattr(config, "target_config", targets.get(config.getoption("-T")))
     # Set if gui viewer should be open when testing using Selenium
     nsfarm.web.Container.open_viewer = config.getoption("--viewgui")
+    # Enable tracing of commands
+    if config.getoption("--cli-trace") or config.getoption("--cli-trace-json"):
+        nsfarm.cli.Cli.trace = nsfarm.cli.CommandTrace()
+    # Record sessions
+    if config.getoption("--session-dir"):
+        nsfarm.board.Board.session_dir = pathlib.Path(config.getoption("--session-dir"))
+        nsfarm.lxd.Container.session_dir = pathlib.Path(config.getoption("--session-dir"))
+    # Share bootstrapped images trough store
+    if config.getoption("--image-store"):
+        nsfarm.lxd.Image.store = nsfarm.lxd.ImageStore(config.getoption("--image-store"))
+    # Pool booted containers
+    if config.getoption("--lxd-pool"):
+        nsfarm.lxd.Container.pool = nsfarm.lxd.ContainerPool(config.getoption("--lxd-pool"))
+    # Spawn commands in containers without lxc client
+    nsfarm.lxd.Container.exec_api = config.getoption("--lxd-exec-api")
+    # Move logging of streams to background thread
+    if config.getoption("--log-queue"):
+        nsfarm.cli.LogQueue.start()
+
+
+def pytest_unconfigure(config):
+    nsfarm.cli.LogQueue.stop()
+    if nsfarm.lxd.Container.pool is not None:
+        nsfarm.lxd.Container.pool.close()
+    path = config.getoption("--cli-trace-json")
+    if path and nsfarm.cli.Cli.trace is not None:
+        with open(path, "w") as file:
+            file.write(nsfarm.cli.Cli.trace.json())
+
+
+@pytest.hookimpl(hookwrapper=True, trylast=True)
+def pytest_runtest_setup(item):
+    yield
+    nsfarm.cli.LogQueue.flush()  # Queued records have to be handled before logs are collected for the report
+
+
+@pytest.hookimpl(hookwrapper=True, trylast=True)
+def pytest_runtest_call(item):
+    yield
+    nsfarm.cli.LogQueue.flush()
+
+
+@pytest.hookimpl(hookwrapper=True, trylast=True)
+def pytest_runtest_teardown(item):
+    yield
+    nsfarm.cli.LogQueue.flush()
 
 
 class HTMLReport:
@@ -66,6 +153,8 @@ class HTMLReport:
         for identifier, prop in report.user_properties:
             if identifier == f"png.{report.when}":
                 extra.append(pytest_html.extras.png(prop[1], prop[0]))
+            if identifier == "cli_trace" and report.when == "teardown":
+                extra.append(pytest_html.extras.json(prop, "CLI trace"))
 
         report.extra = extra
 
@@ -84,3 +173,12 @@ def screenshot(record_property):
         record_property(f"png.{when}", (name, source.get_screenshot_as_base64()))
 
     return __shot
+
+
+@pytest.fixture(autouse=True)
+def cli_trace(record_property):
+    """Records CLI commands executed as part of the test (including its fixtures) if tracing is enabled."""
+    start = time.time()
+    yield
+    if nsfarm.cli.Cli.trace is not None:
+        record_property("cli_trace", [record._asdict() for record in nsfarm.cli.Cli.trace.since(start)])
@@ -3,6 +3,7 @@ import logging
 import sys
 
 from .lxd import __main__ as lxd
+from .session import __main__ as session
 from .target import __main__ as target
 
 
@@ -39,6 +40,10 @@ def parser(upper_parser):
     target_parser.set_defaults(op="target")
     ret["target"] = target.parser(target_parser)
 
+    session_parser = subparsers.add_parser("session", help="Recorded sessions")
+    session_parser.set_defaults(op="session")
+    ret["session"] = session.parser(session_parser)
+
     return ret
 
 
@@ -48,6 +53,7 @@ def handle_args(args, parser_ret):
     handles = {
         "lxd": lxd,
         "target": target,
+        "session": session,
     }
     if hasattr(args, "op"):
         handles[args.op].handle_args(args, parser_ret[args.op])
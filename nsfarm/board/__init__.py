@@ -1,5 +1,6 @@
 """Generalizations for all boards nsfarm tests software on."""
 from ..target.target import Target as _Target
+from ._board import Board
 from .mox import Mox
 from .omnia import Omnia
 from .turris1x import Turris1x
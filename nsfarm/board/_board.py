@@ -2,6 +2,7 @@
 """
 import abc
 import logging
+import pathlib
 import time
 import typing
 
@@ -9,7 +10,7 @@ import serial
 import serial.tools.miniterm
 from pexpect import fdpexpect
 
-from .. import cli
+from .. import cli, session
 from ..lxd import Container
 from ..target.target import Target
 
@@ -17,11 +18,18 @@ from ..target.target import Target
 class Board(abc.ABC):
     """General abstract class defining handle for board."""
 
+    # Directory where serial console session is recorded (set this to enable recording)
+    session_dir: typing.Optional[pathlib.Path] = None
+
     def __init__(self, target_config: Target):
         self.config = target_config
+        self._recorder = None
+        if self.session_dir is not None:
+            self.session_dir.mkdir(parents=True, exist_ok=True)
+            self._recorder = session.Recorder(self.session_dir / f"{self.config.name}.nsfs")
         # Open serial console to board
         self._serial = serial.Serial(self.config.serial, 115200)
-        self._fdlogging = cli.FDLogging(self._serial.fileno(), logging.getLogger(__package__))
+        self._fdlogging = cli.FDLogging(self._serial.fileno(), logging.getLogger(__package__), recorder=self._recorder)
         self._pexpect = fdpexpect.fdspawn(self._fdlogging.socket)
         # Set board to some known state
         self.reset(True)  # Hold in reset state
@@ -37,8 +45,9 @@ class Board(abc.ABC):
         """Enables/Disables serial data flush.
         This disables data propagation in logging and flushes pexpect on disable. The effect is that output is only
         logged without propagation to pexpect.
-        This is required as at some point we just use serial console for logs without reading it. In such case it is
-        just matter of time logger gets stuck as pipe toward pexpect gets filled. This prevents this from happening.
+        This is required as at some point we just use serial console for logs without reading it. In such case the relay
+        buffer toward pexpect gets filled with stale data and the oldest data are dropped. This prevents this from
+        happening.
         """
         self._fdlogging.set_propagation(not flush)
         if flush:
@@ -78,7 +87,10 @@ class Board(abc.ABC):
             ccli.run(f"prepare_turris_image '{self.config.board}' '{os_branch}'", timeout=120)
             while not self._bootup(ccli):
                 pass
-        # Wait for bootup
+        return self._wait_for_system()
+
+    def _wait_for_system(self) -> cli.Shell:
+        """Wait for booted up system and return shell on it."""
         self._pexpect.expect_exact("Router Turris successfully started.", timeout=240)
         self._pexpect.sendline("")
         shell = cli.Shell(self._pexpect)
@@ -0,0 +1,404 @@
+"""Simulated board that runs locally on pseudo-terminal.
+
+This allows testing of serial console and expect machinery (Board.uboot, Board.bootup and cli classes) without any
+hardware. The simulated console prints U-Boot banner with autoboot countdown, provides minimal U-Boot prompt and "boots"
+to local shell. The speed of serial line can be emulated as well.
+"""
+import configparser
+import contextlib
+import fcntl
+import os
+import pathlib
+import pty
+import re
+import select
+import shlex
+import signal
+import subprocess
+import tempfile
+import termios
+import threading
+import time
+import tty
+import typing
+
+from .. import cli
+from ..target.target import Target
+from ._board import Board
+
+# Shell the simulated system boots to. Bash is used as it is commonly available and it supports command substitution in
+# prompt the same way Busybox's ash does (Dash does not).
+SHELL = ("bash", "--norc", "--noprofile", "--noediting", "-i")
+
+_BANNER = (
+    b"\r\nU-Boot 2022.10 (simulated)\r\n\r\n"
+    b"Model: NSFarm simulated board\r\n"
+    b"DRAM:  1 GiB\r\n"
+    b"Net:   eth0: ethernet@30000\r\n"
+)
+_BOOT = (
+    b"## Booting kernel from FIT Image\r\n"
+    b"Starting kernel ...\r\n\r\n"
+    b"[    0.000000] Booting Linux on physical CPU 0x0\r\n"
+    b"[    0.000000] Linux version 5.15.0 (simulated)\r\n"
+    b"[    1.000000] Run /init as init process\r\n"
+    b"Router Turris successfully started.\r\n"
+)
+_EXPAND = re.compile(r"\$(\?|\{(\w+)\}|(\w+))")
+# Utilities replaced in simulated system as they would affect the host system
+_SHIMS = {
+    "sysctl": "#!/bin/sh\nexit 0\n",
+}
+
+
+class SimulatedConsole:
+    """Serial console of simulated board.
+
+    The console is pseudo-terminal. The path to its slave side (path) is what is used as serial device. The emulation runs
+    in separate thread. It starts in reset state (nothing is printed and input is ignored) and it boots once the reset is
+    released.
+
+    baudrate: speed of emulated serial line (output is throttled to it) or None for no throttling
+    autoboot: number of seconds U-Boot waits for key press before it boots the system
+    shell: command spawned as a system shell
+    """
+
+    def __init__(
+        self,
+        baudrate: typing.Optional[int] = 115200,
+        autoboot: int = 3,
+        shell: typing.Sequence[str] = SHELL,
+    ):
+        self.baudrate = baudrate
+        self.autoboot = autoboot
+        self.shell = tuple(shell)
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)  # No echo or conversions, this is the serial line
+        os.set_blocking(self._master, False)
+        self.path = os.ttyname(self._slave)
+        self._wakeup = os.pipe()
+        self._lock = threading.Lock()
+        self._request_reset: typing.Optional[bool] = None
+        self._closed = False
+
+        self._state = "reset"
+        self._deadline: typing.Optional[float] = None
+        self._countdown = 0
+        self._line = bytearray()
+        self._env: dict[str, str] = {"kernel_addr_r": "0x1000000"}
+        self._exit_code = 0
+        self._line_clock = 0.0
+        self._process: typing.Optional[subprocess.Popen] = None
+        self._process_fd: typing.Optional[int] = None
+        self._to_system = bytearray()  # input waiting to be written to system shell
+
+        self._shims = tempfile.TemporaryDirectory(prefix="nsfarm-simulated-")
+        for name, content in _SHIMS.items():
+            shim = pathlib.Path(self._shims.name) / name
+            shim.write_text(content)
+            shim.chmod(0o755)
+
+        self._thread = threading.Thread(target=self._thread_func, daemon=True)
+        self._thread.start()
+
+    @property
+    def state(self) -> str:
+        """Current state of emulation. It is one of: reset, autoboot, uboot, system"""
+        return self._state
+
+    def reset(self, state: bool) -> None:
+        """Set reset state. The board is held in reset if state is True and boots once it is set to False."""
+        with self._lock:
+            self._request_reset = state
+        os.write(self._wakeup[1], b"\0")
+
+    def close(self) -> None:
+        """Stop emulation and free all resources."""
+        if self._closed:
+            return
+        self._closed = True
+        os.write(self._wakeup[1], b"\0")
+        self._thread.join()
+        self._stop_system()
+        for fileno in (self._master, self._slave, *self._wakeup):
+            os.close(fileno)
+        self._shims.cleanup()
+
+    def __del__(self):
+        self.close()
+
+    def _thread_func(self):
+        while not self._closed:
+            fds = [self._wakeup[0], self._master]
+            if self._process_fd is not None:
+                fds.append(self._process_fd)
+            wfds = [self._process_fd] if self._to_system else []
+            timeout = None if self._deadline is None else max(0, self._deadline - time.monotonic())
+            readable, writable, _ = select.select(fds, wfds, [], timeout)
+            if self._wakeup[0] in readable:
+                os.read(self._wakeup[0], 64)
+                with self._lock:
+                    request, self._request_reset = self._request_reset, None
+                if request is True:
+                    self._stop_system()
+                    self._state, self._deadline = "reset", None
+                elif request is False and self._state == "reset":
+                    self._power_on()
+            if self._master in readable:
+                with contextlib.suppress(BlockingIOError):
+                    data = os.read(self._master, 4096)
+                    if self._state != "reset":
+                        self._input(data)
+            if self._process_fd is not None and self._process_fd in writable:
+                with contextlib.suppress(BlockingIOError):
+                    del self._to_system[: os.write(self._process_fd, self._to_system)]
+            if self._process_fd is not None and self._process_fd in readable:
+                try:
+                    data = os.read(self._process_fd, 4096)
+                except BlockingIOError:
+                    data = None
+                except OSError:  # EIO is reported once shell exits
+                    data = b""
+                if data:
+                    self._output(data)
+                elif data is not None:
+                    self._stop_system()
+                    self._output(b"\r\nreboot: Restarting system\r\n")
+                    self._power_on()
+            if self._deadline is not None and time.monotonic() >= self._deadline:
+                self._tick()
+
+    def _output(self, data: bytes) -> None:
+        """Write data to serial line with speed limited to baudrate."""
+        step = len(data) if not self.baudrate else max(1, self.baudrate // 1000)  # about millisecond of data
+        for i in range(0, len(data), step):
+            chunk = data[i : i + step]
+            if self.baudrate:
+                # Every byte is 10 bits on the line (start bit, 8 data bits, stop bit)
+                self._line_clock = max(self._line_clock, time.monotonic()) + len(chunk) * 10 / self.baudrate
+                delay = self._line_clock - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            while chunk and not self._closed:
+                try:
+                    chunk = chunk[os.write(self._master, chunk) :]
+                except BlockingIOError:
+                    # Wait for reader but check periodically if we are not closed (reader might be gone for good)
+                    select.select([], [self._master], [], 0.1)
+
+    def _power_on(self):
+        self._output(_BANNER + f"Hit any key to stop autoboot: {self.autoboot:2d} ".encode())
+        self._state = "autoboot"
+        self._countdown = self.autoboot
+        self._deadline = time.monotonic() + 1
+
+    def _tick(self):
+        assert self._state == "autoboot"
+        self._countdown -= 1
+        self._output(f"\b\b\b{self._countdown:2d} ".encode())
+        if self._countdown > 0:
+            self._deadline += 1
+        else:
+            self._output(b"\r\n")
+            self._boot()
+
+    def _input(self, data: bytes):
+        if self._state == "autoboot":
+            # Any key stops autoboot and the key itself is consumed
+            self._output(b"\b\b\b 0 \r\n=> ")
+            self._state, self._deadline = "uboot", None
+            self._line.clear()
+            data = data[1:]
+        if self._state == "uboot":
+            for byte in data:
+                self._uboot_input(byte)
+        elif self._state == "system":
+            self._to_system += data
+
+    def _uboot_input(self, byte: int):
+        if self._state != "uboot":
+            return  # Rest of input is for booted system
+        if byte in b"\r\n":
+            self._output(b"\r\n")
+            line = self._line.decode(errors="replace")
+            self._line.clear()
+            self._uboot_line(line)
+            if self._state == "uboot":
+                self._output(b"=> ")
+        elif byte == 0x03:  # Ctrl-C
+            self._line.clear()
+            self._output(b"<INTERRUPT>\r\n=> ")
+        elif byte in b"\x08\x7f":
+            if self._line:
+                self._line.pop()
+                self._output(b"\b \b")
+        else:
+            self._line.append(byte)
+            self._output(bytes((byte,)))
+
+    def _uboot_line(self, line: str):
+        for command in _split_commands(line):
+            try:
+                args = shlex.split(_EXPAND.sub(self._expand, command))
+            except ValueError:
+                self._output(b"Syntax error\r\n")
+                self._exit_code = 1
+                return
+            if not args:
+                continue
+            self._exit_code = self._uboot_command(args[0], args[1:])
+            if self._state != "uboot":
+                return
+
+    def _expand(self, match: re.Match) -> str:
+        if match.group(1) == "?":
+            return str(self._exit_code)
+        return self._env.get(match.group(2) or match.group(3), "")
+
+    def _uboot_command(self, name: str, args: list[str]) -> int:
+        """Execute U-Boot command and return its exit code."""
+        if name == "echo":
+            self._output(" ".join(args).encode() + b"\r\n")
+        elif name == "true":
+            pass
+        elif name == "false":
+            return 1
+        elif name == "setenv" and args:
+            if len(args) > 1:
+                self._env[args[0]] = " ".join(args[1:])
+            else:
+                self._env.pop(args[0], None)
+        elif name == "printenv":
+            for var in args if args else sorted(self._env):
+                if var not in self._env:
+                    self._output(f'## Error: "{var}" not defined\r\n'.encode())
+                    return 1
+                self._output(f"{var}={self._env[var]}\r\n".encode())
+        elif name == "tftpboot":
+            server, _, filename = (args[-1] if args else "").rpartition(":")
+            self._output(
+                f"Using ethernet@30000 device\r\n"
+                f"TFTP from server {server or self._env.get('serverip', '')}; "
+                f"our IP address is {self._env.get('ipaddr', '')}\r\n"
+                f"Filename '{filename}'.\r\n"
+                f"Load address: {args[0] if len(args) > 1 else self._env['kernel_addr_r']}\r\n"
+                "Loading: #################################################################\r\n"
+                "done\r\n"
+                "Bytes transferred = 1048576 (100000 hex)\r\n".encode()
+            )
+            self._env["filesize"] = "100000"
+        elif name == "gpio" and len(args) == 2 and args[0] == "input":
+            self._output(f"gpio: pin {args[1]} (gpio 0) value is 1\r\n".encode())
+            return 1  # U-Boot returns value of pin as exit code
+        elif name in ("boot", "bootm", "bootz"):
+            self._boot()
+        elif name == "reset":
+            self._output(b"resetting ...\r\n")
+            self._power_on()
+        else:
+            self._output(f"Unknown command '{name}' - try 'help'\r\n".encode())
+            return 1
+        return 0
+
+    def _boot(self):
+        self._output(_BOOT)
+        master, slave = pty.openpty()
+        try:
+            self._process = subprocess.Popen(
+                self.shell,
+                stdin=slave,
+                stdout=slave,
+                stderr=slave,
+                cwd="/",
+                env={
+                    "PS1": "root@turris:/# ",
+                    "PATH": f"{self._shims.name}:{os.environ.get('PATH', os.defpath)}",
+                    "HOME": "/root",
+                    "LC_ALL": "C",
+                },
+                start_new_session=True,
+                preexec_fn=lambda: fcntl.ioctl(0, termios.TIOCSCTTY, 0),
+            )
+        except BaseException:
+            os.close(master)
+            raise
+        finally:
+            os.close(slave)
+        os.set_blocking(master, False)
+        self._process_fd = master
+        self._state, self._deadline = "system", None
+
+    def _stop_system(self):
+        if self._process is None:
+            return
+        try:
+            os.killpg(self._process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self._process.wait()
+        os.close(self._process_fd)
+        self._process, self._process_fd = None, None
+        self._to_system.clear()
+
+
+def _split_commands(line: str) -> list[str]:
+    """Split command line to separate commands on semicolons that are not quoted."""
+    commands = []
+    quote = None
+    start = 0
+    for i, char in enumerate(line):
+        if quote is not None:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char == ";":
+            commands.append(line[start:i])
+            start = i + 1
+    commands.append(line[start:])
+    return commands
+
+
+class SimulatedBoard(Board):
+    """Board with SimulatedConsole as serial console.
+
+    The boot is performed without TFTP server thus bootup does not need LXD client. The network interfaces are only
+    placeholders as there is no network connection to the simulated board.
+    """
+
+    def __init__(self, console: typing.Optional[SimulatedConsole] = None, name: str = "simulated"):
+        self.console = console if console is not None else SimulatedConsole()
+        conf = configparser.ConfigParser()
+        conf.read_dict({name: {"board": "simulated", "serial": self.console.path}})
+        super().__init__(Target(name, conf[name]))
+
+    def reset(self, state):
+        self.console.reset(state)
+
+    def bootup(self, lxd_client=None, os_branch: str = "hbk") -> cli.Shell:
+        """Boot simulated system. The arguments are ignored and are present only for compatibility."""
+        while not self._bootup(None):
+            pass
+        return self._wait_for_system()
+
+    def close(self):
+        """Close serial console and stop simulation."""
+        self._fdlogging.close()
+        self._serial.close()
+        self.console.close()
+
+    @property
+    def wan(self):
+        return "wan"
+
+    @property
+    def lan1(self):
+        return "lan1"
+
+    @property
+    def lan2(self):
+        return "lan2"
+
+    @property
+    def lan3(self):
+        return "lan3"
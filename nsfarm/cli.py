@@ -9,28 +9,54 @@ support for shell and u-boot.  They differ in a way how they handle prompt and m
 # reason also use \n\r so we match both alternatives.
 #
 import abc
+import asyncio
 import base64
 import collections.abc
+import contextlib
 import fcntl
+import gzip
+import hashlib
 import io
+import json
 import logging
 import os
 import pathlib
+import pty
+import queue
 import re
 import select
 import socket
+import tempfile
+import termios
 import threading
+import time
 import typing
 
 import pexpect
 
-from . import mterm
+from . import mterm, session
 
 CTRL_C = "\x03"
 CTRL_D = "\x04"
 
 _FLUSH_BUFFLEN = 2048
 
+# Size of chunks binary files are read in. This limits size of output we have to match prompt in.
+_BIN_READ_CHUNK = 65536
+# Size of base64 encoded chunks binary files are written in. This is less than what PTYs can buffer so echo of single
+# chunk can't block the terminal.
+_BIN_WRITE_CHUNK = 4096
+# Minimal size of binary file transfer for which compression is used in default
+_BIN_COMPRESS_MIN = 4096
+# Default size of the output tail prompt is looked for in
+_SEARCH_WINDOW = 4096
+# Size of spooled output kept in memory before it is written to the temporary file
+_SPOOL_MAX_SIZE = 2**20
+# Default size of buffer for data waiting to be relayed by FDLogging (per direction)
+_FDLOGGING_BUFFER = 2**16
+# Maximum number of records waiting in LogQueue before logging of streams blocks
+_LOG_QUEUE_SIZE = 2**14
+
 
 def pexpect_flush(pexpect_handle):
     """Flush all input on pexpect. This effectively reads everything."""
@@ -44,14 +70,65 @@ def pexpect_flush(pexpect_handle):
             return
 
 
+class CommandRecord(typing.NamedTuple):
+    """Timing and amount of transferred data for single command (see CommandTrace).
+
+    All times are in seconds since the epoch.
+    """
+
+    cmd: str
+    sent: float  # time the command was sent
+    echoed: float  # time the echo of command was matched (same as sent if echo is not matched)
+    prompted: float  # time the prompt was matched
+    bytes_out: int  # number of bytes sent as part of the command
+    bytes_in: int  # number of bytes received till prompt (including echo)
+    exit_code: typing.Optional[int]  # exit code of command or None if not collected
+
+
+class CommandTrace:
+    """Ring buffer of records for commands executed trough Cli.
+
+    The tracing is enabled by assigning instance of this class to Cli.trace. Only the given number of the latest records
+    is kept.
+    """
+
+    def __init__(self, size: int = 4096):
+        self.records: collections.deque[CommandRecord] = collections.deque(maxlen=size)
+
+    def add(self, record: CommandRecord) -> None:
+        """Add new record (the oldest one is dropped if buffer is full)."""
+        self.records.append(record)
+
+    def clear(self) -> None:
+        """Drop all records."""
+        self.records.clear()
+
+    def since(self, timestamp: float) -> list[CommandRecord]:
+        """Provide all records for commands sent at given time or later."""
+        return [record for record in self.records if record.sent >= timestamp]
+
+    def json(self, records: typing.Optional[collections.abc.Iterable[CommandRecord]] = None) -> str:
+        """Export records in JSON.
+
+        records: records to be exported instead of the whole buffer.
+        """
+        return json.dumps([record._asdict() for record in (self.records if records is None else records)])
+
+
 class Cli(abc.ABC):
     """This is generic abstraction on top of pexpect for command line interface."""
 
     _NOCMD: str
     _PROMPT: re.Pattern
+    _echo: bool = True
+    _search_window: typing.Optional[int] = None
+
+    # Set to CommandTrace instance to record timing of all commands
+    trace: typing.Optional[CommandTrace] = None
 
     def __init__(self, pexpect_handle, flush=True):
         self._pe = pexpect_handle
+        self._traced: typing.Optional[dict[str, typing.Any]] = None
         if flush:
             self.flush()
 
@@ -64,14 +141,27 @@ class Cli(abc.ABC):
 
         This is handy when you are communicating with console that echoes input back. This effectively removes sent
         command from output.
+
+        The echo matching is skipped if terminal echo was disabled (see Shell's echo argument). The command is then
+        only sent and costs no additional expect calls no matter how long it is.
         """
+        if self.trace is not None:
+            self._traced = {"cmd": cmd, "sent": time.time(), "bytes_out": len(cmd) + len(os.linesep), "bytes_in": 0}
         self.sendline(cmd)
+        if not self._echo:
+            if self._traced is not None:
+                self._traced["echoed"] = self._traced["sent"]
+            return
         # Note: We have to expect possible line break after every character because terminal breaks echoed characters
         # when there is more characters than columns. We could also simply disable echo but that is not always possible
         # in our case. In the end there should be no issue in matching random new lines in command we sent.
         for char in cmd:
             self.expect_exact([char, "\r", "\n"])
+            self._trace_received()
         self.expect_exact(["\r\n", "\n\r"])
+        self._trace_received()
+        if self._traced is not None:
+            self._traced["echoed"] = time.time()
 
     def prompt(
         self, pattern: typing.Optional[collections.abc.Sequence[typing.Union[bytes, str, re.Pattern]]] = None, **kwargs
@@ -81,14 +171,15 @@ class Cli(abc.ABC):
         pattern: custom pattern to look for alongside of prompt. This is mostly used to catch errors early without
           waiting for command to fully timeout to the prompt.
 
-        All unknown keyword arguments are passed to pexpect's expect call.
+        All unknown keyword arguments are passed to pexpect's expect call. The search window (pexpect's
+        searchwindowsize) configured for the Cli instance is used if no pattern is provided.
 
         Return:
           Return depends on if pattern is used or not. When no pattern is None then exit code is returned. When pattern
           is provided then the matched pattern index (0 for prompt) is returned instead.
         """
         if pattern is not None:
-            return self.expect(
+            index = self.expect(
                 [self._PROMPT]
                 + [
                     p if isinstance(p, re.Pattern) else re.compile(p if isinstance(p, bytes) else p.encode())
@@ -96,8 +187,35 @@ class Cli(abc.ABC):
                 ],
                 **kwargs,
             )
+            traced = self._trace_prompt()
+            if index == 0:
+                self._trace_add(traced, None)
+            else:
+                self._traced = traced  # Prompt was not reached yet
+            return index
+        kwargs.setdefault("searchwindowsize", self._search_window)
         self.expect(self._PROMPT, **kwargs)
-        return self.exit_code
+        traced = self._trace_prompt()
+        exit_code = self.exit_code
+        self._trace_add(traced, exit_code)
+        return exit_code
+
+    def _trace_received(self) -> None:
+        """Count bytes consumed by the latest expect call to the traced command."""
+        if self._traced is not None:
+            self._traced["bytes_in"] += len(self._pe.before) + len(self._pe.after)
+
+    def _trace_prompt(self) -> typing.Optional[dict[str, typing.Any]]:
+        """Finish tracing of the current command as prompt was matched. The traced data are returned."""
+        self._trace_received()
+        traced, self._traced = self._traced, None
+        if traced is not None:
+            traced["prompted"] = time.time()
+        return traced
+
+    def _trace_add(self, traced: typing.Optional[dict[str, typing.Any]], exit_code: typing.Optional[int]) -> None:
+        if traced is not None and self.trace is not None and "echoed" in traced:
+            self.trace.add(CommandRecord(**traced, exit_code=exit_code))
 
     @property
     def exit_code(self) -> int:
@@ -173,10 +291,18 @@ class Cli(abc.ABC):
         """
         if new_prompt:
             self._pe.sendline(self._NOCMD)
-            os.read(self._pe.fileno(), len(self._NOCMD) + 1)  # Eat up no command and new line character
+            if self._echo:
+                os.read(self._pe.fileno(), len(self._NOCMD) + 1)  # Eat up no command and new line character
         mterm.mterm(self._pe.fileno())
 
 
+class CommandResult(typing.NamedTuple):
+    """Result of single command executed as part of the batch (see Shell.run_many)."""
+
+    exit_code: typing.Optional[int]  # None if command was not executed at all (see stop_on_failure of run_many)
+    output: str
+
+
 class Shell(Cli):
     """Unix shell support class.
 
@@ -184,6 +310,16 @@ class Shell(Cli):
 
     Warning: this changes the prompt and it won't revert it. In most use cases this should not be an issue but keep it
     on mind when using this.
+
+    The terminal echo can be disabled on initialization with echo argument. The echo is matched character by character
+    in command() and that is pretty expensive for long commands (every character is a separate expect call). With echo
+    disabled the command is only sent and no matching is required. This is not default as interactive usage (mterm)
+    without echo is pretty confusing and the echoed command is commonly expected in logs.
+
+    The prompt is looked for only in the tail of the output (the search window). Without it the whole output collected
+    so far is searched every time new data arrives and that makes commands with huge outputs quadratically slow. The
+    full output is still available in output. The window size can be changed with search_window argument on
+    initialization and None disables it.
     """
 
     _NOCMD = ":"
@@ -195,17 +331,81 @@ class Shell(Cli):
         re.compile(b"bash-.+?($|#) "),  # Default Bash prompt
         _PROMPT,
     ]
-
-    def __init__(self, pexpect_handle: pexpect.spawnbase, flush: bool = True):
+    # The marker is split by quotes in command so echoed command is not matched
+    _BATCH_MARKER = 'echo "nsf""batch:$?"'
+    _BATCH_STOP_MARKER = 'echo "nsf""batch:$nsfbatch"'
+    _BATCH_PATTERN = re.compile("(\r\n|\n\r)?nsfbatch:([0-9]+)(\r\n|\n\r|$)")
+    # Matches all complete lines in the buffer (used to consume output when spooling)
+    _SPOOL_LINES = re.compile(b"(?s).*\n")
+
+    def __init__(
+        self,
+        pexpect_handle: pexpect.spawnbase,
+        flush: bool = True,
+        echo: bool = True,
+        search_window: typing.Optional[int] = _SEARCH_WINDOW,
+    ):
         super().__init__(pexpect_handle, flush=flush)
+        self._search_window = search_window
+        self._spool: typing.Optional[io.TextIOWrapper] = None
+        self._gzip: typing.Optional[bool] = None
         # Firt check if we are on some sort of shell prompt
         self.expect(self._INITIAL_PROMPTS)
         # Now sanitize prompt format
         self.run(self._SET_NSF_PROMPT)
+        if not echo:
+            # Note: this command is still echoed so we can disable echo matching only after it.
+            self.run("stty -echo")
+            self._echo = False
 
     def _exit_code(self):
         return int(self.match(2))
 
+    def run_many(
+        self, cmds: collections.abc.Iterable[str], check: bool = True, stop_on_failure: bool = False, **kwargs
+    ) -> list[CommandResult]:
+        """Run multiple commands in single round trip.
+
+        Commands are joined to single command line where every command is followed by echo of marker with its exit
+        code. The whole batch is this way sent at once and only one prompt is awaited. All commands are executed no
+        matter if some of them fail (same as if they would be separated by semicolon) unless stop_on_failure is set.
+
+        Note that commands have to be terminated by semicolon. That means that you can't pass command that is terminated
+        by new line or is send to background with ampersand. Also all commands have to fit to the single command line.
+
+        cmds: commands to be executed
+        check: check if all commands exited with zero exit code
+        stop_on_failure: do not execute commands following the first one that failed (same as if they would be
+          chained with &&). Commands that were not executed are reported with None as exit code.
+        All other key-word arguments are passed to prompt call.
+
+        Returns list of exit codes and outputs, one for every command in cmds.
+        """
+        cmds = list(cmds)
+        if not cmds:
+            return []
+        if stop_on_failure:
+            cmdline = ""
+            for cmd in reversed(cmds):
+                rest = f' [ "$nsfbatch" -eq 0 ] && {{ {cmdline} }};' if cmdline else ""
+                cmdline = f"{cmd}; nsfbatch=$?; {self._BATCH_STOP_MARKER};{rest}"
+        else:
+            cmdline = " ".join(f"{cmd}; {self._BATCH_MARKER};" for cmd in cmds)
+        self.run(cmdline, check=False, **kwargs)
+        output = self.output
+        results = []
+        start = 0
+        for match in self._BATCH_PATTERN.finditer(output):
+            results.append(CommandResult(int(match.group(2)), output[start : match.start()]))
+            start = match.end()
+        if stop_on_failure and results and results[-1].exit_code != 0 and len(results) < len(cmds):
+            results += [CommandResult(None, "")] * (len(cmds) - len(results))
+        if len(results) != len(cmds):
+            raise Exception(f"Batch provided {len(results)} results instead of {len(cmds)}: {output}")
+        if check:
+            assert all(result.exit_code == 0 for result in results)
+        return results
+
     def txt_read(
         self, path: typing.Union[str, pathlib.PurePosixPath], expect_exist: bool = True
     ) -> typing.Optional[str]:
@@ -239,43 +439,420 @@ class Shell(Cli):
             raise Exception(f"Writing file failed with exit code: {exit_code}")
 
     def bin_read(
-        self, path: typing.Union[str, pathlib.PurePosixPath], expect_exist: bool = True
+        self,
+        path: typing.Union[str, pathlib.PurePosixPath],
+        expect_exist: bool = True,
+        compress: typing.Optional[bool] = None,
     ) -> typing.Optional[bytes]:
         """Read binary file via shell encoded in base64.
 
+        The file is transferred in chunks of limited size so we never have to match prompt in huge output. The content
+        is verified against MD5 checksum calculated on the other side.
+
         path: path to file to read
         expect_exist: raise exception if file can't be read
+        compress: compress transferred chunks with gzip. In default it is used if gzip is available and file is not
+          tiny.
 
         Returns bytes with content of binary file from the path or None if file can't be read in some cases.
         """
-        if self.run(f"base64 '{path}'", check=False) != 0:
+        info = self.run_many([f"md5sum '{path}'", f"wc -c < '{path}'"], check=False)
+        if any(result.exit_code != 0 for result in info):
             if expect_exist:
                 raise Exception(f"Can't get file: {path}")
             return None
-        return base64.b64decode(self.output)
-
-    def bin_write(self, path: typing.Union[str, pathlib.PurePosixPath], content: bytes) -> None:
+        checksum = info[0].output.split()[0]
+        size = int(info[1].output)
+        if compress is None:
+            compress = size > _BIN_COMPRESS_MIN and self._has_gzip()
+        content = bytearray()
+        for block in range(0, (size + _BIN_READ_CHUNK - 1) // _BIN_READ_CHUNK):
+            self.run(
+                f"dd if='{path}' bs={_BIN_READ_CHUNK} skip={block} count=1 2>/dev/null"
+                + (" | gzip -c" if compress else "")
+                + " | base64"
+            )
+            chunk = base64.b64decode(self.output)
+            content += gzip.decompress(chunk) if compress else chunk
+        if hashlib.md5(content).hexdigest() != checksum:
+            raise Exception(f"Checksum mismatch for read file: {path}")
+        return bytes(content)
+
+    def bin_write(
+        self, path: typing.Union[str, pathlib.PurePosixPath], content: bytes, compress: typing.Optional[bool] = None
+    ) -> None:
         """Write given bytes to binary file in path.
 
+        The content is streamed in chunks of limited size and echoed data are dropped after every chunk. The written
+        file is verified against MD5 checksum of content.
+
         Note that parent directory has to exist and any file will be rewritten.
 
         path: path to file to be written.
         content: bytes to be written to binary file.
+        compress: compress transferred data with gzip. In default it is used if gzip is available and content is not
+          tiny.
         """
-        self.sendline(f"base64 -d > '{path}'")
-        self.sendline(base64.b64encode(content))
+        if compress is None:
+            compress = len(content) > _BIN_COMPRESS_MIN and self._has_gzip()
+        encoded = base64.encodebytes(gzip.compress(content) if compress else content)
+        self.command(f"base64 -d {'| gzip -d ' if compress else ''}> '{path}'")
+        # Note: the delay before send is there for consoles that are not able to process command input fast enough but
+        # that is not the case for stream of data.
+        delaybeforesend = self._pe.delaybeforesend
+        self._pe.delaybeforesend = None
+        try:
+            for i in range(0, len(encoded), _BIN_WRITE_CHUNK):
+                self.send(encoded[i : i + _BIN_WRITE_CHUNK])
+                self.flush()  # Drop echo so it won't pile up in buffer
+        finally:
+            self._pe.delaybeforesend = delaybeforesend
         self.ctrl_d()
         exit_code = self.prompt()
         if exit_code != 0:
             raise Exception(f"Writing file failed with exit code: {exit_code}")
+        self.run(f"md5sum '{path}'")
+        if self.output.split()[0] != hashlib.md5(content).hexdigest():
+            raise Exception(f"Checksum mismatch for written file: {path}")
+
+    def prompt_spooled(self, max_size: int = _SPOOL_MAX_SIZE, **kwargs) -> int:
+        """Follow output until prompt is reached while output is spooled to temporary file.
+
+        This is an alternative to prompt() for commands with huge outputs. The output is consumed as it arrives and it
+        is written to the temporary file once it exceeds max_size (it is kept in memory till then). It is provided as a
+        text stream in spooled_output. The output property is not valid after this call.
+
+        max_size: size of output kept in memory
+        All other key-word arguments are passed to pexpect's expect calls. Note that timeout is applied to every chunk
+        of the output not the whole output.
+
+        Returns exit code of command.
+        """
+        if self._spool is not None:
+            self._spool.close()
+        spool = tempfile.SpooledTemporaryFile(max_size=max_size)
+        kwargs.setdefault("searchwindowsize", self._search_window)
+        pending = b""  # Line terminator is written only once we know that it is not part of prompt
+        while self.expect([self._PROMPT, self._SPOOL_LINES], **kwargs) != 0:
+            self._trace_received()
+            spool.write(pending)
+            data = self._pe.before + self._pe.after
+            split = len(data) - (2 if data.endswith(b"\r\n") else 1)
+            spool.write(data[:split])
+            pending = data[split:]
+        traced = self._trace_prompt()
+        if self._pe.before or self._pe.match.group(1) is not None:
+            spool.write(pending + self._pe.before)
+        spool.seek(0)
+        self._spool = io.TextIOWrapper(spool, newline=None)
+        exit_code = self.exit_code
+        self._trace_add(traced, exit_code)
+        return exit_code
+
+    def run_spooled(self, cmd: str = "", check: bool = True, **kwargs) -> int:
+        """Run given command and spool its output. This is the same as run() but with prompt_spooled() instead of
+        prompt().
+        """
+        self.command(cmd)
+        ecode = self.prompt_spooled(**kwargs)
+        if check:
+            assert ecode == 0
+        return ecode
+
+    @property
+    def spooled_output(self) -> io.TextIOWrapper:
+        """Output of the latest prompt_spooled() call as text stream.
+
+        The line endings are translated to the new line character. The stream is closed on the next prompt_spooled()
+        call.
+        """
+        assert self._spool is not None
+        return self._spool
+
+    def _has_gzip(self) -> bool:
+        """Check if gzip is available in shell. The result is cached."""
+        if self._gzip is None:
+            self._gzip = self.run("command -v gzip >/dev/null", check=False) == 0
+        return self._gzip
 
     def _output(self):
         return self._pe.before.decode()
 
 
+class AsyncShell:
+    """Asyncio counterpart of Shell.
+
+    This spawns command in its own pseudo-terminal and communicates with it using event loop instead of blocking
+    pexpect calls. That allows driving multiple shells (such as in multiple containers) concurrently from single thread.
+
+    The interface mimics Shell but all communicating methods are coroutines. Terminal echo is always disabled so
+    command() only sends given command. Timeouts and end of file are reported with pexpect.TIMEOUT and pexpect.EOF
+    exceptions so they are the same as with Shell.
+
+    Use spawn() or attach() to create new instance.
+    """
+
+    def __init__(
+        self,
+        process: typing.Union[asyncio.subprocess.Process, pexpect.spawnbase.SpawnBase],
+        fileno: int,
+        logger: typing.Optional[logging.Logger] = None,
+        recorder: typing.Optional[session.Recorder] = None,
+    ):
+        """process: spawned process or pexpect handle owning fileno (such as nsfarm.lxd.spawn.ExecSpawn)
+        fileno: master side of pseudo-terminal process is running in. It is closed on close().
+        logger: logger used to log output of the process
+        recorder: session recorder used to record raw communication
+        """
+        self._process = process
+        self._fd = fileno
+        self._recorder = recorder
+        self._loop = asyncio.get_running_loop()
+        self._buffer = b""
+        self._eof = False
+        self._event = asyncio.Event()
+        self._logging = PexpectLogging(logger) if logger is not None else None
+        self.before = b""
+        self.after = b""
+        self.match: typing.Optional[re.Match] = None
+        os.set_blocking(self._fd, False)
+        self._loop.add_reader(self._fd, self._read)
+
+    @classmethod
+    async def spawn(
+        cls,
+        command: collections.abc.Sequence[str],
+        env: typing.Optional[dict[str, str]] = None,
+        logger: typing.Optional[logging.Logger] = None,
+        timeout: typing.Optional[float] = 30,
+        recorder: typing.Optional[session.Recorder] = None,
+    ) -> "AsyncShell":
+        """Spawn command in new pseudo-terminal and initialize shell in it.
+
+        command: command and its arguments to be spawned (it should start shell)
+        env: environment for the command (the current one is used if not provided)
+        logger: logger used to log output of the command
+        timeout: timeout for initial prompt
+        recorder: session recorder used to record raw communication
+
+        Returns initialized AsyncShell instance.
+        """
+        master, slave = pty.openpty()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdin=slave,
+                stdout=slave,
+                stderr=slave,
+                env=env,
+                start_new_session=True,
+                preexec_fn=lambda: fcntl.ioctl(0, termios.TIOCSCTTY, 0),
+            )
+        except BaseException:
+            os.close(master)
+            raise
+        finally:
+            os.close(slave)
+        return await cls._initialize(cls(process, master, logger, recorder), timeout)
+
+    @classmethod
+    async def attach(
+        cls,
+        handle: pexpect.spawnbase.SpawnBase,
+        logger: typing.Optional[logging.Logger] = None,
+        timeout: typing.Optional[float] = 30,
+        recorder: typing.Optional[session.Recorder] = None,
+    ) -> "AsyncShell":
+        """Initialize shell in command already spawned with pexpect handle (such as nsfarm.lxd.spawn.ExecSpawn).
+
+        The file descriptor of the handle is used directly and the handle is closed on close(). The handle should not
+        be used for anything else.
+
+        Returns initialized AsyncShell instance.
+        """
+        return await cls._initialize(cls(handle, handle.child_fd, logger, recorder), timeout)
+
+    @staticmethod
+    async def _initialize(shell: "AsyncShell", timeout: typing.Optional[float]) -> "AsyncShell":
+        try:
+            await shell.expect(Shell._INITIAL_PROMPTS, timeout=timeout)
+            # Note: both commands are echoed but that can't match prompt so it is just skipped
+            for cmd in (Shell._SET_NSF_PROMPT, "stty -echo"):
+                await shell.command(cmd)
+                await shell.prompt(timeout=timeout)
+        except BaseException:
+            await shell.close()
+            raise
+        return shell
+
+    def _read(self) -> None:
+        try:
+            data = os.read(self._fd, io.DEFAULT_BUFFER_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:  # EIO is reported by Linux once the other side of pseudo-terminal is closed
+            data = b""
+        if data:
+            self._buffer += data
+            if self._logging is not None:
+                self._logging.write(data)
+            if self._recorder is not None:
+                self._recorder.record(session.Direction.IN, data)
+        else:
+            self._eof = True
+            self._loop.remove_reader(self._fd)
+        self._event.set()
+
+    async def send(self, data: typing.Union[str, bytes]) -> None:
+        """Send given data to the terminal."""
+        data = data.encode() if isinstance(data, str) else data
+        while data:
+            try:
+                written = os.write(self._fd, data)
+                if self._recorder is not None:
+                    self._recorder.record(session.Direction.OUT, data[:written])
+                data = data[written:]
+            except BlockingIOError:
+                writable = self._loop.create_future()
+                self._loop.add_writer(self._fd, writable.set_result, None)
+                try:
+                    await writable
+                finally:
+                    self._loop.remove_writer(self._fd)
+
+    async def sendline(self, line: typing.Union[str, bytes] = "") -> None:
+        """Send given line to the terminal. The new line character is appended."""
+        await self.send((line.encode() if isinstance(line, str) else line) + os.linesep.encode())
+
+    async def expect(
+        self,
+        pattern: typing.Union[re.Pattern, collections.abc.Sequence[re.Pattern]],
+        timeout: typing.Optional[float] = 30,
+    ) -> int:
+        """Wait for output to match any of given compiled regular expressions.
+
+        The earliest match in output wins, the first pattern in case of tie (this is the same as in pexpect). Attributes
+        before, after and match are set just like in pexpect.
+
+        Returns index of matched pattern.
+        """
+        patterns = [pattern] if isinstance(pattern, re.Pattern) else list(pattern)
+        deadline = None if timeout is None else self._loop.time() + timeout
+        while True:
+            best = None
+            for i, pat in enumerate(patterns):
+                match = pat.search(self._buffer)
+                if match is not None and (best is None or match.start() < best[1].start()):
+                    best = (i, match)
+            if best is not None:
+                index, self.match = best
+                self.before = self._buffer[: self.match.start()]
+                self.after = self.match.group()
+                self._buffer = self._buffer[self.match.end() :]
+                return index
+            if self._eof:
+                raise pexpect.EOF(f"End of file reached while waiting for: {patterns}")
+            self._event.clear()
+            try:
+                await asyncio.wait_for(
+                    self._event.wait(), None if deadline is None else max(deadline - self._loop.time(), 0)
+                )
+            except asyncio.TimeoutError as exc:
+                raise pexpect.TIMEOUT(f"Timeout exceeded while waiting for: {patterns}") from exc
+
+    async def command(self, cmd: str = "") -> None:
+        """Send command to the shell."""
+        await self.sendline(cmd)
+
+    async def prompt(
+        self, pattern: typing.Optional[collections.abc.Sequence[typing.Union[bytes, str, re.Pattern]]] = None, **kwargs
+    ) -> int:
+        """Follow output until prompt is reached and parse it.
+
+        This behaves the same way as Shell.prompt.
+        """
+        if pattern is not None:
+            return await self.expect(
+                [Shell._PROMPT]
+                + [
+                    p if isinstance(p, re.Pattern) else re.compile(p if isinstance(p, bytes) else p.encode())
+                    for p in pattern
+                ],
+                **kwargs,
+            )
+        await self.expect(Shell._PROMPT, **kwargs)
+        return self.exit_code
+
+    async def run(self, cmd: str = "", check: bool = True, **kwargs) -> int:
+        """Run given command and follow output until prompt is reached and return exit code with optional check.
+
+        This behaves the same way as Shell.run.
+        """
+        await self.command(cmd)
+        ecode = await self.prompt(**kwargs)
+        if check:
+            assert ecode == 0
+        return ecode
+
+    @property
+    def exit_code(self) -> int:
+        """Provide exit code of the last command."""
+        assert self.match is not None and self.match.re is Shell._PROMPT
+        return int(self.match.group(2))
+
+    @property
+    def output(self) -> str:
+        """All output before latest prompt."""
+        assert self.match is not None and self.match.re is Shell._PROMPT
+        return self.before.decode()
+
+    async def ctrl_c(self) -> None:
+        """Send ^C character."""
+        await self.send(CTRL_C)
+
+    async def ctrl_d(self) -> None:
+        """Send ^D character."""
+        await self.send(CTRL_D)
+
+    async def close(self, timeout: float = 5) -> None:
+        """Release pseudo-terminal and wait for process to terminate.
+
+        Closing the pseudo-terminal results in hang up signal (SIGHUP) being sent to the process. Attached pexpect
+        handle is closed instead.
+
+        timeout: time given to the process to terminate before it is killed
+        """
+        if self._fd < 0:
+            return
+        if not self._eof:
+            self._loop.remove_reader(self._fd)
+        if self._logging is not None:
+            self._logging.aggregate.flush()
+        if not isinstance(self._process, asyncio.subprocess.Process):
+            self._fd = -1
+            await self._loop.run_in_executor(None, self._process.close)  # This closes file descriptor as well
+            return
+        os.close(self._fd)
+        self._fd = -1
+        try:
+            await asyncio.wait_for(self._process.wait(), timeout)
+        except asyncio.TimeoutError:
+            self._process.kill()
+            await self._process.wait()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, etype, value, traceback):
+        await self.close()
+
+
 class Uboot(Cli):
     """U-boot prompt support class.
 
+    Every command is framed with echo of its exit code so command, its output and its exit code are received in single
+    exchange. The separate echo of exit code is used only if that is not possible (such as for empty command).
+
     Warning:
       Be aware that new_output is captured only when exit_code method is called. This happens automatically if you use
       prompt method without pattern argument or run method but still be aware that it is not fully automatic as with
@@ -285,17 +862,37 @@ class Uboot(Cli):
     _NOCMD = ";"
     _PROMPT = re.compile(b"(\r\n|\n\r|^)=> ")
     _EXIT_CODE_ECHO = "echo $?"
+    _EXIT_CODE_FRAME = "; echo nsfexit:$?"
+    _EXIT_CODE_PATTERN = re.compile("(\r\n|\n\r|^)nsfexit:([0-9]+)$")
 
     def __init__(self, pexpect_handle, flush=True):
         super().__init__(pexpect_handle, flush=flush)
         self.__output = ""
+        self.__framed = False
         self.run("true")  # Check if we are in U-boot prompt
 
+    def command(self, cmd: str = "") -> None:
+        """Send command the same way as Cli.command does but with _EXIT_CODE_FRAME appended.
+
+        The frame prints exit code of the command right after its output so it is received together with the prompt.
+        Empty command is sent as it is because it can't be framed.
+        """
+        self.__framed = bool(cmd.strip())
+        super().command(cmd + self._EXIT_CODE_FRAME if self.__framed else cmd)
+
     def _exit_code(self):
         # Collect output before we check for exit code
         self.__output = self._pe.before.decode()
+        if self.__framed:
+            self.__framed = False
+            match = self._EXIT_CODE_PATTERN.search(self.__output)
+            if match is None:
+                # Exit code of the command can't be received any other way as the frame was executed after it
+                raise Exception(f"Exit code frame is missing in output of command: {self.__output}")
+            self.__output = self.__output[: match.start()]
+            return int(match.group(2))
         # We have to use dedicated command in U-Boot to check exit code.
-        self.command(self._EXIT_CODE_ECHO)
+        super().command(self._EXIT_CODE_ECHO)
         self.expect(self._PROMPT)
         return int(self._pe.before.decode())
 
@@ -307,37 +904,163 @@ class LineBytesAggregate:
     """Aggregates bytes and dispatches them in lines instead.
     This is primarily used to split stream of communication in CLI session to distinct blocks that makes sense to send
     to logging system.
+
+    Both carriage return and new line characters end the line. Carriage returns at the start of the line are ignored as
+    well as the new line character right after carriage return (thus "\\r\\n" and "\\n\\r" are considered a single line
+    end).
     """
 
     def __init__(self, callback: typing.Callable[[bytes], None]):
         self._callback = callback
-        self.linebuf = b""
+        self.linebuf = bytearray()
         self.newline = True
 
     def add(self, buf: bytes) -> None:
         """Add bytes to aggregate."""
-        jbuf = self.linebuf + buf
-        i = 0
-        while i < len(jbuf):
-            if jbuf[i] == b"\r"[0] or (not self.newline and jbuf[i] == b"\n"[0]):
-                self.newline = self.newline or jbuf[i] == b"\n"[0]
-                i += 1
-                continue  # skip new line characters
-            ri = jbuf.find(b"\r", i)  # cursor leftward
-            ni = jbuf.find(b"\n", i)  # cursor to the new line
-            eol = ri if ni == -1 else ni if ri == -1 else min(ri, ni)
-            if eol == -1:  # No new line byte located, store for now
-                self.linebuf = jbuf[i:]
-                return
-            self._callback(jbuf[i:eol])
-            i = eol + 1
-            self.newline = eol == ni
-        self.linebuf = b""
+        end = max(buf.rfind(b"\n"), buf.rfind(b"\r")) + 1
+        if not end:  # No line end so just store it
+            self.linebuf += buf
+            return
+        if self.linebuf:  # Finish line started in previous data
+            self.linebuf += buf[:end]
+            complete = bytes(self.linebuf)
+            self.linebuf.clear()
+        else:
+            complete = bytes(buf[:end])
+        for line in complete.splitlines(keepends=True):
+            if line[0] != 0x0D and line[0] != 0x0A:
+                self._callback(line.rstrip(b"\r\n"))
+                self.newline = line[-1] == 0x0A
+            elif line[-1] == 0x0A:
+                # Empty line is reported only if new line is not part of previous line end
+                if self.newline:
+                    self._callback(b"")
+                self.newline = True
+        self.linebuf += buf[end:]
 
     def flush(self):
         """Dispatch unfinished line."""
         if self.linebuf:
-            self._callback(self.linebuf)
+            self._callback(bytes(self.linebuf))
+            self.linebuf.clear()
+
+
+class _LineRepr:
+    """Lazy escaped representation of line. It is formatted only once it is really needed."""
+
+    __slots__ = ("line",)
+
+    def __init__(self, line: bytes):
+        self.line = line
+
+    def __str__(self):
+        return repr(self.line.expandtabs())[2:-1]
+
+
+class LogQueue:
+    """Background writer for logs of streams (such as serial console or pexpect handle).
+
+    Lines of streams are in default logged right away in thread that reads the stream. That means that formatting and
+    all handlers are executed on I/O path which slows down reading and can even cause data loss on serial console. With
+    LogQueue started the records are only created and queued. Their formatting and handling is performed in the
+    background thread.
+
+    Records are passed to handlers of the logger they were created for the same way as if they were logged directly.
+    Only the time at which handlers see them differs. Use flush() to make sure that all records were handled.
+    """
+
+    _queue: typing.Optional[queue.Queue] = None
+    _thread: typing.Optional[threading.Thread] = None
+
+    @classmethod
+    def start(cls, maxsize: int = _LOG_QUEUE_SIZE) -> None:
+        """Start background writer. Nothing is done if it is already running."""
+        if cls._queue is not None:
+            return
+        cls._queue = queue.Queue(maxsize)
+        cls._thread = threading.Thread(target=cls._thread_func, args=(cls._queue,), daemon=True)
+        cls._thread.start()
+
+    @classmethod
+    def stop(cls) -> None:
+        """Handle all queued records and stop background writer."""
+        if cls._queue is None:
+            return
+        que, thread = cls._queue, cls._thread
+        cls._queue, cls._thread = None, None
+        que.put(None)
+        thread.join()
+
+    @classmethod
+    def flush(cls) -> None:
+        """Wait for all queued records to be handled."""
+        if cls._queue is not None:
+            cls._queue.join()
+
+    @classmethod
+    def running(cls) -> bool:
+        """If background writer is running."""
+        return cls._queue is not None
+
+    @classmethod
+    def log(cls, logger: logging.Logger, level: int, line: bytes, prefix: str = "") -> None:
+        """Log line of stream.
+
+        The line is escaped so only printable characters are in the log. Nothing is done (not even escaping) if level is
+        not enabled for given logger.
+        """
+        if not logger.isEnabledFor(level):
+            return
+        que = cls._queue
+        if que is None:
+            logger.log(level, "%s%s", prefix, _LineRepr(line))
+        else:
+            que.put(logger.makeRecord(logger.name, level, "(stream)", 0, "%s%s", (prefix, _LineRepr(line)), None))
+
+    @staticmethod
+    def _thread_func(que: queue.Queue) -> None:
+        while True:
+            record = que.get()
+            try:
+                if record is None:
+                    return
+                logging.getLogger(record.name).handle(record)  # Errors in handlers are reported by handlers
+            finally:
+                que.task_done()
+
+
+class FDLoggingCounters(typing.NamedTuple):
+    """Amount of data relayed by FDLogging.
+
+    The input is data read from file descriptor and output is data written to it.
+    """
+
+    in_forwarded: int
+    in_dropped: int
+    out_forwarded: int
+    out_dropped: int
+
+
+class _RelayEnd:
+    """One end of FDLogging relay. It collects data read from its file descriptor for its peer."""
+
+    def __init__(
+        self,
+        fileno: int,
+        aggregate: LineBytesAggregate,
+        record: typing.Optional[typing.Callable[[bytes], None]] = None,
+    ):
+        self.fileno = fileno
+        self.aggregate = aggregate
+        self.record = record
+        self.peer: "_RelayEnd" = self
+        self.pending = bytearray()  # data read from this end waiting to be written to peer
+        self.propagate = True
+        self.eof = False
+        self.hangup = False  # epoll reported hang up or error
+        self.events: typing.Optional[int] = 0  # currently registered epoll events (None if not registered)
+        self.forwarded = 0
+        self.dropped = 0
 
 
 class FDLogging:
@@ -348,16 +1071,36 @@ class FDLogging:
 
     This has one primary limitation and that is output only in lines. Log is created only when new line character is
     located not before that. The reason for this is readibility of logs.
+
+    All instances share single thread that relays data using epoll. Data waiting to be written are held in buffer of
+    limited size (buffer_size) for every direction. The overflow policy decides what happens when buffer of input
+    (data read from file descriptor) is full: "drop" drops the oldest data in buffer while "block" stops reading of the
+    source until there is space again. Note that logging is performed on read so with "block" policy nothing is logged
+    until reader catches up. Output (data written to file descriptor) is always blocked as losing data sent to the
+    device would silently corrupt commands. The amount of forwarded and dropped data can be checked with counters.
+
+    Raw data in both directions can be also recorded with session.Recorder. Recording is performed on read as well.
     """
 
     _thread: typing.Optional[threading.Thread] = None
     _lock: threading.Lock = threading.Lock()
-    _poll: select.poll = select.poll()
-    _output: dict[int, int] = {}
-    _propagation: dict[int, bool] = {}
-    _aggregate: dict[int, LineBytesAggregate] = {}
-
-    def __init__(self, fileno: int, logger: logging.Logger, in_level=logging.INFO, out_level=logging.DEBUG):
+    _epoll: typing.Optional[select.epoll] = None
+    _wakeup: typing.Optional[tuple[int, int]] = None
+    _ends: dict[int, _RelayEnd] = {}
+    _buffer_size: dict[int, int] = {}
+    _overflow: dict[int, str] = {}
+
+    def __init__(
+        self,
+        fileno: int,
+        logger: logging.Logger,
+        in_level=logging.INFO,
+        out_level=logging.DEBUG,
+        buffer_size: int = _FDLOGGING_BUFFER,
+        overflow: typing.Literal["drop", "block"] = "drop",
+        recorder: typing.Optional[session.Recorder] = None,
+    ):
+        assert overflow in ("drop", "block")
         self._logger = logger
         self._fileno = fileno
         self._our_sock, self._user_sock = socket.socketpair()
@@ -366,34 +1109,43 @@ class FDLogging:
         fcntl.fcntl(self._fileno, fcntl.F_SETFL, self._orig_filestatus | os.O_NONBLOCK)
         self._our_sock.setblocking(False)
 
-        self._add_socket(
+        self._end_in = _RelayEnd(
             self._fileno,
             LineBytesAggregate(lambda line: self._log_line("> ", line, in_level)),
+            None if recorder is None else lambda data: recorder.record(session.Direction.IN, data),
+        )
+        self._end_out = _RelayEnd(
             self._our_sock.fileno(),
             LineBytesAggregate(lambda line: self._log_line("< ", line, out_level)),
+            None if recorder is None else lambda data: recorder.record(session.Direction.OUT, data),
         )
+        self._add_ends(self._end_in, self._end_out, buffer_size, overflow)
 
     @property
     def socket(self):
         """Returns socket for user to use to communicate trough this logged passtrough."""
         return self._user_sock
 
+    @property
+    def counters(self) -> FDLoggingCounters:
+        """Amount of forwarded and dropped bytes."""
+        with self._lock:
+            return FDLoggingCounters(
+                self._end_in.forwarded, self._end_in.dropped, self._end_out.forwarded, self._end_out.dropped
+            )
+
     def set_propagation(self, propagate: bool):
         """Configures if input should be propagated to socket or not. Output is still propagated to file but input read
         from file is simply logged and dropped.
         """
-        self._set_propagation(self._fileno, propagate)
-
-    @classmethod
-    def _set_propagation(cls, fileno: int, propagate: bool):
-        with cls._lock:
-            cls._propagation[fileno] = propagate
+        with self._lock:
+            self._end_in.propagate = propagate
 
     def close(self):
         """Close socket and stop logging."""
         if self._our_sock is None:
             return
-        self._del_socket(self._fileno, self._our_sock.fileno())
+        self._del_ends(self._end_in, self._end_out)
         self._our_sock.close()
         self._our_sock = None
         fcntl.fcntl(self._fileno, fcntl.F_SETFL, self._orig_filestatus)
@@ -402,73 +1154,169 @@ class FDLogging:
         self.close()
 
     def _log_line(self, prefix, line, level):
-        self._logger.log(level, prefix + repr(line.expandtabs())[2:-1])
+        LogQueue.log(self._logger, level, line, prefix)
 
     @classmethod
-    def _add_socket(
-        cls, fileno_in: int, aggregate_in: LineBytesAggregate, fileno_out: int, aggregate_out: LineBytesAggregate
-    ):
+    def _add_ends(cls, end_in: _RelayEnd, end_out: _RelayEnd, buffer_size: int, overflow: str):
+        end_in.peer, end_out.peer = end_out, end_in
         with cls._lock:
-            cls._output.update({fileno_in: fileno_out, fileno_out: fileno_in})
-            cls._propagation.update({fileno_in: True, fileno_out: True})
-            cls._aggregate.update({fileno_in: aggregate_in, fileno_out: aggregate_out})
-            cls._poll.register(fileno_in, select.POLLIN)
-            cls._poll.register(fileno_out, select.POLLIN | select.POLLNVAL)
-        if cls._thread is None:
-            cls._thread = threading.Thread(target=cls._thread_func, daemon=True)
-        if not cls._thread.is_alive():
-            cls._thread.start()
+            if cls._epoll is None:
+                cls._epoll = select.epoll()
+                cls._wakeup = os.pipe()
+                os.set_blocking(cls._wakeup[0], False)
+                cls._epoll.register(cls._wakeup[0], select.EPOLLIN)
+            for end, end_overflow in ((end_in, overflow), (end_out, "block")):
+                cls._ends[end.fileno] = end
+                cls._buffer_size[end.fileno] = buffer_size
+                cls._overflow[end.fileno] = end_overflow
+                cls._epoll.register(end.fileno, 0)
+                cls._update(end)
+            if cls._thread is None:
+                cls._thread = threading.Thread(target=cls._thread_func, daemon=True)
+                cls._thread.start()
 
     @classmethod
-    def _del_socket(cls, fileno_in: int, fileno_out: int):
+    def _del_ends(cls, end_in: _RelayEnd, end_out: _RelayEnd):
         with cls._lock:
-            cls._poll.unregister(fileno_in)
-            cls._poll.unregister(fileno_out)
-            del cls._output[fileno_in]
-            del cls._output[fileno_out]
-            del cls._propagation[fileno_in]
-            del cls._propagation[fileno_out]
-            del cls._aggregate[fileno_in]
-            del cls._aggregate[fileno_out]
+            for end in (end_in, end_out):
+                if not end.eof and end.events is not None:
+                    with contextlib.suppress(OSError):  # The file descriptor might be already closed
+                        cls._epoll.unregister(end.fileno)
+                del cls._ends[end.fileno]
+                del cls._buffer_size[end.fileno]
+                del cls._overflow[end.fileno]
+                end.aggregate.flush()
+            os.write(cls._wakeup[1], b"\0")  # Wake up thread so it can terminate if this was the last one
+
+    @classmethod
+    def _update(cls, end: _RelayEnd):
+        """Update registered events for given end."""
+        if end.eof:
+            return
+        events = 0
+        if cls._overflow[end.fileno] == "drop" or len(end.pending) < cls._buffer_size[end.fileno]:
+            events |= select.EPOLLIN
+        if end.peer.pending:
+            events |= select.EPOLLOUT
+        if end.hangup and not events & select.EPOLLIN:
+            # Hang up and error are reported by epoll regardless of registered events. There is no room to read the rest
+            # of the data so the end is not polled at all until there is.
+            if end.events is not None:
+                cls._epoll.unregister(end.fileno)
+                end.events = None
+        elif end.events is None:
+            cls._epoll.register(end.fileno, events)
+            end.events = events
+        elif events != end.events:
+            cls._epoll.modify(end.fileno, events)
+            end.events = events
+
+    @classmethod
+    def _read(cls, end: _RelayEnd):
+        """Read data from end and queue them for its peer."""
+        size = io.DEFAULT_BUFFER_SIZE
+        if cls._overflow[end.fileno] == "block":
+            size = min(size, cls._buffer_size[end.fileno] - len(end.pending))
+            if size <= 0:
+                return
+        try:
+            data = os.read(end.fileno, size)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            cls._eof(end)
+            return
+        end.aggregate.add(data)
+        if end.record is not None:
+            end.record(data)
+        if not end.propagate or end.peer.eof:
+            end.dropped += len(data)
+            return
+        end.pending += data
+        overflow = len(end.pending) - cls._buffer_size[end.fileno]
+        if overflow > 0 and cls._overflow[end.fileno] == "drop":
+            del end.pending[:overflow]
+            end.dropped += overflow
+
+    @classmethod
+    def _write(cls, end: _RelayEnd):
+        """Write data queued by end to its peer."""
+        try:
+            written = os.write(end.peer.fileno, end.pending)
+        except BlockingIOError:
+            return
+        except OSError:
+            cls._eof(end.peer)
+            return
+        del end.pending[:written]
+        end.forwarded += written
+
+    @classmethod
+    def _eof(cls, end: _RelayEnd):
+        """Stop relaying for end that was closed (or failed)."""
+        end.eof = True
+        if end.events is not None:
+            cls._epoll.unregister(end.fileno)
+        end.aggregate.flush()
+        # Data for this end can't be written anymore
+        end.peer.dropped += len(end.peer.pending)
+        end.peer.pending.clear()
 
     @classmethod
     def _thread_func(cls):
-        while cls._output:  # We run until we have some output then we can terminate
-            for poll_event in cls._poll.poll():
-                fileno, event = poll_event
-                if event == select.POLLNVAL:
-                    continue
-                data = os.read(fileno, io.DEFAULT_BUFFER_SIZE)
-                with cls._lock:
-                    if fileno not in cls._output:
-                        # This covers race condition with _del_socket as it might win lock over us and remove fileno in
+        while True:
+            events = cls._epoll.poll()
+            with cls._lock:
+                if not cls._ends:  # We run until there is something to relay
+                    cls._thread = None
+                    return
+                for fileno, event in events:
+                    if fileno == cls._wakeup[0]:
+                        os.read(fileno, io.DEFAULT_BUFFER_SIZE)
+                        continue
+                    end = cls._ends.get(fileno)
+                    if end is None or end.eof:
+                        # This covers race condition with _del_ends as it might win lock over us and remove fileno in
                         # the meantime we were waiting for the lock.
                         continue
-                    if cls._propagation[fileno]:
-                        os.write(cls._output[fileno], data)
-                    cls._aggregate[fileno].add(data)
+                    if event & (select.EPOLLHUP | select.EPOLLERR):
+                        end.hangup = True
+                    if event & (select.EPOLLIN | select.EPOLLHUP | select.EPOLLERR):
+                        cls._read(end)
+                    if event & select.EPOLLOUT and not end.eof:
+                        cls._write(end.peer)
+                    if end.pending and not end.peer.eof:
+                        cls._write(end)  # Try to pass new data right away
+                    cls._update(end)
+                    cls._update(end.peer)
 
 
 class PexpectLogging:
     """Logging for pexpect.
 
-    This emulates file object and is intended to be used with pexpect handler as logger.
+    This emulates file object and is intended to be used with pexpect handler as logger. Data can be also recorded with
+    session.Recorder (as received ones).
     """
 
-    def __init__(self, logger: logging.Logger, prefix: str = ""):
+    def __init__(self, logger: logging.Logger, prefix: str = "", recorder: typing.Optional[session.Recorder] = None):
         self._level = logging.INFO
         self.logger = logger
         self.aggregate = LineBytesAggregate(self._log)
+        self.recorder = recorder
 
     def __del__(self):
         self.aggregate.flush()
 
     def _log(self, line: bytes) -> None:
-        self.logger.log(self._level, repr(line.expandtabs())[2:-1])
+        LogQueue.log(self.logger, self._level, line)
 
     def write(self, buf: bytes) -> None:
         """Standard-like file write function."""
         self.aggregate.add(buf)
+        if self.recorder is not None:
+            self.recorder.record(session.Direction.IN, buf)
 
     def flush(self) -> None:
         """Standard-like flush function."""
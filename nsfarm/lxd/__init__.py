@@ -2,7 +2,10 @@ import logging
 
 from . import exceptions
 from .container import Container
+from .group import ContainerGroup
 from .image import Image
+from .pool import ContainerPool
+from .store import ImageStore
 
 IMAGE_REPO = "https://images.linuxcontainers.org"
 
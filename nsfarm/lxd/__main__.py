@@ -5,7 +5,7 @@ import sys
 import dateutil.relativedelta
 import pylxd
 
-from . import Container, utils
+from . import Container, Image, ImageStore, utils
 
 
 def parser(upper_parser):
@@ -55,6 +55,19 @@ def parser(upper_parser):
         action="store_true",
         help="Bootstrap all images present instead of only listed ones.",
     )
+    bootstrap.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of images bootstrapped concurrently. Image is always bootstrapped after its parent.",
+    )
+    bootstrap.add_argument(
+        "-s",
+        "--store",
+        metavar="DIR",
+        help="Import images from store in DIR instead of bootstrapping them and export bootstrapped images to it.",
+    )
 
     inspect = subparsers.add_parser(
         "inspect",
@@ -134,11 +147,13 @@ def op_bootstrap(args, upper_parser):
     if not args.IMG and not args.all:
         upper_parser.print_usage()
         sys.exit(1)
+    if args.store:
+        Image.store = ImageStore(args.store)
     lxd_client = pylxd.Client()
-    success = True
-    if args.all:
-        success &= utils.bootstrap(lxd_client)
-    success &= utils.bootstrap(lxd_client, args.IMG)
+    timings = {}
+    success = utils.bootstrap(lxd_client, None if args.all else args.IMG, jobs=args.jobs, timings=timings)
+    for img, duration in sorted(timings.items(), key=lambda item: (item[1] is None, item[1] or 0)):
+        print(f"{img:<24} {'failed' if duration is None else f'{duration:.1f} s'}")
     sys.exit(0 if success else 1)
 
 
@@ -158,15 +173,16 @@ def op_inspect(args, upper_parser):
     lxd_client = pylxd.Client()
     with Container(lxd_client, args.IMAGE, device_map=device_map, strict=False, **kwargs) as cont:
         if args.proxy:
+            proxies = []
             for proxy in args.proxy:
                 fields = proxy.split(":", maxsplit=2)
                 if len(fields) == 1:
-                    args = {"port": fields[0]}
+                    proxies.append({"port": fields[0]})
                 elif len(fields) == 2:
-                    args = {"address": fields[0], "port": fields[1]}
+                    proxies.append({"address": fields[0], "port": fields[1]})
                 else:
-                    args = {"proto": fields[0], "address": fields[1], "port": fields[2]}
-                localport = cont.network.proxy_open(**args)
+                    proxies.append({"proto": fields[0], "address": fields[1], "port": fields[2]})
+            for proxy, localport in zip(args.proxy, cont.network.proxy_open_many(proxies)):
                 print(f"Proxy '{proxy}' to: {localport}")
         sys.exit(subprocess.call(["lxc", "exec", cont.name, "/bin/sh"]))
 
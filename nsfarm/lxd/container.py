@@ -1,19 +1,25 @@
 """Containers management."""
+import asyncio
 import collections.abc
 import ipaddress
 import logging
 import os
+import pathlib
+import threading
 import typing
 import warnings
 
 import pexpect
 import pylxd
 
-from .. import cli, lxd
+from .. import cli, lxd, session
+from . import files
 from .device import Device
 from .exceptions import LXDDeviceError
 from .image import Image
 from .network import NetworkInterface
+from .pool import ContainerPool
+from .spawn import ExecSpawn
 
 logger = logging.getLogger(__package__)
 
@@ -23,6 +29,17 @@ class Container:
 
     # TODO log syslog somehow
 
+    # Directory where sessions of all pexpect handles are recorded (set this to enable recording)
+    session_dir: typing.Optional[pathlib.Path] = None
+    # Pool of booted containers prepare takes container from (set this to enable pooling)
+    pool: typing.Optional[ContainerPool] = None
+    # Spawn commands trough LXD exec API instead of 'lxc exec' process
+    exec_api = False
+
+    # Names given to containers by this process (containers can be created concurrently, see ContainerGroup)
+    _names_lock = threading.Lock()
+    _names: set[str] = set()
+
     def __init__(
         self,
         lxd_client: pylxd.Client,
@@ -66,6 +83,18 @@ class Container:
 
         self._image.prepare()
 
+        if self.pool is not None and self._hotplug_supported():
+            self.lxd_container = self.pool.checkout(self._lxd, self._image, profiles)
+        if self.lxd_container is not None:
+            try:
+                self._hotplug_devices()
+            except Exception:
+                self.cleanup()
+                raise
+            self._network = NetworkInterface(self)
+            logger.debug("Container prepared from pool: %s", self.lxd_container.name)
+            return
+
         # Create and start container
         self.lxd_container = self._lxd.containers.create(
             {
@@ -85,14 +114,39 @@ class Container:
         self._network = NetworkInterface(self)
         logger.debug("Container prepared: %s", self.lxd_container.name)
 
+    def _nics(self) -> list[str]:
+        return [name for name, device in self._devices.items() if device["type"] == "nic"]
+
+    def _hotplug_supported(self) -> bool:
+        """Check if devices can be attached to already running container.
+
+        Network interfaces not present on boot have to be configured and that is implemented only for images based on
+        base-alpine (OpenRC networking service).
+        """
+        return not self._nics() or self._image.name == "base-alpine" or self._image.is_child_of("base-alpine")
+
+    def _hotplug_devices(self):
+        """Attach devices to already running container."""
+        if not self._devices:
+            return
+        self.lxd_container.devices.update(self._devices)
+        self.lxd_container.save(wait=True)
+        if nics := self._nics():
+            # Interfaces were not present on boot so configure them now (this restarts services depending on network)
+            res = self.lxd_container.execute(["rc-service", "networking", "restart"])
+            if res.exit_code != 0:
+                raise LXDDeviceError(f"{', '.join(nics)} (network reconfiguration failed: {res.stderr.strip()})")
+
     def _container_name(self, prefix="nsfarm"):
         # Warning: the other parts of this project rely on this naming convention to identify containers (such as
         # cleanup algorithm). Make sure that you update them when you do changes in this code.
         name = f"{prefix}-{self._image.name}-{os.getpid()}"
         i = 1
-        while self._lxd.containers.exists(f"{name}x{i}"):
-            i += 1
-        name = f"{name}x{i}"
+        with self._names_lock:
+            while f"{name}x{i}" in self._names or self._lxd.containers.exists(f"{name}x{i}"):
+                i += 1
+            name = f"{name}x{i}"
+            self._names.add(name)
         return name
 
     def cleanup(self):
@@ -107,14 +161,75 @@ class Container:
         self.lxd_container.stop()
         self.lxd_container = None
 
-    def pexpect(self, command: collections.abc.Iterable[str] = ("/bin/sh",)) -> pexpect.spawn:
-        """Returns pexpect handle for command running in container."""
+    def snapshot(self, name: str = "nsfarm-clean") -> None:
+        """Take snapshot of container so it can be later returned to the current state using restore().
+
+        This is intended to be called once container is ready (for example after wait4boot). Restoring snapshot is way
+        faster than creating new container. The snapshot is removed together with container.
+
+        name: name of the snapshot (existing snapshot of the same name is replaced)
+        """
+        assert self.lxd_container is not None
+        if any(snapshot.name == name for snapshot in self.lxd_container.snapshots.all()):
+            self.lxd_container.snapshots.get(name).delete(wait=True)
+        self.lxd_container.snapshots.create(name, wait=True)
+        self._logger.debug("Snapshot taken: %s", name)
+
+    def restore(self, name: str = "nsfarm-clean") -> None:
+        """Restore state of container from snapshot taken by snapshot().
+
+        The container is restarted by LXD in the process. The cached shell is closed and new one is spawned on the next
+        access; any other pexpect handles spawned before are no longer usable. Configuration is restored as well and
+        thus proxies opened after the snapshot was taken are closed.
+
+        name: name of the snapshot
+        """
+        assert self.lxd_container is not None
+        if self._shell is not None:
+            self._shell.close(force=True)
+            self._shell = None
+        self.lxd_container.restore_snapshot(name, wait=True)
+        self.lxd_container.sync()
+        self._network.invalidate()
+        self._logger.debug("Snapshot restored: %s", name)
+
+    def pexpect(
+        self,
+        command: collections.abc.Iterable[str] = ("/bin/sh",),
+        recorder: typing.Optional[session.Recorder] = None,
+    ) -> typing.Union[pexpect.spawn, ExecSpawn]:
+        """Returns pexpect handle for command running in container.
+
+        The command is spawned with 'lxc exec' or trough LXD exec API directly if exec_api is set.
+
+        recorder: session recorder used to record raw communication. New recording in session_dir is created if not
+          provided and session_dir is set.
+        """
         assert self.lxd_container is not None
         self._logger.debug("Running command: %s", command)
-        pexp = pexpect.spawn("lxc", ["exec", self.lxd_container.name, "--"] + list(command))
-        pexp.logfile_read = cli.PexpectLogging(logging.getLogger(self._logger.name + str(command)))
+        if recorder is None and self.session_dir is not None:
+            recorder = session.Recorder(self._session_path())
+        if self.exec_api:
+            pexp = ExecSpawn(self.lxd_container, command)
+        else:
+            pexp = pexpect.spawn("lxc", ["exec", self.lxd_container.name, "--"] + list(command))
+        pexp.logfile_read = cli.PexpectLogging(logging.getLogger(self._logger.name + str(command)), recorder=recorder)
+        if recorder is not None:
+            pexp.logfile_send = recorder.writer(session.Direction.OUT)
+        if tuple(command) == ("/bin/sh",):
+            # This allows users of the shell to bypass the terminal (such as DeployFile). Other commands (such as ssh)
+            # can provide access to some other system and thus they are not tagged.
+            pexp.nsfarm_container = self
         return pexp
 
+    def _session_path(self) -> pathlib.Path:
+        assert self.session_dir is not None
+        self.session_dir.mkdir(parents=True, exist_ok=True)
+        i = 1
+        while (path := self.session_dir / f"{self.lxd_container.name}-{i}.nsfs").exists():
+            i += 1
+        return path
+
     @property
     def shell(self):
         """Extension method that provides access to shell in container.
@@ -127,6 +242,94 @@ class Container:
             self._shell = cli.Shell(self.pexpect())
         return self._shell
 
+    async def async_shell(self, command: collections.abc.Iterable[str] = ("/bin/sh",)) -> cli.AsyncShell:
+        """Spawn new shell in container and return it wrapped in AsyncShell.
+
+        This is the asyncio alternative to the pexpect() method. The command is spawned and recorded the same way as
+        with pexpect(). The caller is responsible for closing the shell.
+        """
+        assert self.lxd_container is not None
+        self._logger.debug("Running command asynchronously: %s", command)
+        logger = logging.getLogger(self._logger.name + str(command))
+        command = list(command)
+        recorder = session.Recorder(self._session_path()) if self.session_dir is not None else None
+        if self.exec_api:
+            loop = asyncio.get_running_loop()
+            handle = await loop.run_in_executor(None, ExecSpawn, self.lxd_container, command)
+            return await cli.AsyncShell.attach(handle, logger=logger, recorder=recorder)
+        return await cli.AsyncShell.spawn(
+            ["lxc", "exec", self.lxd_container.name, "--"] + command, logger=logger, recorder=recorder
+        )
+
+    def read_file(
+        self, path: typing.Union[str, pathlib.PurePosixPath], expect_exist: bool = True
+    ) -> typing.Optional[bytes]:
+        """Read file from container using LXD files API.
+
+        This bypasses the terminal and thus is way faster than Shell.bin_read.
+
+        path: absolute path to file to read
+        expect_exist: raise exception if file can't be read
+
+        Returns bytes with content of the file or None if file does not exist and expect_exist is False.
+        """
+        assert self.lxd_container is not None
+        try:
+            return self.lxd_container.files.get(str(path))
+        except pylxd.exceptions.NotFound:
+            if expect_exist:
+                raise
+            return None
+
+    def file_attributes(self, path: typing.Union[str, pathlib.PurePosixPath]) -> typing.Optional[files.FileAttributes]:
+        """Get type, permissions and ownership of file in container using LXD files API.
+
+        Symbolic links are not followed.
+
+        path: absolute path to file
+
+        Returns attributes of the file or None if file does not exist.
+        """
+        assert self.lxd_container is not None
+        return files.file_attributes(self.lxd_container, path)
+
+    def write_file(
+        self,
+        path: typing.Union[str, pathlib.PurePosixPath],
+        content: typing.Union[str, bytes],
+        mode: int = 0o644,
+        uid: int = 0,
+        gid: int = 0,
+    ) -> None:
+        """Write file to container using LXD files API.
+
+        This bypasses the terminal and thus is way faster than Shell.bin_write.
+
+        Note that parent directory has to exist and any file will be rewritten. Permissions and ownership of the
+        rewritten file are not preserved, use file_attributes to get them.
+
+        path: absolute path to file to be written
+        content: content to be written to the file
+        mode: permissions of the file
+        uid: owner of the file
+        gid: group of the file
+        """
+        assert self.lxd_container is not None
+        self.lxd_container.files.put(str(path), content, mode=mode, uid=uid, gid=gid)
+
+    def push_tree(
+        self, source: typing.Union[str, os.PathLike], destination: typing.Union[str, pathlib.PurePosixPath]
+    ) -> None:
+        """Copy local directory tree to container.
+
+        The tree is transferred as a single tar archive and extracted in the container. All files are owned by root.
+
+        source: path to local directory
+        destination: path to directory in container the content of source is copied to (it is created if needed)
+        """
+        assert self.lxd_container is not None
+        files.push_tar(self.lxd_container, files.tar_tree(source), destination)
+
     def get_ip(
         self,
         interfaces: typing.Optional[typing.Container] = None,
@@ -141,8 +344,9 @@ class Container:
         """
         ips: list[typing.Union[ipaddress.IPv4Interface, ipaddress.IPv6Interface]] = []
         if self.lxd_container is not None:
+            self._network.refresh()  # Addresses are expected to be up to date
             ifs_dict = self._network.addresses
-            for iface in interfaces if interfaces else self._network.interfaces:
+            for iface in interfaces if interfaces else ifs_dict:
                 for address in ifs_dict[iface]:
                     if address.version in versions:
                         ips.append(address)
@@ -34,3 +34,10 @@ class LXDDeviceError(NSFarmLXDError):
 
     def __init__(self, device):
         super().__init__(f"The device can't be initialized: {device}")
+
+
+class LXDFileError(NSFarmLXDError):
+    """Transfer of files to the container failed."""
+
+    def __init__(self, path, reason):
+        super().__init__(f"The files can't be deployed to '{path}': {reason}")
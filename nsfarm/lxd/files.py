@@ -0,0 +1,110 @@
+"""Files transfer to LXD instances that bypasses terminal.
+"""
+import io
+import os
+import pathlib
+import tarfile
+import typing
+import uuid
+
+import pylxd.models
+
+from .exceptions import LXDFileError
+
+
+class FileAttributes(typing.NamedTuple):
+    """Type, permissions and ownership of file in LXD instance."""
+
+    mode: int
+    uid: int
+    gid: int
+    type: str  # "file", "directory" or "symlink" as reported by LXD
+
+
+def file_attributes(
+    instance: pylxd.models.Instance, path: typing.Union[str, pathlib.PurePosixPath]
+) -> typing.Optional[FileAttributes]:
+    """Get type, permissions and ownership of file in LXD instance.
+
+    Only headers of the response are used, the content of the file is not transferred. Symbolic links are not followed.
+
+    instance: pylxd instance
+    path: absolute path to the file
+
+    Returns file attributes or None if there is no such file.
+    """
+    try:
+        response = instance.api.files.get(params={"path": str(path)}, is_api=False, stream=True)
+    except pylxd.exceptions.NotFound:
+        return None
+    with response:
+        return FileAttributes(
+            int(response.headers["X-LXD-mode"], 8),
+            int(response.headers["X-LXD-uid"]),
+            int(response.headers["X-LXD-gid"]),
+            response.headers.get("X-LXD-type", "file"),
+        )
+
+
+def tar_tree(
+    source: typing.Union[str, os.PathLike, None],
+    extra: typing.Optional[typing.Mapping[str, typing.Tuple[typing.Union[str, os.PathLike], int]]] = None,
+) -> bytes:
+    """Create in memory uncompressed tar archive with content of given directory.
+
+    The source directory itself is not part of the archive so extraction does not modify the destination directory.
+    Only empty directories are included as entries. The other ones are created by tar as needed so permissions of
+    directories that already exist in destination (such as /etc) are left untouched. Everything is owned by root.
+    Permissions are normalized the same way git does it: files that are executable locally have mode 0755 and others
+    0644 (directories have 0755). This makes the result independent of local umask.
+
+    source: path to local directory to be archived (or None to include only extra files)
+    extra: additional files to be included in archive. It maps path in archive to local path and permissions.
+
+    Returns bytes of created archive.
+    """
+    buf = io.BytesIO()
+
+    def _filter(info: tarfile.TarInfo) -> tarfile.TarInfo:
+        info.uid = info.gid = 0
+        info.uname = info.gname = "root"
+        info.mode = 0o755 if info.isdir() or info.mode & 0o100 else 0o644
+        return info
+
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        if source is not None:
+            for dirpath, dirnames, filenames in os.walk(source):
+                dirnames.sort()
+                # Symbolic links to directories are not walked trough by os.walk but have to be included as links
+                nodes = sorted(filenames + [name for name in dirnames if os.path.islink(os.path.join(dirpath, name))])
+                if not dirnames and not filenames and not os.path.samefile(dirpath, source):
+                    nodes = [""]  # Empty directory
+                for name in nodes:
+                    path = os.path.join(dirpath, name) if name else dirpath
+                    tar.add(path, arcname=os.path.relpath(path, source), recursive=False, filter=_filter)
+        for arcname, (path, fmode) in (extra or {}).items():
+            info = _filter(tar.gettarinfo(path, arcname=arcname.lstrip("/")))
+            info.mode = fmode
+            with open(path, "rb") as file:
+                tar.addfile(info, file)
+    return buf.getvalue()
+
+
+def push_tar(
+    instance: pylxd.models.Instance, archive: bytes, destination: typing.Union[str, pathlib.PurePosixPath] = "/"
+) -> None:
+    """Push tar archive to running LXD instance and extract it there.
+
+    The archive is transferred in a single request and extracted in place which is way faster than pushing files one by
+    one.
+
+    instance: pylxd instance (has to be running)
+    archive: uncompressed tar archive
+    destination: directory to extract archive to. It is created if it does not exist.
+    """
+    tmp_path = f"/tmp/nsfarm-push-{uuid.uuid4().hex}.tar"
+    instance.files.put(tmp_path, archive, mode=0o600)
+    cmd = f"mkdir -p '{destination}' && tar -xf '{tmp_path}' -C '{destination}'"
+    res = instance.execute(["sh", "-c", f"{cmd}; ret=$?; rm -f '{tmp_path}'; exit $ret"])
+    if res.exit_code != 0:
+        raise LXDFileError(destination, res.stderr)
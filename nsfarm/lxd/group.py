@@ -0,0 +1,70 @@
+"""Groups of containers managed together."""
+import collections.abc
+import concurrent.futures
+import logging
+import typing
+
+from .container import Container
+
+logger = logging.getLogger(__package__)
+
+
+class ContainerGroup(collections.abc.Sequence):
+    """Group of containers that are prepared and cleaned up concurrently.
+
+    Creation and start of container is mostly waiting for LXD and thus preparing many containers one by one takes
+    unnecessary long. The group issues operations for all containers at once and waits for all of them.
+
+    containers: containers in group (they should not be prepared)
+    jobs: maximum number of containers prepared or cleaned up at the same time (None for all of them)
+
+    This can be used as a context manager the same way as Container.
+    """
+
+    def __init__(self, containers: typing.Iterable[Container], jobs: typing.Optional[int] = None):
+        self._containers = list(containers)
+        self._jobs = jobs
+
+    def _map(self, func: typing.Callable[[Container], None]) -> list[typing.Optional[BaseException]]:
+        """Call func for all containers concurrently and collect raised exceptions."""
+        if not self._containers:
+            return []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._jobs or len(self._containers)) as executor:
+            futures = [executor.submit(func, container) for container in self._containers]
+            return [future.exception() for future in futures]
+
+    def prepare(self) -> None:
+        """Create and start all containers.
+
+        If any container fails to be prepared then all others are cleaned up and the first exception is raised.
+        """
+        # Prepare every image only once before containers are created, otherwise they would race to bootstrap it
+        images = {id(container.image): container.image for container in self._containers}
+        for image in images.values():
+            image.prepare()
+        errors = [exc for exc in self._map(lambda container: container.prepare()) if exc is not None]
+        if errors:
+            self.cleanup()
+            raise errors[0]
+
+    def cleanup(self) -> None:
+        """Remove all containers.
+
+        All containers are cleaned up even if some of them fail. The first exception is raised in such case.
+        """
+        errors = [exc for exc in self._map(lambda container: container.cleanup()) if exc is not None]
+        if errors:
+            raise errors[0]
+
+    def __enter__(self):
+        self.prepare()
+        return self
+
+    def __exit__(self, etype, value, traceback):
+        self.cleanup()
+
+    def __getitem__(self, index):
+        return self._containers[index]
+
+    def __len__(self) -> int:
+        return len(self._containers)
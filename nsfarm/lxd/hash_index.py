@@ -0,0 +1,147 @@
+"""Persistent index of image source hashes.
+
+Computing hash of image sources requires reading of all files of the image. The index stores computed hashes together
+with signature of the sources. The signature is computed only from metadata of files (path, inode, size, modification
+and change time) so unchanged sources are identified without reading them. The index is SQLite database in user's
+cache directory and thus it is shared by all processes on the host.
+"""
+import hashlib
+import io
+import logging
+import os
+import pathlib
+import sqlite3
+import threading
+import typing
+
+logger = logging.getLogger(__package__)
+
+
+def default_path() -> pathlib.Path:
+    """Default location of the index in user's cache directory."""
+    cache = os.environ.get("XDG_CACHE_HOME") or pathlib.Path.home() / ".cache"
+    return pathlib.Path(cache) / "nsfarm" / "image-hashes.sqlite"
+
+
+def tree_nodes(
+    dir_path: typing.Optional[pathlib.Path],
+) -> typing.Iterator[pathlib.Path]:
+    """Iterate over all nodes in directory tree.
+
+    The order is not sorted in any way but it is stable as long as the directory tree is not modified.
+    """
+    if dir_path is None:
+        return
+    nodes = list(dir_path.iterdir())
+    while nodes:
+        node = nodes.pop()
+        yield node
+        if node.is_dir():
+            nodes += list(node.iterdir())
+
+
+def content_hash(
+    seed: str, file_path: pathlib.Path, dir_path: typing.Optional[pathlib.Path], base: pathlib.Path
+) -> str:
+    """Hash of image sources including their content.
+
+    seed: hash or other identifier of the parent image
+    file_path: path to the image definition script
+    dir_path: path to the directory with additional image files (or None)
+    base: path node paths are included in hash relative to
+    """
+    md5sum = hashlib.md5()
+    md5sum.update(seed.encode())
+    _md5sum_update_file(md5sum, file_path)
+    for node in tree_nodes(dir_path):
+        md5sum.update(str(node.relative_to(base)).encode())
+        if node.is_dir():
+            pass
+        elif node.is_file():
+            # For plain file include content
+            _md5sum_update_file(md5sum, node)
+        elif node.is_symlink():
+            # For link include its target as well
+            md5sum.update(str(node.resolve()).encode())
+    return md5sum.hexdigest()
+
+
+def metadata_signature(seed: str, file_path: pathlib.Path, dir_path: typing.Optional[pathlib.Path]) -> str:
+    """Signature of image sources computed only from files metadata.
+
+    The arguments are the same as for content_hash. The signature changes whenever any of the files is modified,
+    replaced, added or removed.
+    """
+    md5sum = hashlib.md5()
+    md5sum.update(seed.encode())
+    for node in (file_path, *tree_nodes(dir_path)):
+        md5sum.update(str(node).encode())
+        try:
+            stat = node.stat()
+        except FileNotFoundError:  # Broken symbolic link
+            md5sum.update(b"broken")
+        else:
+            md5sum.update(f"{stat.st_mode}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}:{stat.st_ctime_ns}".encode())
+        if node.is_symlink():
+            md5sum.update(os.readlink(node).encode())
+    return md5sum.hexdigest()
+
+
+def _md5sum_update_file(md5sum, file_path):
+    with open(file_path, "rb") as file:
+        while data := file.read(io.DEFAULT_BUFFER_SIZE):
+            md5sum.update(data)
+
+
+class HashIndex:
+    """Index of hashes identified by key and signature.
+
+    The index is used only as a cache. Any error while accessing it is logged and the index behaves as if it would be
+    empty. The index can be shared by threads (images are prepared concurrently).
+    """
+
+    def __init__(self, path: typing.Union[str, os.PathLike, None] = None):
+        self.path = pathlib.Path(path) if path is not None else default_path()
+        self._db: typing.Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Has to be called with lock held
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS hashes (key TEXT PRIMARY KEY, signature TEXT NOT NULL, hash TEXT NOT NULL)"
+            )
+        return self._db
+
+    def get(self, key: str, signature: str) -> typing.Optional[str]:
+        """Get hash for key if it was stored with the same signature."""
+        try:
+            with self._lock:
+                row = (
+                    self._connect()
+                    .execute("SELECT hash FROM hashes WHERE key = ? AND signature = ?", (key, signature))
+                    .fetchone()
+                )
+        except (OSError, sqlite3.Error) as exc:
+            logger.warning("Image hash index can't be read: %s", exc)
+            return None
+        return row[0] if row is not None else None
+
+    def set(self, key: str, signature: str, value: str) -> None:
+        """Store hash for given key and signature."""
+        try:
+            with self._lock:
+                self._connect().execute(
+                    "INSERT OR REPLACE INTO hashes (key, signature, hash) VALUES (?, ?, ?)", (key, signature, value)
+                )
+        except (OSError, sqlite3.Error) as exc:
+            logger.warning("Image hash index can't be updated: %s", exc)
+
+    def close(self) -> None:
+        """Close database connection."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
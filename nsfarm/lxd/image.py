@@ -1,7 +1,5 @@
 """Images management."""
 import functools
-import hashlib
-import io
 import logging
 import pathlib
 import platform
@@ -11,21 +9,36 @@ import typing
 import pylxd
 
 from .. import lxd
+from . import files
 from .device import CharDevice, Device, NetInterface
 from .exceptions import (
     LXDImageParameterError,
     LXDImageParentError,
     LXDImageUndefinedError,
 )
+from .hash_index import HashIndex, content_hash, metadata_signature
+from .store import ImageStore
 
 logger = logging.getLogger(__package__)
 
 
+def read_header(file_path: pathlib.Path) -> typing.Tuple[str, typing.List[str]]:
+    """Read parent and parameters from the header of image definition script."""
+    with open(file_path) as file:
+        file.readline()  # Skip initial shebang
+        parent, *params = file.readline()[1:].strip().split()  # The initial character is '#' we want to ignore
+    return parent, params
+
+
 class Image:
     """Generic Image handle."""
 
     IMAGE_INIT_PATH = "/nsfarm-init.sh"  # Where we deploy initialization script for image
     IMGS_DIR = pathlib.Path(__file__).parents[2] / "imgs"
+    # Persistent index of image hashes shared by all instances (set to None to always compute hash from content)
+    hash_index: typing.Optional[HashIndex] = HashIndex()
+    # Store images are imported from instead of bootstrapping and exported to after bootstrap (set this to enable it)
+    store: typing.Optional[ImageStore] = None
 
     def __init__(self, lxd_client: pylxd.Client, img_name: str):
         self.name = img_name
@@ -42,9 +55,7 @@ class Image:
             self._dir_path = None
 
         # Get image parameters
-        with open(self._file_path) as file:
-            file.readline()  # Skip initial shebang
-            parent, *params = file.readline()[1:].strip().split()  # The initial character is '#' we want to ignore
+        parent, params = read_header(self._file_path)
 
         image_type, image_alias = parent.split(":", maxsplit=1)
         if image_type == "nsfarm":
@@ -83,42 +94,21 @@ class Image:
     def hash(self) -> str:
         """Provide hash uniquely identifying latest image.
 
-        This is unique identifier generated from image sources and used to check if image can be reused or not.
+        This is unique identifier generated from image sources and used to check if image can be reused or not. The
+        content of sources is read only if they changed since the last time hash was computed (see hash_index).
         """
-        md5sum = hashlib.md5()
-        # Parent
         if isinstance(self._parent, Image):
-            md5sum.update(self._parent.hash().encode())
+            seed = self._parent.hash()
         else:
-            md5sum.update(self._parent.fingerprint.encode())
-        # File defining container
-        self._md5sum_update_file(md5sum, self._file_path)
-        # Additional nodes from directory
-        if self._dir_path:
-            nodes = list(self._dir_path.iterdir())
-            while nodes:
-                node = nodes.pop()
-                path = self._dir_path / node
-                md5sum.update(str(node.relative_to(self.IMGS_DIR)).encode())
-                if path.is_dir():
-                    nodes += list(node.iterdir())
-                elif path.is_file():
-                    # For plain file include content
-                    self._md5sum_update_file(md5sum, path)
-                elif path.is_symlink():
-                    # For link include its target as well
-                    md5sum.update(str(path.resolve()).encode())
-        return md5sum.hexdigest()
-
-    @staticmethod
-    def _md5sum_update_file(md5sum, file_path):
-        with open(file_path, "rb") as file:
-            # IMPROVE: with Python 3.8 this can we rewritten with := syntax
-            while True:
-                data = file.read(io.DEFAULT_BUFFER_SIZE)
-                if not data:
-                    break
-                md5sum.update(data)
+            seed = self._parent.fingerprint
+        if self.hash_index is None:
+            return content_hash(seed, self._file_path, self._dir_path, self.IMGS_DIR)
+        signature = metadata_signature(seed, self._file_path, self._dir_path)
+        img_hash = self.hash_index.get(str(self._file_path), signature)
+        if img_hash is None:
+            img_hash = content_hash(seed, self._file_path, self._dir_path, self.IMGS_DIR)
+            self.hash_index.set(str(self._file_path), signature, img_hash)
+        return img_hash
 
     def alias(self, img_hash: str = None) -> str:
         """Alias for latest image. This is name used to identify image in LXD.
@@ -168,6 +158,10 @@ class Image:
             return
         if self.is_prepared(self.hash()):
             self.lxd_image = self._lxd.images.get_by_alias(self.alias())
+            if self.store is not None:
+                self._export()  # Store might not have it yet
+            return
+        if self.store is not None and self._import():
             return
 
         logger.debug("Want to bootstrap image: %s", self.alias())
@@ -208,24 +202,56 @@ class Image:
             return
 
         try:
-            self._deploy_files(container)
             self._run_bootstrap(container)
             # Create and configure image
             self.lxd_image = container.publish(wait=True)
             self.lxd_image.add_alias(self.alias(), f"NSFarm image: {self.name}")
         finally:
             container.delete()
+        if self.store is not None:
+            self._export()
+
+    def _import(self) -> bool:
+        """Import image from store. Returns False if there is no such image in the store."""
+        try:
+            lxd_image = self.store.load(self._lxd, self.name, self.hash())
+        except pylxd.exceptions.LXDAPIException as elxd:
+            # The same image might have been imported by other instance in the meantime
+            logger.warning("Import of image '%s' from store failed: %s", self.alias(), elxd)
+            lxd_image = None
+        if lxd_image is not None:
+            try:
+                lxd_image.add_alias(self.alias(), f"NSFarm image: {self.name}")
+            except pylxd.exceptions.LXDAPIException as elxd:
+                if not str(elxd).endswith("already exists"):
+                    raise
+        if not self.is_prepared():
+            return False
+        self.lxd_image = self._lxd.images.get_by_alias(self.alias())
+        return True
+
+    def _export(self) -> None:
+        """Export image to store if it is not there yet. Failure is only logged as the store is used as a cache."""
+        if self.store.contains(self.name, self.hash()):
+            return
+        try:
+            self.store.save(self.lxd_image, self.name, self.hash())
+        except (OSError, pylxd.exceptions.LXDAPIException) as exc:
+            logger.warning("Export of image '%s' to store failed: %s", self.alias(), exc)
 
     def _deploy_files(self, container):
-        with open(self._file_path) as file:
-            container.files.put(self.IMAGE_INIT_PATH, file.read(), mode=700)
-        if self._dir_path:
-            container.files.recursive_put(self._dir_path, "/")
+        # Init script and image files are transferred as a single archive (container has to be running)
+        files.push_tar(
+            container,
+            files.tar_tree(self._dir_path, extra={self.IMAGE_INIT_PATH: (self._file_path, 0o700)}),
+            "/",
+        )
 
     def _run_bootstrap(self, container):
         # TODO log boostrap process
         container.start(wait=True)
         try:
+            self._deploy_files(container)
             res = container.execute([self.IMAGE_INIT_PATH])
             if res.exit_code != 0:
                 # TODO more appropriate exception and possibly use stderr and stdout
@@ -2,53 +2,121 @@
 import contextlib
 import ipaddress
 import socket
+import threading
+import time
 import typing
 
+import pylxd
+
+ProtocolTypeStr = typing.Union[typing.Literal["tcp"], typing.Literal["udp"]]
+
+# Number of attempts to open proxies when port is taken by someone else in the meantime
+PROXY_OPEN_ATTEMPTS = 3
 
-def _find_free_port(proto):
-    """Provide random unused port.
 
-    The possible issue is that it might be taken in the meantime but because it is random port that is less likely.
+class PortPool:
+    """Pool of local ports reserved for proxies.
+
+    Ports are reserved by keeping sockets bound to them so no other process can take them while they are in the pool
+    and the same port is never given to two callers in this process. The socket is handed over to the caller that closes
+    it only right before the port is passed to LXD. Some other process can still bind the port in between and thus the
+    caller has to be ready for LXD to fail to bind it.
+
+    size: number of ports kept reserved for every protocol
     """
-    socktp = {"tcp": socket.SOCK_STREAM, "udp": socket.SOCK_DGRAM}[proto]
-    with contextlib.closing(socket.socket(socket.AF_INET, socktp)) as sock:
-        sock.bind(("", 0))
-        return sock.getsockname()[1]
 
+    SOCKET_TYPES = {"tcp": socket.SOCK_STREAM, "udp": socket.SOCK_DGRAM}
 
-ProtocolTypeStr = typing.Union[typing.Literal["tcp"], typing.Literal["udp"]]
+    def __init__(self, size: int = 8):
+        self.size = size
+        self._lock = threading.Lock()
+        self._free: dict[str, list[socket.socket]] = {proto: [] for proto in self.SOCKET_TYPES}
+
+    def take(self, proto: ProtocolTypeStr) -> socket.socket:
+        """Take port from pool.
+
+        Returns socket bound to the port. The port stays reserved until the caller closes the socket. Close it right
+        before configuration is saved.
+        """
+        with self._lock:
+            free = self._free[proto]
+            while len(free) <= self.size:
+                sock = socket.socket(socket.AF_INET, self.SOCKET_TYPES[proto])
+                sock.bind(("", 0))
+                free.append(sock)
+            return free.pop(0)
+
+    def close(self) -> None:
+        """Release all reserved ports."""
+        with self._lock:
+            for free in self._free.values():
+                for sock in free:
+                    sock.close()
+                free.clear()
 
 
 class NetworkInterface:
     """Interface representing network interfaces of LXD container.
 
     Following values from lxd network dict are not implemented: counters, type, mtus, state
+
+    The state of network is fetched from LXD and cached for ttl seconds so reading of multiple properties results in a
+    single request. Use refresh() when up to date state is required.
+
+    ttl: number of seconds the state is cached for
     """
 
-    def __init__(self, container):
+    # Local ports for proxies shared by all containers
+    ports = PortPool()
+
+    def __init__(self, container, ttl: float = 1.0):
         self._container = container
+        self.ttl = ttl
+        self.state_calls = 0  # Number of requests for container state sent to LXD
+        self._state: typing.Optional[dict] = None
+        self._state_time = 0.0
+
+    def refresh(self) -> dict:
+        """Fetch current state of network from LXD and return it."""
+        self._state = self._container.lxd_container.state().network
+        self._state_time = time.monotonic()
+        self.state_calls += 1
+        return self._state
+
+    def invalidate(self) -> None:
+        """Drop cached state so it is fetched again on the next access."""
+        self._state = None
+
+    def snapshot(self) -> dict:
+        """Return state of network as provided by LXD. It is fetched only if cached one is older than ttl."""
+        if self._state is None or time.monotonic() - self._state_time >= self.ttl:
+            return self.refresh()
+        return self._state
 
     @property
     def _network(self):
-        return self._container.lxd_container.state().network
+        return self.snapshot()
 
     @property
     def hwaddr(self) -> dict[str, str]:
         """Return hardware address/mac of interfaces in a dictionary."""
-        return {interface: self._network[interface]["hwaddr"] for interface in self._network}
+        network = self._network
+        return {interface: network[interface]["hwaddr"] for interface in network}
 
     @property
     def hostname(self) -> dict[str, str]:
         """Return hostname of interfaces in a dictionary."""
-        return {interface: self._network[interface]["host_name"] for interface in self._network}
+        network = self._network
+        return {interface: network[interface]["host_name"] for interface in network}
 
     @property
     def addresses(self) -> dict[str, list[typing.Union[ipaddress.IPv4Interface, ipaddress.IPv6Interface]]]:
         """Return ip addresses of interfaces in a dictionary of lists, containing ipaddress.IPvXAddresses."""
         interface_addrs: dict[str, list[typing.Union[ipaddress.IPv4Interface, ipaddress.IPv6Interface]]] = {}
-        for interface in self._network:
+        network = self._network
+        for interface in network:
             interface_addrs[interface] = []
-            for address in self._network[interface]["addresses"]:
+            for address in network[interface]["addresses"]:
                 # contains list of dictionaries
                 interface_addrs[interface].append(ipaddress.ip_interface(f"{address['address']}/{address['netmask']}"))
         return interface_addrs
@@ -69,31 +137,83 @@ class NetworkInterface:
         Warning: This supports only TCP and UDP sockets right now!
         Returns local port number service is proxied to.
         """
+        return self.proxy_open_many([{"proto": proto, "address": address, "port": port}])[0]
+
+    def proxy_open_many(self, proxies: typing.Iterable[typing.Mapping[str, typing.Any]]) -> list[int]:
+        """Proxy multiple socket connections through container with single update of container configuration.
+
+        proxies: keyword arguments of proxy_open for every proxy to be opened
+
+        The update is retried with new local ports if LXD fails to bind some of them (the port was taken by some other
+        process after it was released from PortPool).
+
+        Returns list of local port numbers in the same order as proxies were specified.
+        """
         assert self._container.lxd_container is not None
-        freeport = _find_free_port(proto)
-        self._container._logger.debug("Opening proxy to %s:%s:%d on port: %d", proto, address, port, freeport)
-        self._container.lxd_container.devices[f"proxy-{proto}-{freeport}"] = {
-            "connect": f"{proto}:{address}:{port}",
-            "listen": f"{proto}:127.0.0.1:{freeport}",
-            "type": "proxy",
-        }
-        self._container.lxd_container.save(wait=True)
-        return freeport
+        proxies = list(proxies)
+        attempt = 1
+        while True:
+            localports, devices = self._proxy_devices(proxies)
+            self._container.lxd_container.devices.update(devices)
+            try:
+                self._container.lxd_container.save(wait=True)
+                return localports
+            except pylxd.exceptions.LXDAPIException as exc:
+                for name in devices:
+                    del self._container.lxd_container.devices[name]
+                if attempt >= PROXY_OPEN_ATTEMPTS or "address already in use" not in str(exc):
+                    raise
+                self._container._logger.debug("Local port for proxy was taken, retrying: %s", exc)
+            attempt += 1
+
+    def _proxy_devices(
+        self, proxies: list[typing.Mapping[str, typing.Any]]
+    ) -> typing.Tuple[list[int], dict[str, dict[str, str]]]:
+        """Take local ports for proxies and return them together with LXD devices for them."""
+        localports = []
+        devices = {}
+        reserved = []
+        for proxy in proxies:
+            proto = proxy.get("proto", "tcp")
+            address = proxy.get("address", "127.0.0.1")
+            port = proxy.get("port", 80)
+            reserved.append(self.ports.take(proto))
+            localport = reserved[-1].getsockname()[1]
+            self._container._logger.debug("Opening proxy to %s:%s:%s on port: %d", proto, address, port, localport)
+            devices[f"proxy-{proto}-{localport}"] = {
+                "connect": f"{proto}:{address}:{port}",
+                "listen": f"{proto}:127.0.0.1:{localport}",
+                "type": "proxy",
+            }
+            localports.append(localport)
+        for sock in reserved:  # Release ports right before LXD binds them
+            sock.close()
+        return localports, devices
 
     def proxy_close(self, localport: int, proto: ProtocolTypeStr = "tcp"):
         """Close existing proxy."""
-        self._container._logger.debug("Closing proxy %s port: %d", proto, localport)
-        del self._container.lxd_container.devices[f"proxy-{proto}-{localport}"]
+        self.proxy_close_many([localport], proto)
+
+    def proxy_close_many(self, localports: typing.Iterable[int], proto: ProtocolTypeStr = "tcp"):
+        """Close multiple existing proxies with single update of container configuration."""
+        for localport in localports:
+            self._container._logger.debug("Closing proxy %s port: %d", proto, localport)
+            del self._container.lxd_container.devices[f"proxy-{proto}-{localport}"]
         self._container.lxd_container.save(wait=True)
 
     @contextlib.contextmanager
-    def proxy(self, *args, **kwargs) -> typing.Generator[int, None, None]:
+    def proxy(
+        self,
+        proto: ProtocolTypeStr = "tcp",
+        address: typing.Union[str, ipaddress.IPv4Address, ipaddress.IPv6Address] = "127.0.0.1",
+        port: int = 80,
+    ) -> typing.Generator[int, None, None]:
         """Open proxy for limited context.
 
         This is using proxy_open and proxy_close.
         """
-        port = self.proxy_open(*args, **kwargs)
+        localport = self.proxy_open(proto, address, port)
         try:
-            yield port
+            yield localport
         finally:
-            self.proxy_close(port)
+            self.proxy_close(localport, proto)
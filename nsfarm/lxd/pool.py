@@ -0,0 +1,146 @@
+"""Pool of pre-booted containers.
+
+Creating and booting of the container takes most of the time of Container.prepare(). The pool keeps booted containers
+ready (without devices as those can't be shared) so Container can check one out and only hot-plug its devices.
+"""
+import concurrent.futures
+import itertools
+import logging
+import os
+import threading
+import typing
+
+import pylxd
+
+from .exceptions import NSFarmLXDError
+from .image import Image
+
+logger = logging.getLogger(__package__)
+
+PoolKey = typing.Tuple[str, typing.Tuple[str, ...]]
+
+
+class ContainerPool:
+    """Pool of booted ephemeral containers waiting to be used by Container.
+
+    Containers are pooled per image and set of profiles. The pool is filled in the background: the first checkout for
+    given key is a miss and every checkout starts replenishment of the pool.
+
+    size: number of containers kept ready for every image and set of profiles
+    jobs: maximum number of containers being created concurrently
+    """
+
+    def __init__(self, size: int = 1, jobs: int = 4):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._ready: dict[PoolKey, list[pylxd.models.Container]] = {}
+        self._pending: dict[PoolKey, int] = {}
+        self._counter = itertools.count(1)
+        self._closed = False
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="nsfarm-pool")
+
+    @staticmethod
+    def _key(image: Image, profiles: typing.Iterable[str]) -> PoolKey:
+        return image.alias(), tuple(sorted(profiles))
+
+    def checkout(
+        self, lxd_client: pylxd.Client, image: Image, profiles: typing.Iterable[str]
+    ) -> typing.Optional[pylxd.models.Container]:
+        """Take booted container from pool and start replenishment of the pool.
+
+        The image has to be prepared.
+
+        Returns running container or None if there is none ready.
+        """
+        key = self._key(image, profiles)
+        with self._lock:
+            ready = self._ready.get(key)
+            container = ready.pop(0) if ready else None
+            if container is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        self.fill(lxd_client, image, profiles)
+        if container is not None:
+            logger.debug("Container checked out from pool: %s", container.name)
+        return container
+
+    def fill(self, lxd_client: pylxd.Client, image: Image, profiles: typing.Iterable[str]) -> None:
+        """Start creation of containers in background so there are size of them ready for given image and profiles.
+
+        The image has to be prepared.
+        """
+        key = self._key(image, profiles)
+        with self._lock:
+            if self._closed:
+                return
+            missing = self.size - len(self._ready.get(key, ())) - self._pending.get(key, 0)
+            if missing <= 0:
+                return
+            self._pending[key] = self._pending.get(key, 0) + missing
+        for _ in range(missing):
+            self._executor.submit(self._spawn, lxd_client, image, key)
+
+    def _spawn(self, lxd_client: pylxd.Client, image: Image, key: PoolKey) -> None:
+        container = None
+        try:
+            container = lxd_client.containers.create(
+                {
+                    "name": self._container_name(lxd_client, image),
+                    "ephemeral": True,
+                    "profiles": list(key[1]),
+                    "source": {
+                        "type": "image",
+                        "alias": key[0],
+                    },
+                },
+                wait=True,
+            )
+            container.start(wait=True)
+            res = container.execute(["wait4boot"])
+            if res.exit_code != 0:
+                raise NSFarmLXDError(f"Container did not boot (exit code {res.exit_code}): {res.stderr}")
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Unable to create container for pool: %s", key[0])
+            if container is not None:
+                _remove(container)
+            container = None
+        with self._lock:
+            self._pending[key] -= 1
+            if container is not None and not self._closed:
+                self._ready.setdefault(key, []).append(container)
+                logger.debug("Container added to pool: %s", container.name)
+                return
+        if container is not None:
+            _remove(container)
+
+    def _container_name(self, lxd_client: pylxd.Client, image: Image) -> str:
+        # This follows naming convention of Container so abandoned containers are removed by cleanup algorithm.
+        while True:
+            name = f"nsfarm-pool-{image.name}-{os.getpid()}x{next(self._counter)}"
+            if not lxd_client.containers.exists(name):
+                return name
+
+    def ready(self) -> int:
+        """Number of containers ready to be checked out."""
+        with self._lock:
+            return sum(len(containers) for containers in self._ready.values())
+
+    def close(self) -> None:
+        """Remove all containers in pool and stop replenishment."""
+        with self._lock:
+            self._closed = True
+            containers = [container for ready in self._ready.values() for container in ready]
+            self._ready.clear()
+        self._executor.shutdown(wait=True)
+        for container in containers:
+            _remove(container)
+
+
+def _remove(container: pylxd.models.Container) -> None:
+    try:
+        container.stop(wait=True)  # Container is ephemeral and thus removed once stopped
+    except pylxd.exceptions.LXDAPIException as exc:
+        logger.warning("Unable to remove pooled container %s: %s", container.name, exc)
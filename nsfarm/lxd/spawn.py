@@ -0,0 +1,138 @@
+"""Interactive commands in containers using LXD exec API directly.
+
+The alternative is to spawn 'lxc exec' for every command. That requires start of lxc client and its connection to LXD
+that is noticeably slower than just opening websockets over the connection we already have.
+"""
+import contextlib
+import os
+import socket
+import threading
+import typing
+from urllib import parse
+
+import pexpect.fdpexpect
+import pylxd
+from pylxd.models import Operation
+from ws4py.client.threadedclient import WebSocketClient
+
+BUFFER_SIZE = 4096
+
+
+class _RelayWebsocket(WebSocketClient):
+    """Websocket relaying received data to the socket."""
+
+    def __init__(self, url: str, resource: str, sock: typing.Optional[socket.socket], ssl_options=None):
+        super().__init__(url, ssl_options=ssl_options)
+        self.resource = resource
+        self._sock = sock
+
+    def received_message(self, message):
+        if self._sock is None or not message.data:
+            return
+        with contextlib.suppress(OSError):
+            self._sock.sendall(message.data)
+
+    def closed(self, code, reason=None):
+        if self._sock is not None:
+            with contextlib.suppress(OSError):
+                self._sock.shutdown(socket.SHUT_WR)
+
+
+class ExecSpawn(pexpect.fdpexpect.fdspawn):
+    """pexpect handle for command running in container with LXD exec API.
+
+    The command runs in interactive mode (with terminal) the same way as with 'lxc exec'. Data are passed between the
+    websocket and pexpect trough socket pair.
+
+    lxd_container: pylxd container the command is executed in
+    command: command to be executed
+    environment: additional environment variables for the command
+
+    The rest of arguments are passed to pexpect.fdpexpect.fdspawn.
+    """
+
+    def __init__(
+        self,
+        lxd_container: pylxd.models.Container,
+        command: typing.Iterable[str],
+        environment: typing.Optional[dict[str, str]] = None,
+        timeout: float = 30,
+        maxread: int = 2000,
+        searchwindowsize: typing.Optional[int] = None,
+        logfile=None,
+    ):
+        command = list(command)
+        env = {"TERM": os.environ["TERM"]} if "TERM" in os.environ else {}
+        env.update(environment or {})
+        response = lxd_container.api["exec"].post(
+            json={
+                "command": command,
+                "environment": env,
+                "wait-for-websocket": True,
+                "interactive": True,
+                "width": 80,
+                "height": 24,
+            }
+        )
+        operation = response.json()
+        client = lxd_container.client
+        fds = operation["metadata"]["metadata"]["fds"]
+        path = parse.urlparse(
+            client.api.operations[Operation.extract_operation_id(operation["operation"])].websocket._api_endpoint
+        ).path
+
+        ours, self._theirs = socket.socketpair()
+        self._stdio = _RelayWebsocket(
+            client.websocket_url, f"{path}?secret={fds['0']}", self._theirs, client.ssl_options
+        )
+        self._control = _RelayWebsocket(
+            client.websocket_url, f"{path}?secret={fds['control']}", None, client.ssl_options
+        )
+        self._stdio.connect()
+        self._control.connect()
+        self._forwarder = threading.Thread(target=self._forward, daemon=True)
+        self._forwarder.start()
+
+        super().__init__(
+            ours.detach(),
+            args=command,
+            timeout=timeout,
+            maxread=maxread,
+            searchwindowsize=searchwindowsize,
+            logfile=logfile,
+        )
+        self.name = f"<lxd exec {lxd_container.name}: {' '.join(command)}>"
+
+    def _forward(self):
+        """Forward data written by pexpect to the websocket."""
+        while True:
+            try:
+                data = self._theirs.recv(BUFFER_SIZE)
+            except OSError:
+                break
+            if not data:
+                break
+            try:
+                self._stdio.send(data, binary=True)
+            except Exception:  # pylint: disable=broad-except
+                break  # Websocket was closed so the command exited
+        self._close_websockets()
+
+    def _close_websockets(self):
+        for websocket in (self._stdio, self._control):
+            with contextlib.suppress(Exception):
+                websocket.close()
+
+    def isalive(self) -> bool:
+        """Command is alive as long as the websocket is open."""
+        return not self._stdio.terminated and super().isalive()
+
+    def close(self, force=True):  # pylint: disable=unused-argument
+        """Close connection to the command. LXD terminates the command (it receives SIGHUP from its terminal).
+
+        force: ignored and present only for compatibility with pexpect.spawn.close
+        """
+        super().close()
+        self._close_websockets()
+        self._forwarder.join()
+        self._theirs.close()
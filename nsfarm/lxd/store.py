@@ -0,0 +1,77 @@
+"""Store of images exported from LXD.
+
+Images bootstrapped on one host can be reused on other hosts (or after they were cleaned) when they are exported to the
+store. The store is a plain directory so it can be shared using NFS or synchronized with rsync.
+"""
+import contextlib
+import logging
+import os
+import pathlib
+import tempfile
+import typing
+
+import pylxd.models
+
+logger = logging.getLogger(__package__)
+
+CHUNK_SIZE = 2**16
+
+
+class ImageStore:
+    """Directory with images exported from LXD.
+
+    The images are stored as tarballs in the unified format as exported by LXD (compressed by LXD, gzip by default).
+    Files are named by image name and hash so there can be multiple versions of the same image.
+
+    directory: path to the store (created if it does not exist)
+    """
+
+    def __init__(self, directory: typing.Union[str, os.PathLike]):
+        self.directory = pathlib.Path(directory)
+
+    def path(self, name: str, img_hash: str) -> pathlib.Path:
+        """Path to the file image with given name and hash is stored in."""
+        return self.directory / f"{name}-{img_hash}.tar.gz"
+
+    def contains(self, name: str, img_hash: str) -> bool:
+        """Check if image is present in the store."""
+        return self.path(name, img_hash).is_file()
+
+    def save(self, lxd_image: pylxd.models.Image, name: str, img_hash: str) -> pathlib.Path:
+        """Export image from LXD to the store.
+
+        The file is written under temporary name and renamed once complete so readers never see partial image. Image
+        already present in the store is not exported again.
+
+        Returns path to the stored image.
+        """
+        path = self.path(name, img_hash)
+        if path.is_file():
+            return path
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, prefix=f".{path.name}.", suffix=".tmp")
+        tmp_path = pathlib.Path(tmp_name)
+        try:
+            with open(fd, "wb") as file, contextlib.closing(lxd_image.api.export.get(stream=True)) as response:
+                os.fchmod(file.fileno(), 0o644)  # The store can be shared (mkstemp creates file readable only by owner)
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    file.write(chunk)
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        logger.info("Image exported to store: %s", path)
+        return path
+
+    def load(self, lxd_client: pylxd.Client, name: str, img_hash: str) -> typing.Optional[pylxd.models.Image]:
+        """Import image from the store to LXD.
+
+        Returns imported image or None if there is no such image in the store.
+        """
+        path = self.path(name, img_hash)
+        try:
+            file = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        with file:
+            logger.info("Importing image from store: %s", path)
+            return lxd_client.images.create(file, public=False)
@@ -1,13 +1,17 @@
 """Various utility functions to manage NSFarm containers and images.
 """
+import concurrent.futures
 import logging
 import os
+import time
+import typing
 from datetime import datetime
 
 import dateutil.parser
 import pylxd
 
-from .image import Image
+from .exceptions import LXDImageParentError, LXDImageUndefinedError
+from .image import Image, read_header
 
 logger = logging.getLogger(__package__)
 
@@ -100,15 +104,96 @@ def all_images():
     return (imgf[:-3] for imgf in os.listdir(Image.IMGS_DIR) if imgf.endswith(".sh"))
 
 
-def bootstrap(lxd_client, imgs=None):
+def image_parents(imgs: typing.Iterable[str]) -> typing.Dict[str, typing.Optional[str]]:
+    """Collect NSFarm parents of given images and of all their NSFarm ancestors.
+
+    This reads only headers of image definitions and thus does not require LXD.
+
+    Returns dictionary mapping image name to its parent's name or None if parent is not NSFarm image.
+    """
+    parents: typing.Dict[str, typing.Optional[str]] = {}
+    pending = list(imgs)
+    while pending:
+        img = pending.pop()
+        if img in parents:
+            continue
+        file_path = Image.IMGS_DIR / f"{img}.sh"
+        if not file_path.is_file():
+            raise LXDImageUndefinedError(img, file_path)
+        parent, _ = read_header(file_path)
+        image_type, image_alias = parent.split(":", maxsplit=1)
+        if image_type == "nsfarm":
+            parents[img] = image_alias
+            pending.append(image_alias)
+        elif image_type == "images":
+            parents[img] = None
+        else:
+            raise LXDImageParentError(img, parent)
+    return parents
+
+
+def run_dag(
+    parents: typing.Dict[str, typing.Optional[str]], func: typing.Callable[[str], None], jobs: int = 1
+) -> typing.Dict[str, typing.Optional[float]]:
+    """Call func for every node of the tree concurrently with parent always processed before its children.
+
+    parents: dictionary mapping node to its parent (or None for root nodes) as returned by image_parents
+    func: function called with node as an argument
+    jobs: maximum number of concurrent calls of func
+
+    Nodes are processed exactly once. Children of node for which func raised exception are skipped.
+
+    Returns dictionary mapping nodes to time in seconds func took for them or None for failed and skipped ones.
+    """
+    children: typing.Dict[typing.Optional[str], typing.List[str]] = {}
+    for node, parent in parents.items():
+        children.setdefault(parent if parent in parents else None, []).append(node)
+
+    def timed(node):
+        start = time.perf_counter()
+        func(node)
+        return time.perf_counter() - start
+
+    result: typing.Dict[str, typing.Optional[float]] = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        running = {executor.submit(timed, node): node for node in children.get(None, [])}
+        while running:
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                node = running.pop(future)
+                try:
+                    result[node] = future.result()
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Processing of '%s' failed", node)
+                    skipped = list(children.get(node, []))
+                    while skipped:
+                        child = skipped.pop()
+                        result[child] = None
+                        skipped += children.get(child, [])
+                    result[node] = None
+                    continue
+                running.update({executor.submit(timed, child): child for child in children.get(node, [])})
+    return result
+
+
+def bootstrap(lxd_client, imgs=None, jobs=1, timings=None):
     """Bootstrap all defined images.
 
     imgs: list of images to bootstrap
+    jobs: number of images bootstrapped concurrently
+    timings: dictionary to be filled in with time in seconds spent on every image (None for failed or skipped ones)
+
+    Parents of images are bootstrapped as well (always before their children and only once). Independent images are
+    bootstrapped concurrently.
 
     Returns True if all images were bootstrapped correctly.
     """
-    success = True
-    for img in all_images() if imgs is None else imgs:
+
+    def prepare(img):
         logger.info("Trying to bootstrap: %s", img)
         Image(lxd_client, img).prepare()
-    return success
+
+    result = run_dag(image_parents(all_images() if imgs is None else imgs), prepare, jobs)
+    if timings is not None:
+        timings.update(result)
+    return all(duration is not None for duration in result.values())
@@ -0,0 +1,3 @@
+"""Recording of raw terminal sessions with timing."""
+from .recording import Direction, Reader, Record, Recorder
+from .replay import ReplayError, ReplaySpawn
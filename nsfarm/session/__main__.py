@@ -0,0 +1,84 @@
+import argparse
+import sys
+import time
+
+from . import Direction, Reader
+
+
+def parser(upper_parser):
+    subparsers = upper_parser.add_subparsers()
+
+    dump = subparsers.add_parser("dump", help="Print content of session recording")
+    dump.set_defaults(session_op="dump")
+    dump.add_argument(
+        "RECORDING",
+        help="Path to session recording.",
+    )
+    dump.add_argument(
+        "-s",
+        "--start",
+        type=float,
+        help="Print only data recorded at least START seconds after start of the session.",
+    )
+    dump.add_argument(
+        "-e",
+        "--end",
+        type=float,
+        help="Print only data recorded at most END seconds after start of the session.",
+    )
+    dump.add_argument(
+        "-r",
+        "--raw",
+        action="store_true",
+        help="Write raw data received from target instead of listing of records (sent data are not included).",
+    )
+
+    return {
+        None: upper_parser,
+        "dump": dump,
+    }
+
+
+def op_dump(args, upper_parser):
+    """Handler for command line operation dump."""
+    try:
+        reader = Reader(args.RECORDING)
+    except (OSError, ValueError) as exc:
+        upper_parser.error(str(exc))
+    with reader:
+        print(
+            f"Session started at {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(reader.start))}",
+            file=sys.stderr,
+        )
+        start = reader.start + args.start if args.start is not None else None
+        end = reader.start + args.end if args.end is not None else None
+        for record in reader.records(start, end):
+            if args.raw:
+                if record.direction == Direction.IN:
+                    sys.stdout.buffer.write(record.data)
+            else:
+                prefix = ">" if record.direction == Direction.IN else "<"
+                print(f"{record.timestamp - reader.start:.6f} {prefix} {repr(record.data)[2:-1]}")
+    sys.exit(0)
+
+
+def handle_args(args, parser_ret):
+    handles = {
+        "dump": op_dump,
+    }
+    if hasattr(args, "session_op"):
+        handles[args.session_op](args, parser_ret[args.session_op])
+    else:
+        parser_ret[None].print_usage()
+        sys.exit(1)
+
+
+def main():
+    top_parser = argparse.ArgumentParser(description="Recorded sessions inspection.")
+    parser_ret = parser(top_parser)
+    handle_args(top_parser.parse_args(), parser_ret)
+
+
+if __name__ == "__main__":
+    sys.argv[0] = "nsfarm.session"
+    main()
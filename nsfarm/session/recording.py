@@ -0,0 +1,191 @@
+"""Binary recordings of terminal sessions.
+
+Recording is append-only file that starts with header (magic and start time of the session) followed by records. Every
+record is timestamp, direction and length (see _RECORD) followed by data. Recording is accompanied with index file
+(recording path with .idx suffix) that contains timestamp and offset of record in recording roughly every INDEX_STEP
+bytes. This allows reading of any time window of long recording without parsing it from start.
+"""
+import bisect
+import enum
+import os
+import pathlib
+import struct
+import threading
+import time
+import typing
+
+MAGIC = b"NSFSESS\x01"
+INDEX_SUFFIX = ".idx"
+# Amount of data recorded between index entries
+INDEX_STEP = 2**16
+
+_HEADER = struct.Struct("<8sd")  # magic, start time
+_RECORD = struct.Struct("<dBI")  # timestamp, direction, length of data
+_INDEX = struct.Struct("<dQ")  # timestamp, offset of record
+
+
+class Direction(enum.IntEnum):
+    """Direction of data in session."""
+
+    IN = 0  # data received from target (such as console output)
+    OUT = 1  # data sent to target (such as typed commands)
+
+
+class Record(typing.NamedTuple):
+    """Single chunk of data recorded in session."""
+
+    timestamp: float
+    direction: Direction
+    data: bytes
+
+
+def index_path(path: typing.Union[str, os.PathLike]) -> pathlib.Path:
+    """Path to index file for given recording."""
+    path = pathlib.Path(path)
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+class Recorder:
+    """Records data of session to file.
+
+    Records are written without buffering so recording is complete even if process is terminated. Recording can be
+    performed from multiple threads. Existing recording is appended to.
+    """
+
+    def __init__(self, path: typing.Union[str, os.PathLike]):
+        self.path = pathlib.Path(path)
+        self._lock = threading.Lock()
+        self._file = open(self.path, "ab", buffering=0)
+        self._index = open(index_path(self.path), "ab", buffering=0)
+        self._offset = self._file.seek(0, os.SEEK_END)
+        if self._offset == 0:
+            self.start = time.time()
+            self._offset = self._file.write(_HEADER.pack(MAGIC, self.start))
+        else:
+            with open(self.path, "rb") as file:
+                self.start = _read_header(file)
+        self._last = self.start
+        self._indexed = self._offset  # offset of last indexed record
+
+    def record(self, direction: Direction, data: bytes) -> None:
+        """Record given data with current time."""
+        if not data:
+            return
+        with self._lock:
+            if self._file is None:
+                return
+            self._last = max(self._last, time.time())  # Timestamps have to be monotonic for the index to work
+            if self._offset - self._indexed >= INDEX_STEP:
+                self._index.write(_INDEX.pack(self._last, self._offset))
+                self._indexed = self._offset
+            self._offset += self._file.write(_RECORD.pack(self._last, direction, len(data)) + data)
+
+    def writer(self, direction: Direction) -> "RecorderWriter":
+        """File-like object that records everything written to it in given direction.
+
+        This is intended to be used as pexpect's logfile_read or logfile_send.
+        """
+        return RecorderWriter(self, direction)
+
+    def close(self) -> None:
+        """Close recording. Any following records are ignored."""
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.close()
+            self._index.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, etype, value, traceback):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+
+class RecorderWriter:
+    """File-like object recording all written data in single direction."""
+
+    def __init__(self, recorder: Recorder, direction: Direction):
+        self.recorder = recorder
+        self.direction = direction
+
+    def write(self, buf: bytes) -> None:
+        """Standard-like file write function."""
+        self.recorder.record(self.direction, buf)
+
+    def flush(self) -> None:
+        """Standard-like flush function. Records are not buffered so there is nothing to do."""
+
+
+class Reader:
+    """Reads recording of session."""
+
+    def __init__(self, path: typing.Union[str, os.PathLike]):
+        self.path = pathlib.Path(path)
+        self._file = open(self.path, "rb")
+        self.start = _read_header(self._file)
+        self._index_times: list[float] = []
+        self._index_offsets: list[int] = []
+        try:
+            index = index_path(self.path).read_bytes()
+        except FileNotFoundError:
+            index = b""
+        for timestamp, offset in _INDEX.iter_unpack(index[: len(index) - len(index) % _INDEX.size]):
+            self._index_times.append(timestamp)
+            self._index_offsets.append(offset)
+
+    def records(
+        self, start: typing.Optional[float] = None, end: typing.Optional[float] = None
+    ) -> typing.Iterator[Record]:
+        """Iterate over records in given time window.
+
+        start: absolute time of the first record (the start of the recording if None)
+        end: absolute time after which no record is returned (the end of the recording if None)
+
+        The last record is silently ignored if it is incomplete (recording was interrupted while it was written).
+        """
+        offset = _HEADER.size
+        if start is not None:
+            # The last indexed record that is not newer than start. Records before it are surely not in the window.
+            i = bisect.bisect_left(self._index_times, start)
+            if i > 0:
+                offset = self._index_offsets[i - 1]
+        self._file.seek(offset)
+        while True:
+            head = self._file.read(_RECORD.size)
+            if len(head) < _RECORD.size:
+                return
+            timestamp, direction, length = _RECORD.unpack(head)
+            if end is not None and timestamp > end:
+                return
+            if start is not None and timestamp < start:
+                self._file.seek(length, os.SEEK_CUR)
+                continue
+            data = self._file.read(length)
+            if len(data) < length:
+                return
+            yield Record(timestamp, Direction(direction), data)
+
+    def __iter__(self):
+        return self.records()
+
+    def close(self) -> None:
+        """Close recording."""
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, etype, value, traceback):
+        self.close()
+
+
+def _read_header(file: typing.BinaryIO) -> float:
+    header = file.read(_HEADER.size)
+    if len(header) < _HEADER.size or not header.startswith(MAGIC):
+        raise ValueError(f"Not a session recording: {file.name}")
+    return _HEADER.unpack(header)[1]
@@ -0,0 +1,166 @@
+"""Replay of recorded sessions in place of pexpect handle.
+"""
+import os
+import time
+import typing
+
+import pexpect
+from pexpect.spawnbase import SpawnBase
+
+from .recording import Direction, Reader, Record
+
+
+class ReplayError(Exception):
+    """Data sent to replayed session do not match the recording."""
+
+    def __init__(self, expected: bytes, sent: bytes):
+        super().__init__(f"Sent data do not match the recording: expected {expected!r} but got {sent!r}")
+        self.expected = expected
+        self.sent = sent
+
+
+class ReplaySpawn(SpawnBase):
+    """pexpect handle that plays back recorded session.
+
+    Received data (Direction.IN) are provided to the reader with timing of the recording. Sent data (Direction.OUT) act
+    as synchronization points: data recorded after them are not provided until the same data are sent to the replay. The
+    timing is always relative to the last synchronization point, thus delays on our side are not accumulated.
+
+    records: records of session to replay
+    speed: factor of replay speed (2 replays twice as fast as recorded) or None to provide data without any delay
+    strict: raise ReplayError if sent data do not match recording (otherwise every send is considered to be the next
+      recorded one no matter its content)
+
+    This works with cli.Cli classes but do not forget to disable initial flush as that would consume initial prompt.
+    """
+
+    def __init__(
+        self,
+        records: typing.Iterable[Record],
+        speed: typing.Optional[float] = 1.0,
+        strict: bool = True,
+        timeout: float = 30,
+        maxread: int = 2000,
+        searchwindowsize: typing.Optional[int] = None,
+        logfile=None,
+    ):
+        super().__init__(timeout=timeout, maxread=maxread, searchwindowsize=searchwindowsize, logfile=logfile)
+        self.speed = speed
+        self.strict = strict
+        self._records = list(records)
+        self._index = 0  # index of the current record
+        self._offset = 0  # amount of data already provided or matched from the current record
+        self._sent = bytearray()  # data sent but not yet matched with the recording
+        self._sends = 0  # number of sends not yet matched with the recording (used only if not strict)
+        self._sync: typing.Optional[tuple[float, float]] = None  # recording time and our time of synchronization
+        self.name = "<replay>"
+        self.closed = False
+
+    @classmethod
+    def from_recording(
+        cls,
+        path: typing.Union[str, os.PathLike],
+        start: typing.Optional[float] = None,
+        end: typing.Optional[float] = None,
+        **kwargs,
+    ) -> "ReplaySpawn":
+        """Replay given time window of recording.
+
+        start and end are relative to the start of the recording (see Reader.records).
+        All other keyword arguments are passed to the ReplaySpawn.
+        """
+        with Reader(path) as reader:
+            return cls(
+                reader.records(
+                    None if start is None else reader.start + start, None if end is None else reader.start + end
+                ),
+                **kwargs,
+            )
+
+    def _deadline(self) -> typing.Optional[float]:
+        """Time when the current record is to be provided. None is returned if it can't be provided at all."""
+        if self._index >= len(self._records) or self._records[self._index].direction != Direction.IN:
+            return None
+        if self.speed is None:
+            return 0
+        timestamp = self._records[self._index].timestamp
+        if self._sync is None:
+            self._sync = (timestamp, time.monotonic())
+        return self._sync[1] + (timestamp - self._sync[0]) / self.speed
+
+    def read_nonblocking(self, size=1, timeout=-1):
+        """Provide recorded data once they are due.
+
+        Raises pexpect.TIMEOUT if data are not due in timeout or sent data are expected first and pexpect.EOF at the end
+        of the recording.
+        """
+        if timeout == -1:
+            timeout = self.timeout
+        if self._index >= len(self._records):
+            self.flag_eof = True
+            raise pexpect.EOF("End of recording")
+        deadline = self._deadline()
+        if deadline is None or (timeout is not None and deadline > time.monotonic() + timeout):
+            if timeout:
+                time.sleep(timeout)
+            raise pexpect.TIMEOUT("Timeout exceeded.")
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        data = self._records[self._index].data[self._offset : self._offset + size]
+        self._advance(len(data))
+        self._match_sent()  # Data might have been sent before we got to them in recording
+        self._log(data, "read")
+        return data
+
+    def send(self, s) -> int:
+        """Send data to replay. Data are matched with recording to unblock the following received data."""
+        data = self._coerce_send_string(s)
+        self._log(data, "send")
+        if self.strict:
+            self._sent += data
+        else:
+            self._sends += 1
+        self._match_sent()
+        return len(data)
+
+    def _match_sent(self):
+        """Match sent data with recording. This has to be called whenever new data are sent or recording advances."""
+        while (self._sent or self._sends) and self._index < len(self._records):
+            record = self._records[self._index]
+            if record.direction != Direction.OUT:
+                break
+            expected = record.data[self._offset :]
+            if self.strict:
+                matched = min(len(expected), len(self._sent))
+                if self._sent[:matched] != expected[:matched]:
+                    raise ReplayError(expected, bytes(self._sent))
+                del self._sent[:matched]
+            else:
+                matched = len(expected)
+                self._sends -= 1
+            self._advance(matched)
+            if self._offset == 0:  # Whole record was sent so this is synchronization point
+                self._sync = (record.timestamp, time.monotonic())
+
+    def sendline(self, s="") -> int:
+        """Send data with trailing new line."""
+        return self.send(self._coerce_send_string(s) + self.linesep)
+
+    def write(self, s) -> None:
+        """Send data to replay."""
+        self.send(s)
+
+    def _advance(self, size: int):
+        self._offset += size
+        if self._offset >= len(self._records[self._index].data):
+            self._index += 1
+            self._offset = 0
+
+    def isalive(self) -> bool:
+        """Replay is alive until all records were replayed."""
+        return not self.closed and self._index < len(self._records)
+
+    def close(self) -> None:
+        """Close replay."""
+        self.closed = True
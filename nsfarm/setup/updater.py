@@ -115,13 +115,17 @@ class Pkglist(_Setup):
 
     def prepare(self, revert_needed: bool = True):
         # TODO use UCI setup instead here
-        for pkglist in self.pkglists:
-            self._sh.run(f"uci add_list pkglists.pkglists.pkglist='{pkglist}'")
-        self._sh.run("uci commit pkglists.pkglists")
+        self._sh.run_many(
+            [f"uci add_list pkglists.pkglists.pkglist='{pkglist}'" for pkglist in self.pkglists]
+            + ["uci commit pkglists.pkglists"],
+            stop_on_failure=True,
+        )
         pkgupdate(self._sh)
 
     def revert(self):
-        for pkglist in self.pkglists:
-            self._sh.run(f"uci del_list pkglists.pkglists.pkglist='{pkglist}'")
-        self._sh.run("uci commit pkglists.pkglists")
+        self._sh.run_many(
+            [f"uci del_list pkglists.pkglists.pkglist='{pkglist}'" for pkglist in self.pkglists]
+            + ["uci commit pkglists.pkglists"],
+            stop_on_failure=True,
+        )
         pkgupdate(self._sh)
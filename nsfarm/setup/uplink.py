@@ -19,23 +19,32 @@ class CommonWAN(_Setup):
         self._previous: dict[str, typing.Optional[str]] = {}
 
     def prepare(self, revert_needed: bool = True):
-        for key, value in self._config.items():
-            if revert_needed:
-                self._sh.command(f"uci -q get network.{self._interface}.{key}")
-                self._previous[key] = None if self._sh.prompt() != 0 else self._sh.output
-            self._sh.run(f"uci set network.{self._interface}.{key}={value}")
-        self._sh.run(f"uci commit network.{self._interface}")
+        if revert_needed:
+            previous = self._sh.run_many(
+                [f"uci -q get network.{self._interface}.{key}" for key in self._config], check=False
+            )
+            for key, result in zip(self._config, previous):
+                self._previous[key] = None if result.exit_code != 0 else result.output
+        self._sh.run_many(
+            [f"uci set network.{self._interface}.{key}={value}" for key, value in self._config.items()]
+            + [f"uci commit network.{self._interface}"],
+            stop_on_failure=True,
+        )
         if self._restart:
             self._sh.run("/etc/init.d/network restart")
             self.wait4network()
 
     def revert(self):
-        for key, value in self._previous.items():
-            if value is None:
-                self._sh.run(f"uci del network.{self._interface}.{key}")
-            else:
-                self._sh.run(f"uci set network.{self._interface}.{key}={value}")
-        self._sh.run(f"uci commit network.{self._interface}")
+        self._sh.run_many(
+            [
+                f"uci del network.{self._interface}.{key}"
+                if value is None
+                else f"uci set network.{self._interface}.{key}={value}"
+                for key, value in self._previous.items()
+            ]
+            + [f"uci commit network.{self._interface}"],
+            stop_on_failure=True,
+        )
         if self._restart:
             self._sh.run("/etc/init.d/network restart")
             # Note: we would like to wait for network here as well but what is the correct check here?
@@ -39,7 +39,14 @@ class Dir(_Setup):
 
 
 class DeployFile(_Setup):
-    """Simple way to deploy file trough shell instance."""
+    """Simple way to deploy file trough shell instance.
+
+    If shell runs directly in LXD container (its pexpect handle was created with nsfarm.lxd.Container.pexpect with the
+    default command) and path is absolute then the file is transferred directly using LXD files API instead of terminal.
+    That is considerably faster for big files. Permissions and ownership of the replaced file are preserved the same way
+    as with shell, new files are owned by root. Shell is used if the path exists and it is not a regular file (such as
+    symbolic link) as LXD files API does not follow symbolic links.
+    """
 
     def __init__(
         self,
@@ -47,23 +54,33 @@ class DeployFile(_Setup):
         path: typing.Union[str, pathlib.PurePosixPath],
         content: typing.Union[str, bytes],
         mkdir: bool = False,
+        fast: bool = True,
     ):
         """shell: shell used for setup
         path: path where file should be deployed
         content: content of file to be deployed
         mkdir: if upper directory should be created or not
+        fast: use LXD files API if possible instead of shell
         """
         self._sh = shell
         self._path = pathlib.PurePosixPath(path)
         self._content = content
         self._previous: typing.Optional[bytes] = None
+        self._attributes = None
+        self._fast = False
         self._dir = Dir(shell, self._path.parent) if mkdir else None
+        self._container = getattr(shell, "nsfarm_container", None) if fast and self._path.is_absolute() else None
 
     def prepare(self, revert_needed: bool = True):
-        self._previous = self._sh.bin_read(self._path, expect_exist=False) if revert_needed else None
+        self._attributes = self._container.file_attributes(self._path) if self._container is not None else None
+        self._fast = self._container is not None and (self._attributes is None or self._attributes.type == "file")
+        self._previous = self._read() if revert_needed else None
         if self._previous is None and self._dir is not None:
             self._dir.prepare()
-        if isinstance(self._content, str):
+        if self._fast:
+            # Note: new line is appended to be consistent with Shell.txt_write
+            self._write(self._content + "\n" if isinstance(self._content, str) else self._content)
+        elif isinstance(self._content, str):
             self._sh.txt_write(self._path, self._content)
         else:
             self._sh.bin_write(self._path, self._content)
@@ -73,9 +90,25 @@ class DeployFile(_Setup):
             self._sh.run(f"rm -f '{self._path}'")
             if self._dir is not None:
                 self._dir.revert()
+        elif self._fast:
+            self._write(self._previous)
         else:
             self._sh.bin_write(self._path, self._previous)
 
+    def _write(self, content: typing.Union[str, bytes]):
+        """Write file using LXD files API while keeping attributes of the original file."""
+        if self._attributes is None:
+            self._container.write_file(self._path, content)
+        else:
+            self._container.write_file(
+                self._path, content, self._attributes.mode, self._attributes.uid, self._attributes.gid
+            )
+
+    def _read(self) -> typing.Optional[bytes]:
+        if self._fast:
+            return self._container.read_file(self._path, expect_exist=False)
+        return self._sh.bin_read(self._path, expect_exist=False)
+
 
 class RootPassword(_Setup):
     """Sets given or random password as the one for root."""
@@ -35,12 +35,21 @@ class Container(LXDContainer):
         super().__init__(lxd_client, IMAGE, device_map, internet, strict)
         self._viewer = None
         self._viewer_port = None
+        self._driver_ports: dict[str, int] = {}
 
     def prepare(self):
         super().prepare()
+        if not self._driver_ports:
+            # Proxies for all drivers and viewer are opened at once as every configuration change is expensive
+            ports = [{"port": port} for port in DRIVER_PORTS.values()]
+            if self.open_viewer:
+                ports.append({"port": 5900})
+            localports = self.network.proxy_open_many(ports)
+            self._driver_ports = dict(zip(DRIVER_PORTS, localports))
+            if self.open_viewer:
+                self._viewer_port = localports[-1]
         self.shell.run("wait4boot")
         if self.open_viewer and self._viewer is None:
-            self._viewer_port = self.network.proxy_open(port=5900)
             self.shell.run("wait4tcp 5900")
             self._logger.info("Running: vncviewer localhost:%d", self._viewer_port)
             self._viewer = subprocess.Popen(["vncviewer", f"localhost:{self._viewer_port}"])
@@ -48,8 +57,10 @@ class Container(LXDContainer):
     def cleanup(self):
         if self._viewer is not None:
             self._viewer.terminate()
-            self.network.proxy_close(self._viewer_port)
             self._viewer = None
+        # Proxies are removed together with container
+        self._driver_ports = {}
+        self._viewer_port = None
         super().cleanup()
 
     @contextlib.contextmanager
@@ -60,10 +71,9 @@ class Container(LXDContainer):
         * firefox
         * chrome
         """
-        assert self.network is not None
-        with self.network.proxy(port=DRIVER_PORTS[browser]) as localport:
-            self.shell.run(f"wait4tcp '{DRIVER_PORTS[browser]}'")
-            webdriver = selenium.webdriver.remote.webdriver.WebDriver(f"http://127.0.0.1:{localport}")
-            webdriver.set_window_rect(0, 0, *RESOLUTION)
-            yield webdriver
-            webdriver.quit()
+        assert self._driver_ports
+        self.shell.run(f"wait4tcp '{DRIVER_PORTS[browser]}'")
+        webdriver = selenium.webdriver.remote.webdriver.WebDriver(f"http://127.0.0.1:{self._driver_ports[browser]}")
+        webdriver.set_window_rect(0, 0, *RESOLUTION)
+        yield webdriver
+        webdriver.quit()
@@ -0,0 +1,92 @@
+"""Tests of board machinery on simulated board.
+"""
+import logging
+import random
+import time
+
+import pytest
+
+from nsfarm.board.simulated import SimulatedBoard, SimulatedConsole
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture(name="simulated_board")
+def fixture_simulated_board():
+    """Provides function that creates simulated board with given console arguments."""
+    boards = []
+
+    def create(**kwargs) -> SimulatedBoard:
+        board = SimulatedBoard(SimulatedConsole(**kwargs))
+        boards.append(board)
+        return board
+
+    yield create
+    for board in boards:
+        board.close()
+
+
+def test_uboot(simulated_board):
+    """Check that we get to U-Boot and that we can run commands there."""
+    uboot = simulated_board(baudrate=None).uboot()
+    uboot.run("setenv serverip 192.168.1.1")
+    uboot.run('setenv bootargs "earlyprintk rootfstype=ramfs"')
+    uboot.run("echo ${serverip} $bootargs")
+    assert uboot.output == "192.168.1.1 earlyprintk rootfstype=ramfs"
+    assert uboot.run("false", check=False) == 1
+    assert uboot.run("nonexistent", check=False) == 1
+    assert uboot.output == "Unknown command 'nonexistent' - try 'help'"
+
+
+def test_bootup(simulated_board):
+    """Check the whole boot sequence up to the shell."""
+    board = simulated_board(baudrate=None)
+    shell = board.bootup()
+    shell.run("echo Hello")
+    assert shell.output == "Hello"
+    assert board.console.state == "system"
+
+
+def test_autoboot(simulated_board):
+    """Check that system is booted if autoboot is not interrupted."""
+    board = simulated_board(baudrate=None, autoboot=1)
+    board.reset(False)
+    board.pexpect.expect_exact("Hit any key to stop autoboot:  1 ")
+    board.pexpect.expect_exact("Router Turris successfully started.", timeout=3)
+
+
+def test_reboot(simulated_board):
+    """Check that board reboots once shell exits."""
+    board = simulated_board(baudrate=None)
+    shell = board.bootup()
+    shell.sendline("exit")
+    board.pexpect.expect_exact("Hit any key to stop autoboot: ")
+    board.pexpect.sendline("")
+    board.pexpect.expect_exact("=> ")
+
+
+def test_bin(simulated_board):
+    """Check binary transfer trough serial console."""
+    shell = simulated_board(baudrate=None).bootup()
+    data = random.randbytes(16384)
+    shell.bin_write("/tmp/nsfarm-simulated-test", data)
+    assert shell.bin_read("/tmp/nsfarm-simulated-test") == data
+    shell.run("rm -f /tmp/nsfarm-simulated-test")
+
+
+@pytest.mark.parametrize("baudrate", [115200, None])
+def test_baudrate(simulated_board, baudrate, record_property):
+    """Check that output is limited by baudrate and measure round trip of the short command."""
+    shell = simulated_board(baudrate=baudrate).bootup()
+    start = time.perf_counter()
+    shell.run("head -c 11520 /dev/zero | tr '\\0' x")
+    duration = time.perf_counter() - start
+    assert len(shell.output) == 11520
+    if baudrate is not None:
+        assert duration >= 11520 * 10 / baudrate
+    start = time.perf_counter()
+    for _ in range(20):
+        shell.run("true")
+    roundtrip = (time.perf_counter() - start) / 20
+    logger.info("Output: %.3f s, command round trip %.2f ms (baudrate: %s)", duration, roundtrip * 1000, baudrate)
+    record_property("roundtrip_ms", roundtrip * 1000)
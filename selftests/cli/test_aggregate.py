@@ -1,6 +1,8 @@
 """Tests for LineBytesAggregate that it correctly splits bytes to lines.
 """
+import logging
 import sys
+import time
 
 import pytest
 from lorem_text import lorem
@@ -8,6 +10,8 @@ from lorem_text import lorem
 from nsfarm.cli import LineBytesAggregate
 from nsfarm.toolbox.tests import deterministic_random
 
+logger = logging.getLogger(__name__)
+
 
 @pytest.fixture(name="aggregate")
 def fixture_aggregate():
@@ -91,3 +95,23 @@ def test_real(aggregate):
         b"nsfprompt:0# uci set network.wan.netmask='255.240.0.0'",
         b"nsfprompt:0# uci commit network",
     )
+
+
+@pytest.mark.parametrize("delimiter", [b"\n", b"\r\n"])
+@pytest.mark.parametrize("block", [64, 4096, 2**20])
+def test_benchmark(aggregate, delimiter, block, record_property):
+    """Measure throughput on MB sized stream fed in blocks of given size."""
+    agg, collected = aggregate
+    with deterministic_random() as _:
+        lines = [lorem.sentence().encode() for i in range(1000)]
+    data = delimiter.join(lines * 40) + delimiter
+    start = time.perf_counter()
+    for i in range(0, len(data), block):
+        agg.add(data[i : i + block])
+    agg.flush()
+    duration = time.perf_counter() - start
+    assert collected == lines * 40
+    logger.info(
+        "Aggregated %d bytes in blocks of %d bytes with %.2f MB/s", len(data), block, len(data) / duration / 10**6
+    )
+    record_property("aggregate_mbps", len(data) / duration / 10**6)
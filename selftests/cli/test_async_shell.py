@@ -0,0 +1,114 @@
+"""AsyncShell class tests and benchmarks against local Bash.
+"""
+import asyncio
+import logging
+import time
+
+import pexpect
+import pytest
+
+from nsfarm import session
+
+logger = logging.getLogger(__name__)
+
+
+def test_run(local_async_shell):
+    """Check that commands are executed with correct exit code and output."""
+
+    async def run():
+        async with await local_async_shell() as shell:
+            await shell.run("echo First && echo Second")
+            assert shell.output == "First\r\nSecond"
+            assert await shell.run("false", check=False) == 1
+            with pytest.raises(AssertionError):
+                await shell.run("false")
+
+    asyncio.run(run())
+
+
+def test_prompt_pattern(local_async_shell):
+    """Check that custom pattern can be matched alongside the prompt."""
+
+    async def run():
+        async with await local_async_shell() as shell:
+            # The trap is set before the output so interrupt can't be delivered to shell before sleep is started
+            await shell.command("sh -c 'trap \"exit 130\" INT; echo Some; sleep 10'")
+            assert await shell.prompt(["Some"]) == 1
+            await shell.ctrl_c()
+            assert await shell.prompt() == 130
+
+    asyncio.run(run())
+
+
+def test_timeout(local_async_shell):
+    """Check that timeout is reported the same way as with pexpect."""
+
+    async def run():
+        async with await local_async_shell() as shell:
+            await shell.command("sleep 10")
+            with pytest.raises(pexpect.TIMEOUT):
+                await shell.prompt(timeout=0.1)
+
+    asyncio.run(run())
+
+
+def test_eof(local_async_shell):
+    """Check that termination of shell is reported the same way as with pexpect."""
+
+    async def run():
+        async with await local_async_shell() as shell:
+            await shell.command("exit")
+            with pytest.raises(pexpect.EOF):
+                await shell.prompt()
+
+    asyncio.run(run())
+
+
+def test_record(local_async_shell, tmp_path):
+    """Check that communication in both directions is recorded."""
+
+    async def run():
+        with session.Recorder(tmp_path / "session.nsfs") as recorder:
+            async with await local_async_shell(recorder=recorder) as shell:
+                await shell.run("echo Recorded")
+
+    asyncio.run(run())
+    with session.Reader(tmp_path / "session.nsfs") as reader:
+        records = list(reader)
+    assert b"echo Recorded\n" in b"".join(rec.data for rec in records if rec.direction == session.Direction.OUT)
+    assert b"Recorded\r\n" in b"".join(rec.data for rec in records if rec.direction == session.Direction.IN)
+
+
+def test_attach(local_async_shell):
+    """Check that shell can be attached to command spawned with pexpect and that the handle is closed with it."""
+
+    async def run():
+        async with await local_async_shell(attach=True) as shell:
+            await shell.run("echo Attached")
+            assert shell.output == "Attached"
+            handle = shell._process
+        assert handle.closed
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("clients", [1, 8, 32])
+def test_benchmark(local_async_shell, clients, record_property):
+    """Measure how wall time scales with number of concurrently driven shells."""
+
+    async def run():
+        start = time.perf_counter()
+        shells = await asyncio.gather(*(local_async_shell() for _ in range(clients)))
+        spawned = time.perf_counter()
+        try:
+            await asyncio.gather(*(shell.run("sleep 0.2 && echo done") for shell in shells))
+            assert all(shell.output == "done" for shell in shells)
+        finally:
+            finished = time.perf_counter()
+            await asyncio.gather(*(shell.close() for shell in shells))
+        return spawned - start, finished - spawned
+
+    spawn_time, run_time = asyncio.run(run())
+    logger.info("%d shells: spawn took %.2f s, command of 0.2 s took %.2f s", clients, spawn_time, run_time)
+    record_property("spawn_s", spawn_time)
+    record_property("run_s", run_time)
@@ -0,0 +1,242 @@
+"""FDLogging tests with socket pair used in place of serial console.
+"""
+import contextlib
+import logging
+import socket
+import threading
+import time
+
+import pytest
+from lorem_text import lorem
+
+from nsfarm.cli import FDLogging, LogQueue
+from nsfarm.toolbox.tests import deterministic_random
+
+logger = logging.getLogger(__name__)
+
+SIZE = 2**20
+DATA = bytes(ord("a") + i % 26 for i in range(SIZE))  # Intentionally with no new line to limit logging
+
+
+@pytest.fixture(name="device")
+def fixture_device():
+    """Socket pair where the first one is passed to FDLogging and the second one plays the device role."""
+    ours, device = socket.socketpair()
+    yield ours, device
+    ours.close()
+    device.close()
+
+
+def recv_exactly(sock: socket.socket, size: int, timeout: float = 10) -> bytes:
+    """Receive exactly given number of bytes from socket."""
+    sock.settimeout(timeout)
+    data = bytearray()
+    while len(data) < size:
+        data += sock.recv(size - len(data))
+    return bytes(data)
+
+
+def wait_for(predicate, timeout: float = 10):
+    """Wait for predicate to be true."""
+    end = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < end
+        time.sleep(0.01)
+
+
+def test_relay(device, caplog):
+    """Check that data are relayed and logged in both directions."""
+    ours, dev = device
+    caplog.set_level(logging.DEBUG)
+    fdlog = FDLogging(ours.fileno(), logging.getLogger("fdlogging"))
+    try:
+        dev.sendall(b"From device\n")
+        assert recv_exactly(fdlog.socket, 12) == b"From device\n"
+        fdlog.socket.sendall(b"To device\n")
+        assert recv_exactly(dev, 10) == b"To device\n"
+        wait_for(lambda: len(caplog.records) == 2)
+        assert [record.getMessage() for record in caplog.records] == ["> From device", "< To device"]
+        assert fdlog.counters == (12, 0, 10, 0)
+    finally:
+        fdlog.close()
+
+
+def test_propagation(device):
+    """Check that data are dropped when propagation is disabled."""
+    ours, dev = device
+    fdlog = FDLogging(ours.fileno(), logging.getLogger("fdlogging"))
+    try:
+        fdlog.set_propagation(False)
+        dev.sendall(b"Dropped\n")
+        wait_for(lambda: fdlog.counters.in_dropped == 8)
+        fdlog.set_propagation(True)
+        dev.sendall(b"Passed\n")
+        assert recv_exactly(fdlog.socket, 7) == b"Passed\n"
+    finally:
+        fdlog.close()
+
+
+def test_overflow_drop(device):
+    """Check that the oldest data are dropped when reader falls behind."""
+    ours, dev = device
+    fdlog = FDLogging(ours.fileno(), logging.getLogger("fdlogging"), buffer_size=4096, overflow="drop")
+    try:
+        dev.sendall(DATA)
+        wait_for(lambda: fdlog.counters.in_forwarded + fdlog.counters.in_dropped >= SIZE - 4096)
+        received = bytearray()
+        fdlog.socket.settimeout(0.5)
+        with contextlib.suppress(socket.timeout):
+            while True:
+                received += fdlog.socket.recv(SIZE)
+        counters = fdlog.counters
+        assert counters.in_dropped > 0
+        assert len(received) == counters.in_forwarded == SIZE - counters.in_dropped
+        assert received.endswith(DATA[-4096:])  # The newest data are preserved
+    finally:
+        fdlog.close()
+
+
+def test_overflow_block(device):
+    """Check that no data are lost when reader falls behind with block policy."""
+    ours, dev = device
+    fdlog = FDLogging(ours.fileno(), logging.getLogger("fdlogging"), buffer_size=4096, overflow="block")
+    try:
+        sender = threading.Thread(target=dev.sendall, args=(DATA,))
+        sender.start()
+        time.sleep(0.1)  # Let it fill all buffers
+        assert recv_exactly(fdlog.socket, SIZE) == DATA
+        sender.join()
+        assert fdlog.counters == (SIZE, 0, 0, 0)
+    finally:
+        fdlog.close()
+
+
+def test_overflow_output(device):
+    """Check that data written to file descriptor are never dropped even with drop policy."""
+    ours, dev = device
+    fdlog = FDLogging(ours.fileno(), logging.getLogger("fdlogging"), buffer_size=4096, overflow="drop")
+    try:
+        sender = threading.Thread(target=fdlog.socket.sendall, args=(DATA,))
+        sender.start()
+        time.sleep(0.1)  # Let it fill all buffers
+        assert recv_exactly(dev, SIZE) == DATA
+        sender.join()
+        assert fdlog.counters == (0, 0, SIZE, 0)
+    finally:
+        fdlog.close()
+
+
+def test_overflow_block_hangup(device):
+    """Check that relay does not spin when source hangs up while buffer is full with block policy."""
+    ours, dev = device
+    fdlog = FDLogging(ours.fileno(), logging.getLogger("fdlogging"), buffer_size=4096, overflow="block")
+    try:
+        dev.setblocking(False)
+        sent = bytearray()
+        with contextlib.suppress(BlockingIOError):
+            while True:  # Fill all buffers including the one in relay
+                sent += DATA[: dev.send(DATA)]
+                time.sleep(0.01)
+        dev.close()
+        start = time.process_time()
+        time.sleep(0.5)
+        assert time.process_time() - start < 0.25
+        assert recv_exactly(fdlog.socket, len(sent)) == sent
+    finally:
+        fdlog.close()
+
+
+def test_eof(device):
+    """Check that relay stops reading closed file descriptor and that it can be closed afterwards."""
+    ours, dev = device
+    fdlog = FDLogging(ours.fileno(), logging.getLogger("fdlogging"))
+    dev.sendall(b"Last words")
+    dev.close()
+    assert recv_exactly(fdlog.socket, 10) == b"Last words"
+    fdlog.close()
+
+
+def test_shared_thread(device):
+    """Check that multiple instances share thread and that it is restarted when needed."""
+    ours, dev = device
+    for _ in range(3):
+        fdlogs = [FDLogging(ours.fileno(), logging.getLogger("fdlogging"))]
+        other_ours, other_dev = socket.socketpair()
+        fdlogs.append(FDLogging(other_ours.fileno(), logging.getLogger("fdlogging")))
+        try:
+            dev.sendall(b"First")
+            other_dev.sendall(b"Second")
+            assert recv_exactly(fdlogs[0].socket, 5) == b"First"
+            assert recv_exactly(fdlogs[1].socket, 6) == b"Second"
+        finally:
+            for fdlog in fdlogs:
+                fdlog.close()
+            other_ours.close()
+            other_dev.close()
+        wait_for(lambda: FDLogging._thread is None)
+
+
+@pytest.fixture(name="log_queue")
+def fixture_log_queue():
+    """Running LogQueue that is stopped at the end of the test (unless it was running already)."""
+    running = LogQueue.running()
+    LogQueue.start()
+    yield
+    if not running:
+        LogQueue.stop()
+
+
+def test_log_queue(device, caplog, log_queue):
+    """Check that lines are logged trough LogQueue."""
+    ours, dev = device
+    caplog.set_level(logging.DEBUG)
+    fdlog = FDLogging(ours.fileno(), logging.getLogger("fdlogging"))
+    try:
+        dev.sendall(b"From device\n")
+        assert recv_exactly(fdlog.socket, 12) == b"From device\n"
+        wait_for(lambda: fdlog.counters.in_forwarded == 12)
+        LogQueue.flush()
+        assert [record.getMessage() for record in caplog.records] == ["> From device"]
+    finally:
+        fdlog.close()
+
+
+@pytest.mark.parametrize("queued", [False, True])
+def test_log_disabled(caplog, request, queued):
+    """Check that line is not even formatted when level is not enabled."""
+
+    class Line(bytes):
+        def expandtabs(self, tabsize=8):
+            raise AssertionError("Line should not be formatted")
+
+    if queued:
+        request.getfixturevalue("log_queue")
+    caplog.set_level(logging.INFO, "fdlogging")
+    LogQueue.log(logging.getLogger("fdlogging"), logging.DEBUG, Line(b"Ignored"))
+    LogQueue.flush()
+    assert not caplog.records
+
+
+@pytest.mark.parametrize("queued", [False, True])
+def test_benchmark(device, caplog, request, record_property, queued):
+    """Measure throughput of serial relay with lines logged directly and with LogQueue."""
+    ours, dev = device
+    caplog.set_level(logging.DEBUG)
+    if queued:
+        request.getfixturevalue("log_queue")
+    with deterministic_random() as _:
+        data = b"\r\n".join(lorem.sentence().encode() for i in range(20000)) + b"\r\n"
+    fdlog = FDLogging(ours.fileno(), logging.getLogger("fdlogging"), overflow="block")
+    try:
+        start = time.perf_counter()
+        sender = threading.Thread(target=dev.sendall, args=(data,))
+        sender.start()
+        assert recv_exactly(fdlog.socket, len(data), timeout=60) == data
+        duration = time.perf_counter() - start
+        sender.join()
+        LogQueue.flush()
+        assert len([record for record in caplog.records if record.name == "fdlogging"]) == 20000
+    finally:
+        fdlog.close()
+    logger.info("Relayed %d bytes with %.2f MB/s (queued: %s)", len(data), len(data) / duration / 10**6, queued)
+    record_property("relay_mbps", len(data) / duration / 10**6)
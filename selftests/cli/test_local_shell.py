@@ -0,0 +1,256 @@
+"""Shell class tests and benchmarks against local Bash.
+
+These do not require any container and thus are handy to verify CLI machinery and to measure its overhead.
+"""
+import json
+import logging
+import random
+import time
+
+import pytest
+from lorem_text import lorem
+
+from nsfarm.cli import Cli, CommandTrace
+from nsfarm.toolbox.tests import deterministic_random
+
+logger = logging.getLogger(__name__)
+
+LONG_COMMAND = " && ".join(["true"] * 400) + " && echo Content"
+
+
+@pytest.mark.parametrize("echo", [True, False], ids=["echo", "noecho"])
+class TestEcho:
+    """Test that both echo modes provide same results."""
+
+    def test_true(self, local_shell, echo):
+        """Simple command that has no effect just to test full process match."""
+        local_shell(echo=echo).run("true")
+
+    def test_false(self, local_shell, echo):
+        """Simple command that has no effect but fails with known exit code."""
+        assert local_shell(echo=echo).run("false", check=False) == 1
+
+    def test_output(self, local_shell, echo):
+        """Check that output is the same in both modes."""
+        shell = local_shell(echo=echo)
+        shell.run("echo First && echo Second")
+        assert shell.output == "First\r\nSecond"
+
+    def test_long_command(self, local_shell, echo):
+        """Long command that would be broken to multiple lines on most of the terminals."""
+        shell = local_shell(echo=echo)
+        shell.run(LONG_COMMAND)
+        assert shell.output == "Content"
+
+    def test_txt(self, local_shell, echo, tmp_path):
+        """Check that writing files works in both modes."""
+        shell = local_shell(echo=echo)
+        shell.txt_write(tmp_path / "file", "Some content")
+        assert shell.txt_read(tmp_path / "file") == "Some content"
+
+
+def test_echo_benchmark(local_shell, record_property):
+    """Compare time it takes to run long commands with and without echo."""
+    rounds = 20
+    results = {}
+    for echo in (True, False):
+        shell = local_shell(echo=echo)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            shell.run(LONG_COMMAND)
+            assert shell.output == "Content"
+        results[echo] = (time.perf_counter() - start) / rounds
+    logger.info(
+        "Command of %d characters took %.2f ms with echo and %.2f ms without echo",
+        len(LONG_COMMAND),
+        results[True] * 1000,
+        results[False] * 1000,
+    )
+    record_property("echo_command_ms", results[True] * 1000)
+    record_property("noecho_command_ms", results[False] * 1000)
+
+
+@pytest.mark.parametrize("echo", [True, False], ids=["echo", "noecho"])
+class TestRunMany:
+    """Test batched execution of commands."""
+
+    def test_results(self, local_shell, echo):
+        """Check that every command gets its own exit code and output."""
+        shell = local_shell(echo=echo)
+        results = shell.run_many(
+            ["echo First", "false", "printf 'No new line'", "true", "echo A && echo B"], check=False
+        )
+        assert results == [(0, "First"), (1, ""), (0, "No new line"), (0, ""), (0, "A\r\nB")]
+
+    def test_check(self, local_shell, echo):
+        """Check that failure of any command is detected."""
+        shell = local_shell(echo=echo)
+        shell.run_many(["true", "true"])
+        with pytest.raises(AssertionError):
+            shell.run_many(["true", "false", "true"])
+
+    def test_stop_on_failure(self, local_shell, echo):
+        """Commands after the failed one are not executed and reported as such."""
+        shell = local_shell(echo=echo)
+        results = shell.run_many(["echo First", "echo Second"], stop_on_failure=True)
+        assert results == [(0, "First"), (0, "Second")]
+        results = shell.run_many(
+            ["echo First", "false", "touch /tmp/nsfarm-not-run", "echo Fourth"], check=False, stop_on_failure=True
+        )
+        assert results == [(0, "First"), (1, ""), (None, ""), (None, "")]
+        assert shell.run("test -e /tmp/nsfarm-not-run", check=False) == 1
+        with pytest.raises(AssertionError):
+            shell.run_many(["true", "false", "true"], stop_on_failure=True)
+
+    def test_syntax_error(self, local_shell, echo):
+        """Invalid command breaks the whole batch and that has to be reported."""
+        shell = local_shell(echo=echo)
+        with pytest.raises(Exception):
+            shell.run_many(["true", "fi"])
+        shell.run("true")
+
+
+def test_run_many_benchmark(local_shell, record_property):
+    """Compare time it takes to run commands separately and in batch."""
+    cmds = [f"echo {i}" for i in range(10)]
+    shell = local_shell()
+    start = time.perf_counter()
+    separate = []
+    for cmd in cmds:
+        shell.run(cmd)
+        separate.append(shell.output)
+    separate_time = time.perf_counter() - start
+    start = time.perf_counter()
+    batch = [result.output for result in shell.run_many(cmds)]
+    batch_time = time.perf_counter() - start
+    assert separate == batch
+    logger.info(
+        "%d commands took %.2f ms separately and %.2f ms in batch", len(cmds), separate_time * 1000, batch_time * 1000
+    )
+    record_property("separate_commands_ms", separate_time * 1000)
+    record_property("batch_commands_ms", batch_time * 1000)
+
+
+@pytest.mark.parametrize("compress", [False, True], ids=["plain", "gzip"])
+class TestBin:
+    """Test binary files transfer."""
+
+    @pytest.mark.parametrize("size", [0, 5, 4097, 200000])
+    def test_bin(self, local_shell, tmp_path, compress, size):
+        """Write and read back random data of various sizes."""
+        shell = local_shell()
+        data = random.randbytes(size)
+        shell.bin_write(tmp_path / "file", data, compress=compress)
+        assert (tmp_path / "file").read_bytes() == data
+        assert shell.bin_read(tmp_path / "file", compress=compress) == data
+
+    def test_bin_nonexistent(self, local_shell, tmp_path, compress):
+        """Read of nonexistent file."""
+        shell = local_shell()
+        assert shell.bin_read(tmp_path / "file", expect_exist=False, compress=compress) is None
+        with pytest.raises(Exception):
+            shell.bin_read(tmp_path / "file", compress=compress)
+
+    def test_bin_benchmark(self, local_shell, tmp_path, compress, record_property):
+        """Measure throughput of binary files transfer."""
+        shell = local_shell()
+        with deterministic_random() as _:
+            data = "\n".join(lorem.paragraphs(3000)).encode()
+        start = time.perf_counter()
+        shell.bin_write(tmp_path / "file", data, compress=compress)
+        write_time = time.perf_counter() - start
+        start = time.perf_counter()
+        assert shell.bin_read(tmp_path / "file", compress=compress) == data
+        read_time = time.perf_counter() - start
+        logger.info(
+            "Transfer of %d bytes: write %.2f MB/s, read %.2f MB/s",
+            len(data),
+            len(data) / write_time / 10**6,
+            len(data) / read_time / 10**6,
+        )
+        record_property("bin_write_mbps", len(data) / write_time / 10**6)
+        record_property("bin_read_mbps", len(data) / read_time / 10**6)
+
+
+@pytest.fixture(name="trace")
+def fixture_trace(monkeypatch):
+    """Enable commands tracing for the test."""
+    trace = CommandTrace(size=3)
+    monkeypatch.setattr(Cli, "trace", trace)
+    return trace
+
+
+@pytest.mark.parametrize("echo", [True, False], ids=["echo", "noecho"])
+def test_trace(local_shell, trace, echo):
+    """Check that commands are correctly recorded in trace."""
+    shell = local_shell(echo=echo)
+    trace.clear()
+    start = time.time()
+    shell.run("echo Some output", check=False)
+    shell.run("false", check=False)
+    assert len(trace.records) == 2
+    record = trace.records[0]
+    assert record.cmd == "echo Some output"
+    assert start <= record.sent <= record.echoed <= record.prompted <= time.time()
+    assert record.bytes_out == len("echo Some output\n")
+    assert record.bytes_in >= len("Some output")
+    assert record.exit_code == 0
+    assert trace.records[1].exit_code == 1
+    assert json.loads(trace.json())[1]["cmd"] == "false"
+
+
+def test_trace_ring(local_shell, trace):
+    """Check that only limited number of records is kept."""
+    shell = local_shell()
+    for i in range(5):
+        shell.run(f"echo {i}")
+    assert [record.cmd for record in trace.records] == ["echo 2", "echo 3", "echo 4"]
+    assert [record.cmd for record in trace.since(trace.records[1].sent)] == ["echo 3", "echo 4"]
+
+
+@pytest.mark.parametrize("search_window", [None, 4096], ids=["nowindow", "window"])
+def test_search_window(local_shell, search_window):
+    """Check that the full output is collected with and without search window."""
+    shell = local_shell(search_window=search_window)
+    shell.run("seq 100000")
+    assert shell.output.split("\r\n") == [str(i) for i in range(1, 100001)]
+
+
+def test_search_window_benchmark(local_shell, record_property):
+    """Compare time it takes to collect multi-megabyte output with and without search window."""
+    size = 10**6
+    results = {}
+    for search_window in (None, 4096):
+        shell = local_shell(search_window=search_window)
+        start = time.perf_counter()
+        shell.run(f"head -c {size} /dev/zero | tr '\\0' 'a' | fold -w 99", timeout=300)
+        results[search_window] = time.perf_counter() - start
+        assert len(shell.output) == size + (size // 99) * 2
+    logger.info(
+        "Output of %d bytes took %.2f s without search window and %.2f s with it",
+        size,
+        results[None],
+        results[4096],
+    )
+    record_property("nowindow_s", results[None])
+    record_property("window_s", results[4096])
+
+
+@pytest.mark.parametrize(
+    "cmd",
+    ["true", "echo First && echo Second", "printf 'No new line'", "printf 'Empty lines\\n\\n\\n'", "seq 100000"],
+)
+def test_spooled(local_shell, cmd):
+    """Check that spooled output is the same as the regular one."""
+    shell = local_shell()
+    shell.run(cmd)
+    output = shell.output.replace("\r\n", "\n")
+    shell.run_spooled(cmd, max_size=1000)
+    assert shell.spooled_output.read() == output
+
+
+def test_spooled_json(local_shell):
+    """Check that JSON can be parsed from spooled output as a stream."""
+    shell = local_shell()
+    shell.run_spooled("echo '{\"values\": ['; seq 99999 | sed 's/$/,/'; echo '100000]}'", max_size=1000)
+    assert json.load(shell.spooled_output) == {"values": list(range(1, 100001))}
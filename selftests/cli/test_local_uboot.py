@@ -0,0 +1,43 @@
+"""Uboot class tests against local Bash with U-Boot like prompt.
+"""
+
+import pytest
+
+from nsfarm.cli import Cli, CommandTrace
+
+
+def test_exit_code(local_uboot):
+    """Check that exit code is correctly received."""
+    assert local_uboot.run("true") == 0
+    assert local_uboot.run("false", check=False) == 1
+    assert local_uboot.run("(exit 42)", check=False) == 42
+
+
+def test_output(local_uboot):
+    """Check that output does not contain exit code framing."""
+    local_uboot.run("echo First && echo Second")
+    assert local_uboot.output == "First\r\nSecond"
+    local_uboot.run("true")
+    assert local_uboot.output == ""
+
+
+def test_empty_command(local_uboot):
+    """Empty command can't be framed so exit code is received with separate command."""
+    local_uboot.run("false", check=False)
+    assert local_uboot.run("", check=False) == 0
+
+
+def test_missing_frame(local_uboot):
+    """Missing exit code frame is reported as an error instead of guessing exit code."""
+    with pytest.raises(Exception, match="Exit code frame is missing"):
+        local_uboot.run("false #", check=False)
+    assert local_uboot.run("true") == 0
+
+
+def test_single_exchange(local_uboot, monkeypatch):
+    """Check that there is only one command sent for every run."""
+    trace = CommandTrace()
+    monkeypatch.setattr(Cli, "trace", trace)
+    for _ in range(5):
+        local_uboot.run("true")
+    assert len(trace.records) == 5
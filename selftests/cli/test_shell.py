@@ -90,3 +90,11 @@ class TestAlpine(Common):
     def container(self, lxd_client):
         with Container(lxd_client, "base-alpine") as container:
             yield container
+
+
+class TestAlpineNoEcho(TestAlpine):
+    """These are tests in Alpine Linux (ash) shell with disabled echo."""
+
+    @pytest.fixture(autouse=True)
+    def shell(self, container):
+        yield Shell(container.pexpect(), echo=False)
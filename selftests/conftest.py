@@ -1,7 +1,62 @@
+import os
+
+import pexpect
 import pylxd
 import pytest
 
+from nsfarm.cli import AsyncShell, Shell, Uboot
+
+LOCAL_BASH = ["bash", "--norc", "--noprofile", "--noediting"]
+LOCAL_BASH_ENV = {"PS1": "local # ", "PATH": os.environ["PATH"], "LC_ALL": "C"}
+
 
 @pytest.fixture(name="lxd_client", scope="package")
 def fixture_lxd_client():
     return pylxd.Client()
+
+
+@pytest.fixture(name="local_shell")
+def fixture_local_shell():
+    """Provides function that spawns local Bash wrapped in Shell. This allows testing of CLI machinery without
+    containers.
+
+    The Bash is started without line editing as that is closest to what we get on serial console. Note that initial
+    flush is not performed as local Bash prints its initial prompt sooner than we would flush it.
+    """
+    spawned = []
+
+    def spawn(**kwargs) -> Shell:
+        pexp = pexpect.spawn(LOCAL_BASH[0], LOCAL_BASH[1:], env=LOCAL_BASH_ENV)
+        spawned.append(pexp)
+        return Shell(pexp, flush=False, **kwargs)
+
+    yield spawn
+    for pexp in spawned:
+        pexp.close(force=True)
+
+
+@pytest.fixture(name="local_async_shell")
+def fixture_local_async_shell():
+    """Provides coroutine function that spawns local Bash wrapped in AsyncShell.
+
+    Bash is spawned with pexpect and attached to AsyncShell if attach argument is True. The caller is responsible for
+    closing the returned shell.
+    """
+
+    async def spawn(attach: bool = False, **kwargs) -> AsyncShell:
+        if attach:
+            return await AsyncShell.attach(pexpect.spawn(LOCAL_BASH[0], LOCAL_BASH[1:], env=LOCAL_BASH_ENV), **kwargs)
+        return await AsyncShell.spawn(LOCAL_BASH, env=LOCAL_BASH_ENV, **kwargs)
+
+    return spawn
+
+
+@pytest.fixture(name="local_uboot")
+def fixture_local_uboot():
+    """Provides local Bash with U-Boot like prompt wrapped in Uboot.
+
+    Bash is close enough to U-Boot's hush shell to verify commands framing and exit code handling.
+    """
+    pexp = pexpect.spawn(LOCAL_BASH[0], LOCAL_BASH[1:], env={**LOCAL_BASH_ENV, "PS1": "=> "})
+    yield Uboot(pexp, flush=False)
+    pexp.close(force=True)
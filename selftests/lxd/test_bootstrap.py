@@ -0,0 +1,73 @@
+"""Tests of concurrent bootstrap scheduling. These do not require LXD.
+"""
+import threading
+import time
+
+import pytest
+
+from nsfarm.lxd.utils import all_images, image_parents, run_dag
+
+TREE = {
+    "base": None,
+    "common": "base",
+    "isp-a": "common",
+    "isp-b": "common",
+    "client": "base",
+    "client-x": "client",
+    "other": None,
+}
+
+
+def test_image_parents():
+    """Check that all parents of defined images are defined as well."""
+    parents = image_parents(all_images())
+    assert parents["base-alpine"] is None
+    assert parents["isp-dhcp"] == "isp-common"
+    assert all(parent is None or parent in parents for parent in parents.values())
+
+
+def test_image_parents_ancestors():
+    """Ancestors are included even if not listed."""
+    assert image_parents(["isp-dhcp"]) == {"isp-dhcp": "isp-common", "isp-common": "base-alpine", "base-alpine": None}
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_run_dag(jobs):
+    """Every node is processed once, after its parent and no more than jobs at the same time."""
+    lock = threading.Lock()
+    done = []
+    active = set()
+    max_active = 0
+
+    def func(node):
+        nonlocal max_active
+        with lock:
+            assert TREE[node] is None or TREE[node] in done
+            assert node not in done and node not in active
+            active.add(node)
+            max_active = max(max_active, len(active))
+        time.sleep(0.05)
+        with lock:
+            active.remove(node)
+            done.append(node)
+
+    result = run_dag(TREE, func, jobs)
+    assert sorted(done) == sorted(TREE)
+    assert all(duration >= 0.05 for duration in result.values())
+    assert max_active <= jobs
+    assert (max_active > 1) == (jobs > 1)
+
+
+def test_run_dag_failure():
+    """Children of failed node are skipped but independent nodes are processed."""
+    done = []
+
+    def func(node):
+        if node == "common":
+            raise Exception("Failure")
+        done.append(node)
+
+    result = run_dag(TREE, func, 2)
+    assert sorted(done) == ["base", "client", "client-x", "other"]
+    assert result["common"] is None and result["isp-a"] is None and result["isp-b"] is None
+    assert result["client-x"] is not None
@@ -1,11 +1,17 @@
+import logging
+import random
 import time
 
 import pytest
 
+from nsfarm.cli import Shell
 from nsfarm.lxd import Container, Image
+from nsfarm.setup.utils import DeployFile
 
 from .test_image import BASE_IMG
 
+logger = logging.getLogger(__name__)
+
 
 def test_new_container(lxd_client):
     """Try to create container for BASE_IMG."""
@@ -59,4 +65,123 @@ def test_context(lxd_client):
     assert not lxd_client.containers.exists(container.name)
 
 
+@pytest.fixture(name="container", scope="module")
+def fixture_container(lxd_client):
+    with Container(lxd_client, BASE_IMG) as container:
+        yield container
+
+
+def test_write_read_file(container):
+    """Check that file written trough LXD files API can be read back in both ways."""
+    data = random.randbytes(100000)
+    container.write_file("/tmp/test-file", data)
+    assert container.read_file("/tmp/test-file") == data
+    assert Shell(container.pexpect()).bin_read("/tmp/test-file") == data
+
+
+def test_read_file_nonexistent(container):
+    """Check reading of nonexistent file."""
+    assert container.read_file("/tmp/no-such-file", expect_exist=False) is None
+
+
+def test_push_tree(container, tmp_path):
+    """Check that directory tree is correctly copied to container."""
+    (tmp_path / "dir").mkdir()
+    (tmp_path / "file").write_text("First")
+    (tmp_path / "dir" / "file").write_text("Second")
+    container.push_tree(tmp_path, "/tmp/tree")
+    assert container.read_file("/tmp/tree/file") == b"First"
+    assert container.read_file("/tmp/tree/dir/file") == b"Second"
+
+
+@pytest.mark.parametrize("fast", [True, False], ids=["lxd", "shell"])
+def test_deployfile_benchmark(container, fast, record_property):
+    """Measure time it takes to deploy multi-megabyte file with and without LXD files API."""
+    data = random.randbytes(4 * 2**20)
+    shell = Shell(container.pexpect())
+    start = time.perf_counter()
+    with DeployFile(shell, "/tmp/deployed-file", data, fast=fast) as _:
+        duration = time.perf_counter() - start
+        assert container.read_file("/tmp/deployed-file") == data
+    logger.info("Deploy of %d bytes took %.2f s", len(data), duration)
+    record_property("deployfile_s", duration)
+
+
+def test_deployfile_attributes(container):
+    """Check that DeployFile preserves permissions and ownership of replaced file."""
+    shell = Shell(container.pexpect())
+    container.write_file("/tmp/attr-file", "original", mode=0o600, uid=1, gid=2)
+    with DeployFile(shell, "/tmp/attr-file", "replaced") as _:
+        assert container.file_attributes("/tmp/attr-file") == (0o600, 1, 2, "file")
+    assert container.read_file("/tmp/attr-file") == b"original"
+    assert container.file_attributes("/tmp/attr-file") == (0o600, 1, 2, "file")
+
+
+def test_deployfile_symlink(container):
+    """Check that symbolic link is followed and restored by DeployFile."""
+    shell = Shell(container.pexpect())
+    shell.run("echo target > /tmp/link-target && ln -sf /tmp/link-target /tmp/link")
+    assert container.file_attributes("/tmp/link").type == "symlink"
+    with DeployFile(shell, "/tmp/link", "replaced") as _:
+        assert container.read_file("/tmp/link-target") == b"replaced\n"
+    assert container.file_attributes("/tmp/link").type == "symlink"
+    assert container.read_file("/tmp/link-target") == b"target\n"
+
+
+def test_deployfile_ssh_not_bypassed(container):
+    """Check that only shell running directly in container is tagged for DeployFile bypass."""
+    assert getattr(container.pexpect(), "nsfarm_container", None) is container
+    assert getattr(container.pexpect(["/bin/sh", "-c", "cat"]), "nsfarm_container", None) is None
+
+
 # TODO add tests for enabled and disabled internet and for devices
+
+
+def test_snapshot_restore(lxd_client, record_property):
+    """Check that restore returns container to the state of snapshot and compare it with creation of new container."""
+    with Container(lxd_client, BASE_IMG) as container:
+        container.shell.run("wait4boot")
+        container.snapshot()
+        container.shell.run("echo dirty > /root/state")
+        port = container.network.proxy_open(port=22)
+        assert f"proxy-tcp-{port}" in container.lxd_container.devices
+
+        start = time.perf_counter()
+        container.restore()
+        container.shell.run("wait4boot")
+        restore = time.perf_counter() - start
+        assert container.shell.run("test -f /root/state", check=False) == 1
+        assert f"proxy-tcp-{port}" not in container.lxd_container.devices
+
+    start = time.perf_counter()
+    with Container(lxd_client, BASE_IMG) as container:
+        container.shell.run("wait4boot")
+    create = time.perf_counter() - start
+    logger.info("Restore: %.2f s, new container: %.2f s", restore, create)
+    record_property("restore_speedup", create / restore)
+
+
+@pytest.fixture(name="exec_api")
+def fixture_exec_api(request):
+    """Set exec_api of Container for the test."""
+    Container.exec_api = request.param
+    yield request.param
+    Container.exec_api = False
+
+
+@pytest.mark.parametrize("exec_api", [False, True], indirect=True)
+def test_spawn_latency(container, exec_api, record_property):
+    """Measure time it takes to spawn shell and run first command in it."""
+    shell = Shell(container.pexpect())
+    shell.run("echo Hello")
+    assert shell.output == "Hello"
+    shell.close()
+
+    start = time.perf_counter()
+    for _ in range(10):
+        shell = Shell(container.pexpect())
+        shell.run("true")
+        shell.close()
+    latency = (time.perf_counter() - start) / 10
+    logger.info("Spawn latency (exec_api=%s): %.2f ms", exec_api, latency * 1000)
+    record_property("spawn_latency_ms", latency * 1000)
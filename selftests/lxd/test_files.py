@@ -0,0 +1,73 @@
+"""Tests of files transfer to containers.
+"""
+import io
+import logging
+import tarfile
+import time
+
+import pytest
+
+from nsfarm.lxd import Container, Image, files
+
+from .test_image import BASE_IMG
+
+logger = logging.getLogger(__name__)
+
+IMAGE_TREES = ["base-alpine", "boot", "selenium"]
+
+
+def test_tar_tree(tmp_path):
+    """Check content, ownership and permissions of archive."""
+    (tmp_path / "dir" / "bin").mkdir(parents=True)
+    (tmp_path / "dir" / "bin").chmod(0o775)
+    (tmp_path / "dir" / "bin" / "script").write_text("#!/bin/sh\n")
+    (tmp_path / "dir" / "bin" / "script").chmod(0o775)
+    (tmp_path / "dir" / "bin" / "link").symlink_to("script")
+    (tmp_path / "dir" / "config").write_text("config\n")
+    (tmp_path / "dir" / "config").chmod(0o664)
+    (tmp_path / "dir" / "empty").mkdir()
+    (tmp_path / "dir" / "empty").chmod(0o700)
+    (tmp_path / "init.sh").write_text("#!/bin/sh\n")
+    archive = files.tar_tree(tmp_path / "dir", extra={"/nsfarm-init.sh": (tmp_path / "init.sh", 0o700)})
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        members = {info.name: info for info in tar.getmembers()}
+        # Directory with content is not included so extraction does not change permissions of existing directory
+        assert set(members) == {"bin/link", "bin/script", "config", "empty", "nsfarm-init.sh"}
+        assert all(info.uid == 0 and info.gid == 0 for info in members.values())
+        assert members["bin/script"].mode == 0o755
+        assert members["bin/link"].issym() and members["bin/link"].linkname == "script"
+        assert members["config"].mode == 0o644
+        assert members["empty"].isdir() and members["empty"].mode == 0o755
+        assert members["nsfarm-init.sh"].mode == 0o700
+        assert tar.extractfile("nsfarm-init.sh").read() == b"#!/bin/sh\n"
+
+
+@pytest.mark.parametrize("img", IMAGE_TREES)
+def test_image_tree_archive(img, record_property):
+    """Measure time to create archive of image tree."""
+    start = time.perf_counter()
+    archive = files.tar_tree(Image.IMGS_DIR / img, extra={Image.IMAGE_INIT_PATH: (Image.IMGS_DIR / f"{img}.sh", 0o700)})
+    duration = time.perf_counter() - start
+    logger.info("Archive of %s: %d bytes in %.2f ms", img, len(archive), duration * 1000)
+    record_property("archive_ms", duration * 1000)
+
+
+@pytest.fixture(name="container", scope="module")
+def fixture_container(lxd_client):
+    with Container(lxd_client, BASE_IMG) as container:
+        yield container
+
+
+@pytest.mark.parametrize("img", IMAGE_TREES)
+def test_image_tree_deploy(container, img, record_property):
+    """Compare deployment of image tree file by file and in single archive."""
+    source = Image.IMGS_DIR / img
+    start = time.perf_counter()
+    container.lxd_container.files.recursive_put(source, f"/tmp/recursive-{img}")
+    recursive = time.perf_counter() - start
+    start = time.perf_counter()
+    files.push_tar(container.lxd_container, files.tar_tree(source), f"/tmp/tar-{img}")
+    tar = time.perf_counter() - start
+    container.shell.run(f"diff -r /tmp/recursive-{img} /tmp/tar-{img}")
+    logger.info("Deploy of %s: file by file %.2f ms, archive %.2f ms", img, recursive * 1000, tar * 1000)
+    record_property("deploy_speedup", recursive / tar)
@@ -0,0 +1,47 @@
+"""Tests of concurrent management of multiple containers.
+"""
+import logging
+import time
+
+import pytest
+
+from nsfarm.lxd import Container, ContainerGroup, Image
+
+from .test_image import BASE_IMG
+
+logger = logging.getLogger(__name__)
+
+
+def test_group(lxd_client):
+    """Check that all containers in group are prepared and removed."""
+    image = Image(lxd_client, BASE_IMG)
+    with ContainerGroup(Container(lxd_client, image) for _ in range(3)) as group:
+        assert len(group) == 3
+        names = [container.name for container in group]
+        assert len(set(names)) == 3
+        assert all(lxd_client.containers.exists(name) for name in names)
+    assert all(container.name is None for container in group)
+
+
+@pytest.mark.parametrize("count", [1, 8, 32])
+def test_benchmark(lxd_client, count, record_property):
+    """Compare preparation and cleanup of containers one by one with group."""
+    image = Image(lxd_client, BASE_IMG)
+    image.prepare()
+
+    start = time.perf_counter()
+    containers = [Container(lxd_client, image) for _ in range(count)]
+    for container in containers:
+        container.prepare()
+    for container in containers:
+        container.cleanup()
+    serial = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ContainerGroup(Container(lxd_client, image) for _ in range(count)):
+        pass
+    concurrent = time.perf_counter() - start
+
+    logger.info("%d containers: one by one %.2f s, group %.2f s", count, serial, concurrent)
+    record_property("serial_s", serial)
+    record_property("group_s", concurrent)
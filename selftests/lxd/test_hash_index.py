@@ -0,0 +1,116 @@
+"""Tests of persistent image hash index. These do not require LXD.
+"""
+import concurrent.futures
+import logging
+import os
+import time
+
+import pytest
+
+from nsfarm.lxd.hash_index import HashIndex, content_hash, metadata_signature
+
+logger = logging.getLogger(__name__)
+
+SEED = "parent"
+
+
+@pytest.fixture(name="sources")
+def fixture_sources(tmp_path):
+    """Image definition with directory of few files."""
+    (tmp_path / "image.sh").write_text("#!/bin/sh\necho image\n")
+    dir_path = tmp_path / "image"
+    (dir_path / "etc").mkdir(parents=True)
+    (dir_path / "etc" / "config").write_text("option foo 'bar'\n")
+    (dir_path / "etc" / "link").symlink_to("config")
+    return tmp_path / "image.sh", dir_path
+
+
+def test_content_hash_stable(sources):
+    """Content hash depends only on content of files."""
+    file_path, dir_path = sources
+    first = content_hash(SEED, file_path, dir_path, file_path.parent)
+    assert first == content_hash(SEED, file_path, dir_path, file_path.parent)
+    assert first != content_hash("other", file_path, dir_path, file_path.parent)
+    os.utime(dir_path / "etc" / "config", ns=(0, 0))
+    assert first == content_hash(SEED, file_path, dir_path, file_path.parent)
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda file_path, dir_path: (dir_path / "etc" / "config").write_text("option foo 'baz'\n"),
+        lambda file_path, dir_path: (dir_path / "etc" / "new").write_text(""),
+        lambda file_path, dir_path: (dir_path / "etc" / "link").unlink(),
+        lambda file_path, dir_path: os.utime(file_path, ns=(0, 0)),
+    ],
+    ids=["modify", "add", "remove", "touch"],
+)
+def test_signature_change(sources, change):
+    """Signature has to change with any change of sources."""
+    file_path, dir_path = sources
+    signature = metadata_signature(SEED, file_path, dir_path)
+    assert signature == metadata_signature(SEED, file_path, dir_path)
+    change(file_path, dir_path)
+    assert signature != metadata_signature(SEED, file_path, dir_path)
+
+
+def test_index(tmp_path):
+    """Stored hash is provided only for the same signature and it is shared between instances."""
+    index = HashIndex(tmp_path / "cache" / "index.sqlite")
+    assert index.get("key", "sig") is None
+    index.set("key", "sig", "hash")
+    assert index.get("key", "sig") == "hash"
+    assert index.get("key", "other") is None
+    other = HashIndex(tmp_path / "cache" / "index.sqlite")
+    assert other.get("key", "sig") == "hash"
+    other.set("key", "other", "hash2")
+    assert index.get("key", "sig") is None
+    assert index.get("key", "other") == "hash2"
+    index.close()
+    other.close()
+
+
+def test_index_threads(tmp_path):
+    """Index can be shared by threads including the first access that opens the database."""
+    index = HashIndex(tmp_path / "index.sqlite")
+
+    def access(i):
+        index.set(f"key{i}", "sig", f"hash{i}")
+        return index.get(f"key{i}", "sig")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        assert list(executor.map(access, range(64))) == [f"hash{i}" for i in range(64)]
+    index.close()
+
+
+def test_index_unusable(tmp_path):
+    """Index that can't be created behaves as empty one."""
+    (tmp_path / "file").write_text("")
+    index = HashIndex(tmp_path / "file" / "index.sqlite")
+    index.set("key", "sig", "hash")
+    assert index.get("key", "sig") is None
+
+
+def test_benchmark(tmp_path, record_property):
+    """Compare hash computation with lookup in the index for a large directory tree."""
+    file_path = tmp_path / "image.sh"
+    file_path.write_text("#!/bin/sh\n")
+    dir_path = tmp_path / "image"
+    for i in range(2000):
+        node = dir_path / str(i % 20) / f"file{i}"
+        node.parent.mkdir(parents=True, exist_ok=True)
+        node.write_bytes(os.urandom(16384))
+    index = HashIndex(tmp_path / "index.sqlite")
+
+    start = time.perf_counter()
+    img_hash = content_hash(SEED, file_path, dir_path, tmp_path)
+    hash_duration = time.perf_counter() - start
+    index.set(str(file_path), metadata_signature(SEED, file_path, dir_path), img_hash)
+
+    start = time.perf_counter()
+    assert index.get(str(file_path), metadata_signature(SEED, file_path, dir_path)) == img_hash
+    index_duration = time.perf_counter() - start
+    index.close()
+
+    logger.info("Content hash: %.2f ms, index lookup: %.2f ms", hash_duration * 1000, index_duration * 1000)
+    record_property("hash_index_speedup", hash_duration / index_duration)
@@ -0,0 +1,141 @@
+"""Tests of NetworkInterface caching. These do not require LXD.
+"""
+import ipaddress
+import logging
+import socket
+import time
+import types
+
+import pylxd
+import pytest
+
+from nsfarm.lxd.network import NetworkInterface, PortPool
+
+NETWORK = {
+    "lan": {
+        "hwaddr": "00:16:3e:00:00:01",
+        "host_name": "mac1234",
+        "addresses": [
+            {"family": "inet", "address": "192.168.1.10", "netmask": "24"},
+            {"family": "inet6", "address": "fe80::1", "netmask": "64"},
+        ],
+    },
+    "lo": {"hwaddr": "", "host_name": "", "addresses": [{"family": "inet", "address": "127.0.0.1", "netmask": "8"}]},
+}
+
+
+class FakeLXDContainer:
+    """Provides only state(), devices and save() of pylxd container."""
+
+    def __init__(self):
+        self.calls = 0
+        self.saves = 0
+        self.devices = {}
+        self.save_errors = []
+
+    def state(self):
+        self.calls += 1
+        return types.SimpleNamespace(network=NETWORK)
+
+    def save(self, wait=False):
+        self.saves += 1
+        if self.save_errors:
+            error = self.save_errors.pop(0)
+            raise pylxd.exceptions.LXDAPIException(
+                types.SimpleNamespace(status_code=400, json=lambda: {"error": error})
+            )
+
+
+def network_interface(ttl=1.0):
+    container = types.SimpleNamespace(lxd_container=FakeLXDContainer(), _logger=logging.getLogger(__name__))
+    return NetworkInterface(container, ttl=ttl), container.lxd_container
+
+
+def test_cached():
+    """All properties are served from single request while state is fresh."""
+    network, lxd_container = network_interface(60)
+    assert network.hwaddr["lan"] == "00:16:3e:00:00:01"
+    assert network.hostname["lan"] == "mac1234"
+    assert network.addresses["lan"] == [
+        ipaddress.ip_interface("192.168.1.10/24"),
+        ipaddress.ip_interface("fe80::1/64"),
+    ]
+    assert set(network.interfaces) == {"lan", "lo"}
+    assert network.state_calls == lxd_container.calls == 1
+
+
+def test_refresh():
+    """Explicit refresh and invalidation result in new request."""
+    network, lxd_container = network_interface(60)
+    network.snapshot()
+    network.refresh()
+    assert network.state_calls == 2
+    network.invalidate()
+    network.snapshot()
+    network.snapshot()
+    assert network.state_calls == lxd_container.calls == 3
+
+
+def test_ttl():
+    """State is fetched again once it is older than ttl."""
+    network, _ = network_interface(0.05)
+    network.snapshot()
+    network.snapshot()
+    assert network.state_calls == 1
+    time.sleep(0.06)
+    network.snapshot()
+    assert network.state_calls == 2
+
+
+def test_proxy_many():
+    """Multiple proxies are opened and closed with single save."""
+    network, lxd_container = network_interface()
+    ports = network.proxy_open_many([{"port": 80}, {"proto": "udp", "address": "10.0.0.1", "port": 53}])
+    assert lxd_container.saves == 1
+    assert lxd_container.devices[f"proxy-tcp-{ports[0]}"]["connect"] == "tcp:127.0.0.1:80"
+    assert lxd_container.devices[f"proxy-udp-{ports[1]}"]["listen"] == f"udp:127.0.0.1:{ports[1]}"
+    network.proxy_close(ports[1], "udp")
+    localport = network.proxy_open(port=443)
+    network.proxy_close_many([ports[0], localport])
+    assert lxd_container.saves == 4
+    assert not lxd_container.devices
+
+
+def test_proxy_port_taken():
+    """Proxies are opened on new ports when LXD fails to bind the local port."""
+    network, lxd_container = network_interface()
+    lxd_container.save_errors = ["listen tcp 127.0.0.1:1234: bind: address already in use"]
+    ports = network.proxy_open_many([{"port": 80}, {"port": 443}])
+    assert lxd_container.saves == 2
+    assert set(lxd_container.devices) == {f"proxy-tcp-{port}" for port in ports}
+
+
+def test_proxy_open_failed():
+    """Failure other than taken port is raised right away and no device is left behind."""
+    network, lxd_container = network_interface()
+    lxd_container.save_errors = ["Invalid devices"]
+    with pytest.raises(pylxd.exceptions.LXDAPIException):
+        network.proxy_open(port=80)
+    assert lxd_container.saves == 1
+    assert not lxd_container.devices
+
+
+def test_port_pool():
+    """Ports are kept reserved until the taken socket is closed and other taken ports stay reserved."""
+    pool = PortPool(size=2)
+    socks = [pool.take("tcp") for _ in range(4)]
+    ports = [sock.getsockname()[1] for sock in socks]
+    assert len(set(ports)) == 4
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    with pytest.raises(OSError):
+        sock.bind(("127.0.0.1", ports[0]))
+    socks[0].close()
+    sock.bind(("127.0.0.1", ports[0]))
+    sock.close()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    with pytest.raises(OSError):
+        sock.bind(("127.0.0.1", ports[1]))
+    sock.close()
+    for taken in socks[1:]:
+        taken.close()
+    pool.close()
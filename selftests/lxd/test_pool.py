@@ -0,0 +1,75 @@
+"""Tests of pool of booted containers.
+"""
+import logging
+import time
+
+import pytest
+
+from nsfarm.lxd import Container, ContainerPool, Image
+
+from .test_image import BASE_IMG
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture(name="pool")
+def fixture_pool():
+    pool = ContainerPool(size=2)
+    Container.pool = pool
+    yield pool
+    Container.pool = None
+    pool.close()
+
+
+def wait_ready(pool, count, timeout=60):
+    """Wait for pool to have given number of containers ready."""
+    end = time.monotonic() + timeout
+    while pool.ready() < count:
+        assert time.monotonic() < end
+        time.sleep(0.5)
+
+
+def test_checkout(lxd_client, pool):
+    """The first container is created from scratch and the following ones come from pool."""
+    image = Image(lxd_client, BASE_IMG)
+    with Container(lxd_client, image) as container:
+        assert not container.name.startswith("nsfarm-pool-")
+    assert (pool.hits, pool.misses) == (0, 1)
+    wait_ready(pool, 2)
+    with Container(lxd_client, image) as container:
+        assert container.name.startswith("nsfarm-pool-")
+        container.shell.run("echo Hello")
+        assert container.shell.output == "Hello"
+    assert (pool.hits, pool.misses) == (1, 1)
+
+
+def test_close(lxd_client, pool):
+    """Containers in pool are removed when pool is closed."""
+    image = Image(lxd_client, BASE_IMG)
+    image.prepare()
+    pool.fill(lxd_client, image, ["nsfarm-root"])
+    wait_ready(pool, 2)
+    names = [cont.name for cont in lxd_client.containers.all() if cont.name.startswith("nsfarm-pool-")]
+    pool.close()
+    assert pool.ready() == 0
+    for _ in range(10):
+        if not any(lxd_client.containers.exists(name) for name in names):
+            return
+        time.sleep(1)
+    assert not any(lxd_client.containers.exists(name) for name in names)
+
+
+def test_benchmark(lxd_client, pool, record_property):
+    """Compare time to prepare container from scratch and from pool."""
+    image = Image(lxd_client, BASE_IMG)
+    start = time.perf_counter()
+    with Container(lxd_client, image) as container:
+        container.shell.run("wait4boot")
+    scratch = time.perf_counter() - start
+    wait_ready(pool, 1)
+    start = time.perf_counter()
+    with Container(lxd_client, image) as container:
+        container.shell.run("wait4boot")
+    pooled = time.perf_counter() - start
+    logger.info("Container from scratch: %.2f s, from pool: %.2f s", scratch, pooled)
+    record_property("pool_speedup", scratch / pooled)
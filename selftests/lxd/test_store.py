@@ -0,0 +1,91 @@
+"""Tests of store of exported images.
+"""
+import types
+
+import pytest
+
+from nsfarm.lxd import Image, ImageStore
+
+from .test_image import BASE_IMG
+
+
+class FakeExport:
+    """Provides streamed export response of pylxd image."""
+
+    def __init__(self, chunks, fail=False):
+        self.chunks = chunks
+        self.fail = fail
+
+    def get(self, stream=False):
+        return self
+
+    def iter_content(self, chunk_size):
+        for chunk in self.chunks:
+            yield chunk
+        if self.fail:
+            raise ConnectionError("Export interrupted")
+
+    def close(self):
+        pass
+
+
+def fake_image(chunks, fail=False):
+    return types.SimpleNamespace(api=types.SimpleNamespace(export=FakeExport(chunks, fail)))
+
+
+def test_save(tmp_path):
+    """Image is saved under name and hash and not exported again."""
+    store = ImageStore(tmp_path / "store")
+    assert not store.contains("img", "1234")
+    path = store.save(fake_image([b"first", b"second"]), "img", "1234")
+    assert path == store.path("img", "1234")
+    assert path.read_bytes() == b"firstsecond"
+    assert store.contains("img", "1234")
+    store.save(fake_image([b"other"]), "img", "1234")
+    assert path.read_bytes() == b"firstsecond"
+    assert list((tmp_path / "store").iterdir()) == [path]
+    assert path.stat().st_mode & 0o777 == 0o644
+
+
+def test_save_interrupted(tmp_path):
+    """Failed export leaves no file behind."""
+    store = ImageStore(tmp_path)
+    with pytest.raises(ConnectionError):
+        store.save(fake_image([b"partial"], fail=True), "img", "1234")
+    assert not store.contains("img", "1234")
+    assert not list(tmp_path.iterdir())
+
+
+def test_load_missing(tmp_path):
+    """Missing image is reported as None."""
+    assert ImageStore(tmp_path).load(None, "img", "1234") is None
+
+
+def test_export_import(lxd_client, tmp_path):
+    """Image exported to the store can be imported back under the same alias."""
+    image = Image(lxd_client, BASE_IMG)
+    image.prepare()
+    Image.store = ImageStore(tmp_path)
+    try:
+        image = Image(lxd_client, BASE_IMG)
+        image.prepare()
+        assert Image.store.contains(image.name, image.hash())
+        lxd_client.images.get_by_alias(image.alias()).delete(wait=True)
+        image = Image(lxd_client, BASE_IMG)
+        image.prepare()
+        assert image.is_prepared()
+    finally:
+        Image.store = None
+
+
+def test_export_unwritable(lxd_client, tmp_path):
+    """Store that can't be written to does not prevent use of image."""
+    (tmp_path / "file").write_text("")
+    Image.store = ImageStore(tmp_path / "file" / "store")
+    try:
+        image = Image(lxd_client, BASE_IMG)
+        image.prepare()
+        assert image.lxd_image is not None
+        assert not Image.store.contains(image.name, image.hash())
+    finally:
+        Image.store = None
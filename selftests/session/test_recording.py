@@ -0,0 +1,145 @@
+"""Tests for session recording and reading of recordings.
+"""
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pexpect
+import pytest
+
+from nsfarm import session
+from nsfarm.cli import FDLogging, PexpectLogging
+from nsfarm.session import recording
+
+
+@pytest.fixture(name="path")
+def fixture_path(tmp_path):
+    return tmp_path / "session.nsfs"
+
+
+def test_roundtrip(path):
+    """Check that records are read the same way as they were written."""
+    with session.Recorder(path) as recorder:
+        recorder.record(session.Direction.IN, b"login: ")
+        recorder.record(session.Direction.OUT, b"root\n")
+        recorder.record(session.Direction.OUT, b"")  # Empty data are not recorded
+    with session.Reader(path) as reader:
+        records = list(reader)
+        assert reader.start <= records[0].timestamp <= records[1].timestamp
+    assert [(record.direction, record.data) for record in records] == [
+        (session.Direction.IN, b"login: "),
+        (session.Direction.OUT, b"root\n"),
+    ]
+
+
+def test_append(path):
+    """Check that existing recording is appended to and its start is preserved."""
+    with session.Recorder(path) as recorder:
+        recorder.record(session.Direction.IN, b"first")
+        start = recorder.start
+    with session.Recorder(path) as recorder:
+        assert recorder.start == start
+        recorder.record(session.Direction.IN, b"second")
+    with session.Reader(path) as reader:
+        assert [record.data for record in reader] == [b"first", b"second"]
+
+
+def test_not_recording(path):
+    """Check that other files are refused."""
+    path.write_bytes(b"Something else entirely")
+    with pytest.raises(ValueError):
+        session.Reader(path)
+
+
+def test_truncated(path):
+    """Check that incomplete last record is ignored."""
+    with session.Recorder(path) as recorder:
+        recorder.record(session.Direction.IN, b"complete")
+        recorder.record(session.Direction.IN, b"incomplete")
+    os.truncate(path, os.path.getsize(path) - 2)
+    with session.Reader(path) as reader:
+        assert [record.data for record in reader] == [b"complete"]
+
+
+def test_window(path, monkeypatch):
+    """Check that time window is correctly selected with and without index."""
+    monkeypatch.setattr(recording, "INDEX_STEP", 64)
+    with session.Recorder(path) as recorder:
+        for i in range(100):
+            recorder.record(session.Direction.IN, f"{i:02}".encode() * 16)
+    assert recording.index_path(path).stat().st_size > 0
+    with session.Reader(path) as reader:
+        times = [record.timestamp for record in reader]
+        expected = [record.data for record in reader if times[30] <= record.timestamp <= times[60]]
+        assert [record.data for record in reader.records(times[30], times[60])] == expected
+        assert expected[0] == b"30" * 16
+    recording.index_path(path).unlink()
+    with session.Reader(path) as reader:
+        assert [record.data for record in reader.records(times[30], times[60])] == expected
+
+
+def test_fdlogging(path):
+    """Check that FDLogging records both directions."""
+    ours, dev = socket.socketpair()
+    recorder = session.Recorder(path)
+    fdlog = FDLogging(ours.fileno(), logging.getLogger("fdlogging"), recorder=recorder)
+    try:
+        dev.sendall(b"From device\n")
+        assert fdlog.socket.recv(64) == b"From device\n"
+        fdlog.socket.sendall(b"To device\n")
+        assert dev.recv(64) == b"To device\n"
+    finally:
+        fdlog.close()
+        recorder.close()
+        ours.close()
+        dev.close()
+    with session.Reader(path) as reader:
+        assert [(record.direction, record.data) for record in reader] == [
+            (session.Direction.IN, b"From device\n"),
+            (session.Direction.OUT, b"To device\n"),
+        ]
+
+
+def test_pexpect(path):
+    """Check recording of pexpect handle the same way as it is done for containers."""
+    with session.Recorder(path) as recorder:
+        pexp = pexpect.spawn("bash", ["--norc", "--noprofile"], env={"PS1": "local # ", "PATH": os.environ["PATH"]})
+        pexp.logfile_read = PexpectLogging(logging.getLogger("pexpect"), recorder=recorder)
+        pexp.logfile_send = recorder.writer(session.Direction.OUT)
+        pexp.expect_exact("local # ")
+        pexp.sendline("echo recorded")
+        pexp.expect_exact("local # ")
+        pexp.close(force=True)
+    with session.Reader(path) as reader:
+        records = list(reader)
+    assert b"".join(record.data for record in records if record.direction == session.Direction.OUT) == (
+        b"echo recorded" + os.linesep.encode()
+    )
+    assert b"recorded\r\nlocal # " in b"".join(
+        record.data for record in records if record.direction == session.Direction.IN
+    )
+
+
+def test_dump(path):
+    """Check command line dump of recording."""
+    with session.Recorder(path) as recorder:
+        recorder.record(session.Direction.IN, b"before\n")
+        time.sleep(0.2)
+        recorder.record(session.Direction.IN, b"in window\n")
+        recorder.record(session.Direction.OUT, b"sent\n")
+    res = subprocess.run(
+        [sys.executable, "-m", "nsfarm", "session", "dump", "--start", "0.1", str(path)],
+        capture_output=True,
+        check=True,
+    )
+    lines = res.stdout.decode().splitlines()
+    assert [line.split(" ", 1)[1] for line in lines] == ["> in window\\n", "< sent\\n"]
+    res = subprocess.run(
+        [sys.executable, "-m", "nsfarm", "session", "dump", "--raw", str(path)],
+        capture_output=True,
+        check=True,
+    )
+    assert res.stdout == b"before\nin window\n"
@@ -0,0 +1,118 @@
+"""Tests for replay of recorded sessions with CLI classes.
+"""
+import logging
+import os
+import time
+
+import pexpect
+import pytest
+
+from nsfarm import session
+from nsfarm.cli import PexpectLogging, Shell, Uboot
+from nsfarm.session import Direction, Record, ReplayError, ReplaySpawn
+
+logger = logging.getLogger(__name__)
+
+COMMANDS = ["echo Hello", "false", "ls -d /", "for i in 1 2 3; do echo $i; done"]
+
+
+def records(*chunks: tuple[str, str], step: float = 0.01) -> list[Record]:
+    """Create records from tuples of direction (">" for received and "<" for sent) and data."""
+    return [
+        Record(i * step, Direction.IN if direction == ">" else Direction.OUT, data.encode())
+        for i, (direction, data) in enumerate(chunks)
+    ]
+
+
+ALPINE = records(
+    (">", "root@alpine:~# "),
+    ("<", "export PS1='nsfprompt:$(echo -n $?)\\$ '\n"),
+    (">", "export PS1='nsfprompt:$(echo -n $?)\\$ '\r\n"),
+    (">", "nsfprompt:0# "),
+    ("<", "echo Hello\n"),
+    (">", "echo Hello\r\nHello\r\nnsfprompt:0# "),
+    ("<", "false\n"),
+    (">", "false\r\nnsfprompt:1# "),
+)
+
+
+def test_shell():
+    """Check Shell on top of the replay."""
+    shell = Shell(ReplaySpawn(ALPINE, speed=None), flush=False)
+    shell.run("echo Hello")
+    assert shell.output == "Hello"
+    assert shell.run("false", check=False) == 1
+    assert not shell.isalive()
+
+
+def test_uboot():
+    """Check Uboot on top of the replay including framing of exit code."""
+    replay = ReplaySpawn(
+        records(
+            (">", "=> "),
+            ("<", "true; echo nsfexit:$?\n"),
+            (">", "true; echo nsfexit:$?\r\nnsfexit:0\r\n=> "),
+            ("<", "printenv serverip; echo nsfexit:$?\n"),
+            (">", "printenv serverip; echo nsfexit:$?\r\nserverip=192.168.1.1\r\nnsfexit:0\r\n=> "),
+        ),
+        speed=None,
+    )
+    uboot = Uboot(replay, flush=False)
+    uboot.run("printenv serverip")
+    assert uboot.output == "serverip=192.168.1.1"
+
+
+def test_mismatch():
+    """Check that different command is reported unless it is not strict."""
+    with pytest.raises(ReplayError):
+        Shell(ReplaySpawn(ALPINE, speed=None), flush=False).run("echo Hi")
+    replay = ReplaySpawn(ALPINE, speed=None, strict=False)
+    replay.sendline("Anything")
+    replay.sendline("Something else")
+    replay.expect_exact("Hello\r\n")
+
+
+def test_timing():
+    """Check that timing of the recording is followed (relatively to the last sent data)."""
+    replay = ReplaySpawn(
+        [
+            Record(0, Direction.IN, b"first"),
+            Record(0.2, Direction.IN, b"second"),
+            Record(10, Direction.OUT, b"go\n"),
+            Record(10.4, Direction.IN, b"third"),
+        ],
+        speed=2,
+    )
+    start = time.monotonic()
+    replay.expect_exact("second")
+    assert 0.1 <= time.monotonic() - start < 0.2
+    with pytest.raises(pexpect.TIMEOUT):
+        replay.expect_exact("third", timeout=0.1)
+    start = time.monotonic()
+    replay.sendline("go")
+    replay.expect_exact("third")
+    assert 0.2 <= time.monotonic() - start < 0.3
+    with pytest.raises(pexpect.EOF):
+        replay.expect_exact("fourth")
+
+
+def test_recorded(tmp_path, record_property):
+    """Record session of local shell and replay it. Compare time needed to run commands in both cases."""
+    path = tmp_path / "session.nsfs"
+    with session.Recorder(path) as recorder:
+        pexp = pexpect.spawn("bash", ["--norc", "--noprofile"], env={"PS1": "local # ", "PATH": os.environ["PATH"]})
+        pexp.logfile_read = PexpectLogging(logging.getLogger("pexpect"), recorder=recorder)
+        pexp.logfile_send = recorder.writer(Direction.OUT)
+        start = time.perf_counter()
+        shell = Shell(pexp, flush=False)
+        live = [(shell.run(cmd, check=False), shell.output) for cmd in COMMANDS]
+        live_duration = time.perf_counter() - start
+        pexp.close(force=True)
+
+    start = time.perf_counter()
+    shell = Shell(ReplaySpawn.from_recording(path, speed=None), flush=False)
+    assert [(shell.run(cmd, check=False), shell.output) for cmd in COMMANDS] == live
+    replay_duration = time.perf_counter() - start
+
+    logger.info("Live: %.2f ms, replay: %.2f ms", live_duration * 1000, replay_duration * 1000)
+    record_property("replay_speedup", live_duration / replay_duration)
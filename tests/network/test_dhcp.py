@@ -8,8 +8,9 @@ Tested:
 """
 
 import abc
-import contextlib
+import asyncio
 import ipaddress
+import logging
 import re
 
 import pytest
@@ -17,6 +18,8 @@ import pytest
 import nsfarm.cli
 import nsfarm.lxd
 
+logger = logging.getLogger(__name__)
+
 
 def ip_within_range(ip, ip_min, ip_max):
     """Returns if IP address is within <min, max) ip addresses"""
@@ -25,10 +28,16 @@ def ip_within_range(ip, ip_min, ip_max):
 
 
 def obtain_addresses(dhcp_clients):
-    for client in dhcp_clients:
-        client.shell.command("udhcpc -i lan -n -A 60")
-    for client in dhcp_clients:
-        client.shell.prompt()
+    """Run DHCP client on all clients concurrently."""
+
+    async def obtain(client):
+        async with await client.async_shell() as shell:
+            await shell.run("udhcpc -i lan -n -A 60", check=False)
+
+    async def obtain_all():
+        await asyncio.gather(*(obtain(client) for client in dhcp_clients))
+
+    asyncio.run(obtain_all())
 
 
 class DHCPv4Common(abc.ABC):
@@ -57,12 +66,15 @@ class DHCPv4Common(abc.ABC):
     @pytest.fixture(name="dhcp_clients", scope="class")
     def fixture_dhcp_clients(self, lxd_client, device_map):
         """Fixture starts specific number of clients on lan1 and returns them in list"""
-        cont = "client"
+        image = nsfarm.lxd.Image(lxd_client, "client")
         dev_map = {"net:lan": device_map["net:lan1"]}
-        with contextlib.ExitStack() as stack:
-            yield [
-                stack.enter_context(nsfarm.lxd.Container(lxd_client, cont, dev_map)) for _ in range(self.nof_clients)
-            ]
+        with nsfarm.lxd.ContainerGroup(
+            nsfarm.lxd.Container(lxd_client, image, dev_map) for _ in range(self.nof_clients)
+        ) as clients:
+            yield list(clients)
+            logger.info(
+                "LXD state requests for DHCP clients: %d", sum(client.network.state_calls for client in clients)
+            )
 
     @pytest.fixture(name="configured_board", scope="class", autouse=True)
     def fixture_configured_board(self, client_board, dhcp_clients, save_dhcp_settings):
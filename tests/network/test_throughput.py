@@ -24,8 +24,8 @@ TEST_INTERVAL = 10  # seconds of measurement intervals
 
 
 def get_test_data(shell, type):
-    """Type is either 'sender' or 'receiver'"""
-    data = json.loads(shell.output)
+    """Type is either 'sender' or 'receiver'. Output has to be spooled (see Shell.prompt_spooled)."""
+    data = json.load(shell.spooled_output)
     speed_data = [round(val["sum"]["bits_per_second"] / BITS_IN_MBIT, 2) for val in data["intervals"]]
     client_speed = round(data["end"]["streams"][0][type]["bits_per_second"] / BITS_IN_MBIT, 2)
 
@@ -52,11 +52,11 @@ class ThroughputTest(abc.ABC):
         # setting up Daemon server, with JSON output and for only 1 session.
         iperf_server.command(f"iperf3 -1sJ -i {TEST_INTERVAL}")
         # setting up client, adding additional timeout for pexpect
-        iperf_client.run(
+        iperf_client.run_spooled(
             f"iperf3 -J -c {iperf_server_ip[0].ip} -i {TEST_INTERVAL}" + f" -t {TEST_TIME}",
             timeout=TEST_TIME * 1.2,
         )
-        iperf_server.prompt()
+        iperf_server.prompt_spooled()
         data_client_speed, client_speed = get_test_data(iperf_client, "sender")
         data_server_speed, server_speed = get_test_data(iperf_server, "receiver")
         # Check if some value is under the required one
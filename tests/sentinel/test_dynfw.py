@@ -13,18 +13,28 @@ def test_ipset_is_nonempty(client_board):
 @pytest.fixture
 def open_ssh_222(client_board):
     """Opens SSH on port 222 from WAN."""
-    client_board.run("uci set firewall.nsfarm_public_ssh=redirect")
-    client_board.run("uci set firewall.nsfarm_public_ssh.dest_port=22")
-    client_board.run("uci set firewall.nsfarm_public_ssh.src_dport=222")
-    client_board.run("uci set firewall.nsfarm_public_ssh.proto=tcp")
-    client_board.run("uci set firewall.nsfarm_public_ssh.src=wan")
-    client_board.run("uci set firewall.nsfarm_public_ssh.target=DNAT")
-    client_board.run("uci commit firewall.nsfarm_public_ssh")
-    client_board.run("/etc/init.d/firewall reload")
+    client_board.run_many(
+        [
+            "uci set firewall.nsfarm_public_ssh=redirect",
+            "uci set firewall.nsfarm_public_ssh.dest_port=22",
+            "uci set firewall.nsfarm_public_ssh.src_dport=222",
+            "uci set firewall.nsfarm_public_ssh.proto=tcp",
+            "uci set firewall.nsfarm_public_ssh.src=wan",
+            "uci set firewall.nsfarm_public_ssh.target=DNAT",
+            "uci commit firewall.nsfarm_public_ssh",
+            "/etc/init.d/firewall reload",
+        ],
+        stop_on_failure=True,
+    )
     yield
-    client_board.run("uci delete firewall.nsfarm_public_ssh")
-    client_board.run("uci commit firewall.nsfarm_public_ssh")
-    client_board.run("/etc/init.d/firewall reload")
+    client_board.run_many(
+        [
+            "uci delete firewall.nsfarm_public_ssh",
+            "uci commit firewall.nsfarm_public_ssh",
+            "/etc/init.d/firewall reload",
+        ],
+        stop_on_failure=True,
+    )
 
 
 def test_attack_unblocked(attacker, board_wan, open_ssh_222):